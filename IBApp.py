@@ -5,38 +5,483 @@ from ibapi.wrapper import EWrapper
 # Contract tells IB what instrument we are trading
 from ibapi.contract import Contract
 
+from concurrent.futures import Future
+import sys
+import threading
+import time
+
+from bar_buffer import BarBuffer, RingBuffer, PRICE_COLUMNS, parse_bar_time
+from stage_timing import StageTimer
+
+# Entries kept per streamed series; older ones are overwritten
+STREAM_CAPACITY = 4096
+
+# Market data tick types streamed into ring buffers
+LAST_TICKS = (4, 68)                # LAST, DELAYED_LAST
+OPTION_IMPLIED_VOL_TICK = 24        # underlying's 30-day IV (generic tick 106)
+MODEL_OPTION_TICKS = (13, 83)       # MODEL_OPTION, DELAYED_MODEL_OPTION
+
+# Live data where subscribed, delayed otherwise
+DELAYED_FALLBACK = 3
+
+# "Displaying delayed market data" and similar notices that don't end a stream
+STREAM_NOTICES = (10167, 10168)
+
+# "Couldn't connect to TWS": expected on every retry while reconnecting
+CONNECT_FAIL = 502
+
+# TWS <-> IB server connectivity notices (reqId -1)
+CONNECTIVITY_LOST = 1100
+CONNECTIVITY_RESTORED_DATA_LOST = 1101     # subscriptions must be sent again
+CONNECTIVITY_RESTORED = 1102                # subscriptions were kept
+
+# Reconnect after the socket to TWS/Gateway drops: retry after
+# RECONNECT_DELAY, doubling up to RECONNECT_MAX_DELAY, and give up (failing
+# whatever is still pending) once it has been down for RECONNECT_WINDOW.
+# A nightly Gateway restart is down for a minute or two.
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30
+RECONNECT_WINDOW = 30 * 60
+
+# Send reqCurrentTime after this many idle seconds, and treat the socket as
+# dead if nothing at all comes back within HEARTBEAT_TIMEOUT
+HEARTBEAT_IDLE = 30
+HEARTBEAT_TIMEOUT = 10
+
+
+class IBRequestError(Exception):
+    """Error reported by IB for a specific request"""
+
+    def __init__(self, reqId, errorCode, errorString):
+        super().__init__(f"Request {reqId} failed with error {errorCode}: {errorString}")
+        self.reqId = reqId
+        self.errorCode = errorCode
+        self.errorString = errorString
+
 
 class IBApp(EWrapper, EClient):
     # Initialize a client with a default connection of false.
-    def __init__(self):
+    def __init__(self, timer=None):
         EClient.__init__(self, self)
         self.connected = False
         self.historical_data = {} # important for storing requests
+        self.pending_requests = {} # reqId -> Future resolved on historicalDataEnd/error
+        self.request_items = {} # reqId -> list for requests answered by a series of callbacks
+        self._requests_lock = threading.Lock()
+
+        # Streaming requests: reqId -> {name: RingBuffer}, filled from the reader thread
+        self.streams = {}
+        self.stream_errors = {} # reqId -> IBRequestError reported for a stream
+        self._stream_cancel = {} # reqId -> cancel method
+
+        # Stage timings: connect handshake and per-request first bar / end
+        self.timer = timer if timer is not None else StageTimer()
+        self._connect_started = None
+        self._request_started = {} # reqId -> perf_counter() when sent
+
+        # Set from nextValidId until the connection drops or TWS loses its servers
+        self.ready = threading.Event()
+        self.auto_reconnect = False
+        self.sessions = 0   # connections that reached nextValidId since start()
+        self.reconnects = 0 # reconnect attempts since start()
+        self.last_message = None    # monotonic time of the last message from TWS
+        self.connection_listeners = [] # callables(state, message), called from IB threads
+        self._address = None
+        self._session_thread = None
+        self._user_disconnect = threading.Event()
+        self._heartbeat_sent = None
+        # In-flight requests are sent again after a reconnect: reqId -> send callable
+        self._resend = {}
+        self._unsent = set() # reqIds registered while not ready, sent once ready
+        self._stream_resend = {} # reqId -> callable re-subscribing a stream
+
+    def connect(self, host, port, clientId):
+        self._connect_started = time.perf_counter()
+        super().connect(host, port, clientId)
+
+    def start(self, host, port, clientId, timeout=10, auto_reconnect=True):
+        """
+        Connect and run the message loop on a background thread
+
+        Returns once nextValidId arrives (True) or after timeout seconds
+        (False). With auto_reconnect the thread keeps the session alive:
+        when the socket drops (a Gateway restart, say) it reconnects with
+        exponential backoff and sends every request still waiting for an
+        answer again, so callers only see a slower reply.
+        """
+        self._address = (host, port, clientId)
+        self.auto_reconnect = auto_reconnect
+        self._user_disconnect.clear()
+        self.ready.clear()
+        self.sessions = self.reconnects = 0
+        if self._session_thread is None or not self._session_thread.is_alive():
+            self._session_thread = threading.Thread(target=self._session_loop, daemon=True)
+            self._session_thread.start()
+        return self.ready.wait(timeout)
+
+    def _session_loop(self):
+        delay = RECONNECT_DELAY
+        down_since = None
+        while not self._user_disconnect.is_set():
+            self.connect(*self._address)
+            if self.isConnected():
+                try:
+                    self.run()
+                except Exception as e:
+                    print(f"IB message loop error: {e}", file=sys.stderr)
+                    self.disconnect()
+            if self._user_disconnect.is_set() or not self.auto_reconnect:
+                break
+            if self.connected:
+                # The session got as far as nextValidId: start backing off afresh
+                delay, down_since = RECONNECT_DELAY, None
+                self.connected = False
+            down_since = down_since or time.monotonic()
+            if time.monotonic() - down_since > RECONNECT_WINDOW:
+                print(f"Giving up reconnecting to IB after {RECONNECT_WINDOW}s", file=sys.stderr)
+                break
+            self._notify("reconnecting", f"Reconnecting to IB in {delay:g}s")
+            if self._user_disconnect.wait(delay):
+                break
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            self.reconnects += 1
+        self.connected = False
+        self._fail_pending(IBRequestError(-1, 504, "Connection closed"))
+        self._notify("closed", "Disconnected from IB")
+
+    def disconnect(self):
+        # The message loop tears down its own connection on the session
+        # thread; a call from anywhere else is the user hanging up
+        if threading.current_thread() is not self._session_thread:
+            self._user_disconnect.set()
+        super().disconnect()
+
+    def _notify(self, state, message):
+        for listener in list(self.connection_listeners):
+            try:
+                listener(state, message)
+            except Exception as e:
+                print(f"Connection listener error: {e}", file=sys.stderr)
+
+    def health(self):
+        """Connection state for diagnostics"""
+        return {
+            "ready": self.ready.is_set(),
+            "connected": self.isConnected(),
+            "sessions": self.sessions,
+            "reconnects": self.reconnects,
+            "pending_requests": len(self.pending_requests),
+            "unsent_requests": len(self._unsent),
+            "streams": len(self.streams),
+            "idle_seconds": None if self.last_message is None else time.monotonic() - self.last_message,
+        }
+
+    def start_request(self, reqId, items=False, send=None):
+        """
+        Register a completion handle for a request before sending it
+
+        Any bars left over from a previous request with the same reqId are
+        dropped. The returned Future resolves to a BarBuffer of the bars once
+        historicalDataEnd arrives, or raises IBRequestError if IB reports an
+        error for the request. With items=True it resolves to the list of
+        objects delivered before the request's End callback instead (contract
+        details, option parameters).
+
+        send, if given, is a no-argument callable that sends the request. It
+        is called now if the connection is ready and otherwise once it is,
+        and again after a reconnect if the request is still unanswered.
+        """
+        future = Future()
+        with self._requests_lock:
+            self.historical_data.pop(reqId, None)
+            if items:
+                self.request_items[reqId] = []
+            else:
+                self.request_items.pop(reqId, None)
+            self.pending_requests[reqId] = future
+            self._request_started[reqId] = time.perf_counter()
+            if send is not None:
+                self._resend[reqId] = send
+                send_now = self.ready.is_set()
+                if not send_now:
+                    self._unsent.add(reqId)
+        if send is not None and send_now:
+            self._send(reqId, send)
+        return future
+
+    def _send(self, reqId, send):
+        try:
+            send()
+        except OSError:
+            # Socket dropped mid-send: the reconnect sends it again
+            with self._requests_lock:
+                if reqId in self._resend:
+                    self._unsent.add(reqId)
+
+    def request_historical_data(self, reqId, **params):
+        """Send reqHistoricalData(reqId, **params); returns start_request's Future"""
+        return self.start_request(reqId, send=lambda: self.reqHistoricalData(reqId=reqId, **params))
+
+    def _finish_request(self, reqId, error=None):
+        with self._requests_lock:
+            future = self.pending_requests.pop(reqId, None)
+            # Bars are handed to the Future, so the buffer can be released
+            bars = self.historical_data.pop(reqId, None) if future is not None else None
+            items = self.request_items.pop(reqId, None)
+            started = self._request_started.pop(reqId, None)
+            self._resend.pop(reqId, None)
+            self._unsent.discard(reqId)
+        if started is not None:
+            self.timer.record_since("ib.request" if error is None else "ib.request_error", started)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        elif items is not None:
+            future.set_result(items)
+        else:
+            future.set_result(bars if bars is not None else BarBuffer())
+
+    def request_contract_details(self, reqId, contract):
+        """Send reqContractDetails; returns a Future of a list of ContractDetails"""
+        return self.start_request(reqId, items=True, send=lambda: self.reqContractDetails(reqId, contract))
+
+    def request_option_params(self, reqId, symbol, conId, secType="STK", futFopExchange=""):
+        """
+        Send reqSecDefOptParams for an underlying
+
+        Returns a Future of a list of dicts (exchange, underlyingConId,
+        tradingClass, multiplier, expirations, strikes), one per exchange.
+        """
+        return self.start_request(
+            reqId, items=True, send=lambda: self.reqSecDefOptParams(reqId, symbol, futFopExchange, secType, conId)
+        )
+
+    def stream_bars(self, reqId, contract, whatToShow, durationStr, barSizeSetting="1 day",
+                    capacity=STREAM_CAPACITY):
+        """
+        Send reqHistoricalData with keepUpToDate=True
+
+        The initial bars and every later historicalDataUpdate go into one
+        RingBuffer of OHLCV columns; an update to the current bar overwrites
+        it in place. Returns {"bars": RingBuffer}.
+        """
+        rings = {"bars": RingBuffer(capacity, PRICE_COLUMNS)}
+
+        def subscribe():
+            # A re-subscription sends the whole window again
+            rings["bars"].clear()
+            self.reqHistoricalData(reqId=reqId, contract=contract, endDateTime="", durationStr=durationStr,
+                                   barSizeSetting=barSizeSetting, whatToShow=whatToShow, useRTH=1,
+                                   formatDate=1, keepUpToDate=True, chartOptions=[])
+
+        self._start_stream(reqId, rings, self.cancelHistoricalData, subscribe)
+        return rings
+
+    def stream_market_data(self, reqId, contract, genericTickList="", capacity=STREAM_CAPACITY):
+        """
+        Send reqMktData and buffer its ticks
+
+        Returns {"last": RingBuffer, "iv": RingBuffer}: trade prices, and
+        implied volatilities from generic tick 106 (stocks) or model option
+        computations (options), each stamped with its arrival time.
+        """
+        rings = {"last": RingBuffer(capacity), "iv": RingBuffer(capacity)}
+        self._start_stream(reqId, rings, self.cancelMktData,
+                           lambda: self.reqMktData(reqId, contract, genericTickList, False, False, []))
+        return rings
+
+    def _start_stream(self, reqId, rings, cancel, subscribe):
+        self.streams[reqId] = rings
+        self.stream_errors.pop(reqId, None)
+        self._stream_cancel[reqId] = cancel
+        self._stream_resend[reqId] = subscribe
+        if self.ready.is_set():
+            try:
+                subscribe()
+            except OSError:
+                pass    # re-subscribed on reconnect
+
+    def cancel_stream(self, reqId):
+        cancel = self._stream_cancel.pop(reqId, None)
+        self.streams.pop(reqId, None)
+        self._stream_resend.pop(reqId, None)
+        if cancel is not None and self.isConnected():
+            cancel(reqId)
 
     # Error filtering
     def error(self, reqId, errorCode, errorString, *args):
         # Filter out irrelevant warnings about fractional shares
         if errorCode == 2176 and "fractional share" in errorString.lower():
             return  # Ignore this specific warning
-        print(f"Error {errorCode}: {errorString}")
+        if errorCode == CONNECT_FAIL and self.sessions and not self._user_disconnect.is_set():
+            return  # the session loop reports its retries
+        print(f"Error {errorCode}: {errorString}", file=sys.stderr)
         if args:
-            print(f"Additional error info: {args}")
+            print(f"Additional error info: {args}", file=sys.stderr)
+
+        if errorCode == CONNECTIVITY_LOST:
+            self.ready.clear()
+            self._notify("lost", errorString)
+        elif errorCode in (CONNECTIVITY_RESTORED_DATA_LOST, CONNECTIVITY_RESTORED):
+            # Requests made meanwhile went nowhere; after 1101 the
+            # subscriptions and open requests are gone from TWS as well
+            self._set_ready(resend_all=errorCode == CONNECTIVITY_RESTORED_DATA_LOST,
+                            restreams=errorCode == CONNECTIVITY_RESTORED_DATA_LOST)
+            self._notify("restored", errorString)
+
+        if reqId in self.streams and not 2100 <= errorCode < 2200 and errorCode not in STREAM_NOTICES:
+            self.stream_errors[reqId] = IBRequestError(reqId, errorCode, errorString)
+
+        # 2100-2199 are warnings; anything else ends the request it refers to
+        if reqId in self.pending_requests and not 2100 <= errorCode < 2200:
+            self._finish_request(reqId, IBRequestError(reqId, errorCode, errorString))
+
+    def connectAck(self):
+        self.last_message = time.monotonic()
+        self._heartbeat_sent = None
+        if self._connect_started is not None:
+            self.timer.record_since("ib.handshake", self._connect_started)
 
     def nextValidId(self, orderId):
+        # Also the answer to reqIds; only the first one of a session matters
+        if self.ready.is_set():
+            return
+        if self._connect_started is not None:
+            self.timer.record_since("ib.connect", self._connect_started)
+        self.sessions += 1
+        reconnected = self.sessions > 1
         self.connected = True
-        print("Connected to IB")
+        # A new socket session knows nothing of earlier requests
+        self._set_ready(resend_all=True, restreams=True)
+        print("Reconnected to IB" if reconnected else "Connected to IB", file=sys.stderr)
+        self._notify("connected", "Reconnected to IB" if reconnected else "Connected to IB")
+
+    def _set_ready(self, resend_all, restreams):
+        """Mark the connection ready and send what it owes: the deferred requests, or all pending ones"""
+        with self._requests_lock:
+            self.ready.set()
+            reqIds = sorted(self._resend) if resend_all else sorted(self._unsent)
+            sends = [(reqId, self._resend[reqId]) for reqId in reqIds if reqId in self._resend]
+            self._unsent.clear()
+            for reqId, _ in sends:
+                # Partial answers from before are dropped; the new one is whole
+                self.historical_data.pop(reqId, None)
+                if reqId in self.request_items:
+                    self.request_items[reqId] = []
+        for reqId, send in sends:
+            self._send(reqId, send)
+        if sends:
+            print(f"Sent {len(sends)} pending request(s) to IB again", file=sys.stderr)
+        if restreams:
+            for reqId, subscribe in list(self._stream_resend.items()):
+                self.stream_errors.pop(reqId, None)
+                try:
+                    subscribe()
+                except OSError:
+                    pass
+
+    def msgLoopRec(self):
+        self.last_message = time.monotonic()
+        self._heartbeat_sent = None
+
+    def msgLoopTmo(self):
+        # Called by run() whenever the queue has been empty for 0.2s
+        if self.last_message is None or not self.isConnected():
+            return
+        now = time.monotonic()
+        if self._heartbeat_sent is None:
+            if now - self.last_message > HEARTBEAT_IDLE:
+                self._heartbeat_sent = now
+                try:
+                    self.reqCurrentTime()
+                except OSError:
+                    pass
+        elif now - self._heartbeat_sent > HEARTBEAT_TIMEOUT:
+            # Socket still open but nothing answers (a hung Gateway):
+            # closing it ends run(), and the session loop reconnects
+            print(f"No reply from IB for {now - self.last_message:.0f}s; reconnecting", file=sys.stderr)
+            self._heartbeat_sent = None
+            conn = self.conn
+            if conn is not None:
+                conn.disconnect()
 
     def historicalData(self, reqId, bar):
-        if reqId not in self.historical_data:
-            self.historical_data[reqId] = []
-        self.historical_data[reqId].append({
-            'date': bar.date,
-            'open': bar.open,
-            'high': bar.high,
-            'low': bar.low,
-            'close': bar.close,
-            'volume': bar.volume
-        })
+        rings = self.streams.get(reqId)
+        if rings is not None:
+            self.historicalDataUpdate(reqId, bar)
+            return
+        buffer = self.historical_data.get(reqId)
+        if buffer is None:
+            buffer = self.historical_data[reqId] = BarBuffer()
+            started = self._request_started.get(reqId)
+            if started is not None:
+                self.timer.record_since("ib.first_bar", started)
+        buffer.append(bar)
 
     def historicalDataEnd(self, reqId, start, end):
-        print(f"Historical data received for reqId {reqId}")
+        print(f"Historical data received for reqId {reqId}", file=sys.stderr)
+        self._finish_request(reqId)
+
+    def historicalDataUpdate(self, reqId, bar):
+        rings = self.streams.get(reqId)
+        if rings is not None:
+            rings["bars"].put(parse_bar_time(bar.date), bar.open, bar.high, bar.low, bar.close, float(bar.volume))
+
+    def tickPrice(self, reqId, tickType, price, attrib):
+        rings = self.streams.get(reqId)
+        if rings is not None and tickType in LAST_TICKS and price > 0:
+            rings["last"].append(time.time_ns(), price)
+
+    def tickGeneric(self, reqId, tickType, value):
+        rings = self.streams.get(reqId)
+        if rings is not None and tickType == OPTION_IMPLIED_VOL_TICK and value > 0:
+            rings["iv"].append(time.time_ns(), value)
+
+    def tickOptionComputation(self, reqId, tickType, tickAttrib, impliedVol, *args):
+        rings = self.streams.get(reqId)
+        # IB sends None or -1 for values it couldn't compute
+        if rings is not None and tickType in MODEL_OPTION_TICKS and impliedVol is not None and 0 < impliedVol < 100:
+            rings["iv"].append(time.time_ns(), impliedVol)
+
+    def contractDetails(self, reqId, contractDetails):
+        items = self.request_items.get(reqId)
+        if items is not None:
+            items.append(contractDetails)
+
+    def contractDetailsEnd(self, reqId):
+        self._finish_request(reqId)
+
+    def securityDefinitionOptionParameter(self, reqId, exchange, underlyingConId, tradingClass,
+                                          multiplier, expirations, strikes):
+        items = self.request_items.get(reqId)
+        if items is not None:
+            items.append({
+                "exchange": exchange,
+                "underlyingConId": underlyingConId,
+                "tradingClass": tradingClass,
+                "multiplier": multiplier,
+                "expirations": sorted(expirations),
+                "strikes": sorted(strikes),
+            })
+
+    def securityDefinitionOptionParameterEnd(self, reqId):
+        self._finish_request(reqId)
+
+    def connectionClosed(self):
+        self.ready.clear()
+        if self.auto_reconnect and not self._user_disconnect.is_set():
+            # Kept pending: the session loop reconnects and sends them again
+            if self.connected:
+                print("Connection to IB lost", file=sys.stderr)
+                self._notify("lost", "Connection to IB lost")
+            return
+        self.connected = False
+        self._fail_pending(IBRequestError(-1, 504, "Connection closed"))
+
+    def _fail_pending(self, error):
+        # Fail anything still waiting so callers don't sit out their timeout
+        for reqId in list(self.pending_requests):
+            self._finish_request(reqId, IBRequestError(reqId, error.errorCode, error.errorString))
+        for reqId in list(self.streams):
+            self.stream_errors[reqId] = IBRequestError(reqId, error.errorCode, error.errorString)
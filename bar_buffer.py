@@ -0,0 +1,156 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_bar_time(value):
+    """
+    Parse an IB bar date into int64 nanoseconds since the epoch
+
+    Handles the fixed formats IB sends with formatDate=1 ("20250827" for daily
+    bars, "20250827  09:30:00" or "20250827 09:30:00 US/Eastern" for intraday
+    bars, times in exchange local time) and epoch seconds with formatDate=2.
+    """
+    value = value.strip()
+    if value.isdigit():
+        if len(value) == 8:
+            seconds = (datetime(int(value[:4]), int(value[4:6]), int(value[6:8])) - _EPOCH).total_seconds()
+        else:
+            seconds = int(value)
+        return int(seconds) * 1_000_000_000
+
+    clock = value[8:].lstrip()
+    moment = datetime(
+        int(value[:4]), int(value[4:6]), int(value[6:8]),
+        int(clock[0:2]), int(clock[3:5]), int(clock[6:8])
+    )
+    return int((moment - _EPOCH).total_seconds()) * 1_000_000_000
+
+
+class BarBuffer:
+    """
+    Growable typed column buffers for the bars of one historical request
+
+    Bars are appended into preallocated NumPy arrays (int64 epoch-ns times
+    and float64 OHLCV) that double in size when full, so large intraday or
+    multi-year pulls cost one array per column instead of a dict per bar.
+    """
+
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self._columns = {name: np.empty(capacity, dtype=np.float64) for name in PRICE_COLUMNS}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = max(2 * len(self.ts), 64)
+        self.ts = np.resize(self.ts, capacity)
+        for name, column in self._columns.items():
+            self._columns[name] = np.resize(column, capacity)
+
+    def append(self, bar):
+        """Append an ibapi BarData"""
+        if self.size == len(self.ts):
+            self._grow()
+        i = self.size
+        self.ts[i] = parse_bar_time(bar.date)
+        columns = self._columns
+        columns['open'][i] = bar.open
+        columns['high'][i] = bar.high
+        columns['low'][i] = bar.low
+        columns['close'][i] = bar.close
+        columns['volume'][i] = float(bar.volume)
+        self.size = i + 1
+
+    def columns(self):
+        """Views of the filled part of each column (no copy)"""
+        return {name: column[:self.size] for name, column in self._columns.items()}
+
+    def index(self):
+        """Bar times as a DatetimeIndex over the buffer (no copy)"""
+        return pd.DatetimeIndex(self.ts[:self.size].view('datetime64[ns]'), name='date', copy=False)
+
+    def to_frame(self):
+        """OHLCV DataFrame indexed by date, backed by the buffer's arrays"""
+        return pd.DataFrame(self.columns(), index=self.index(), copy=False)
+
+
+class RingBuffer:
+    """
+    Fixed-capacity typed columns for streamed bars and ticks
+
+    Keeps the latest `capacity` entries (int64 epoch-ns times and float64
+    value columns) and overwrites the oldest once full, so a stream costs the
+    same memory whatever its length or burst rate. Entries are written by the
+    IB reader thread and read by the UI, so both sides take a short lock.
+    `version` counts writes, letting a reader skip an unchanged buffer.
+    """
+
+    def __init__(self, capacity=4096, columns=('value',)):
+        self.capacity = capacity
+        self.names = tuple(columns)
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, len(self.names)), dtype=np.float64)
+        self.count = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _write(self, ts, values):
+        i = self.count % self.capacity
+        self.ts[i] = ts
+        self.values[i] = values
+        self.count += 1
+        self.version += 1
+
+    def append(self, ts, *values):
+        with self._lock:
+            self._write(ts, values)
+
+    def put(self, ts, *values):
+        """Append, or overwrite the latest entry if it has the same time (bar updates)"""
+        with self._lock:
+            latest = (self.count - 1) % self.capacity
+            if self.count and self.ts[latest] == ts:
+                self.values[latest] = values
+                self.version += 1
+            else:
+                self._write(ts, values)
+
+    def clear(self):
+        """Drop every entry (version still advances, so readers redraw)"""
+        with self._lock:
+            self.count = 0
+            self.version += 1
+
+    def last(self):
+        """(ts, {column: value}) of the latest entry, or None"""
+        with self._lock:
+            if not self.count:
+                return None
+            i = (self.count - 1) % self.capacity
+            return int(self.ts[i]), dict(zip(self.names, self.values[i].tolist()))
+
+    def snapshot(self):
+        """Copies of (times, values) in arrival order, oldest first"""
+        with self._lock:
+            n = len(self)
+            start = self.count % self.capacity if self.count > self.capacity else 0
+            order = (np.arange(n) + start) % self.capacity
+            return self.ts[order], self.values[order]
+
+    def to_frame(self):
+        """DataFrame of the buffered entries indexed by date"""
+        ts, values = self.snapshot()
+        index = pd.DatetimeIndex(ts.view('datetime64[ns]'), name='date')
+        return pd.DataFrame(values, index=index, columns=list(self.names))
@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+import pandas as pd
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".iv_crush", "bar_cache.sqlite")
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    series TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    series TEXT NOT NULL,
+    start_day TEXT NOT NULL,
+    end_day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_series ON coverage (series);
+"""
+
+
+def contract_key(contract):
+    """Stable cache key for a contract"""
+    parts = [contract.symbol, contract.secType, contract.exchange, contract.currency]
+    if contract.secType == "OPT":
+        parts += [contract.lastTradeDateOrContractMonth, str(contract.strike), contract.right]
+    return ":".join(parts)
+
+
+def series_key(contract, what_to_show, bar_size):
+    """Cache key for one bar series: contract, whatToShow and bar size"""
+    return f"{contract_key(contract)}|{what_to_show}|{bar_size}"
+
+
+def _day(value):
+    return pd.Timestamp(value).normalize().to_pydatetime().date()
+
+
+class BarCache:
+    """
+    On-disk store of historical bars keyed by contract, whatToShow and bar size
+
+    Alongside the bars it records which calendar-day ranges have already been
+    fetched from IB, so holidays and weekends with no bars are not requested
+    again. Only days strictly before today are marked as covered because the
+    current day's bar is still changing.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def covered_ranges(self, series):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start_day, end_day FROM coverage WHERE series = ? ORDER BY start_day",
+                (series,)
+            ).fetchall()
+        return [(datetime.strptime(s, "%Y-%m-%d").date(), datetime.strptime(e, "%Y-%m-%d").date())
+                for s, e in rows]
+
+    def missing_ranges(self, series, start, end):
+        """Calendar-day ranges in [start, end] that have not been fetched yet"""
+        start, end = _day(start), _day(end)
+        missing = []
+        cursor = start
+        for cov_start, cov_end in self.covered_ranges(series):
+            if cov_end < cursor:
+                continue
+            if cov_start > end:
+                break
+            if cov_start > cursor:
+                missing.append((cursor, cov_start - timedelta(days=1)))
+            cursor = max(cursor, cov_end + timedelta(days=1))
+            if cursor > end:
+                break
+        if cursor <= end:
+            missing.append((cursor, end))
+        return missing
+
+    def store(self, series, bars, start, end):
+        """
+        Merge bars received from IB into the cache and mark [start, end] as fetched
+
+        bars is the BarBuffer collected by IBApp.historicalData.
+        """
+        if bars:
+            columns = bars.columns()
+            rows = zip(
+                [series] * len(bars),
+                bars.ts[:len(bars)].tolist(),
+                *(columns[col].tolist() for col in BAR_COLUMNS)
+            )
+        else:
+            rows = []
+
+        start = _day(start)
+        end = min(_day(end), datetime.now().date() - timedelta(days=1))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO bars (series, ts, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            if start <= end:
+                self._add_coverage(series, start, end)
+
+    def _add_coverage(self, series, start, end):
+        # Merge with any overlapping or adjacent ranges so coverage stays compact
+        rows = self._conn.execute(
+            "SELECT rowid, start_day, end_day FROM coverage WHERE series = ? "
+            "AND start_day <= ? AND end_day >= ?",
+            (series, (end + timedelta(days=1)).isoformat(), (start - timedelta(days=1)).isoformat())
+        ).fetchall()
+        for rowid, s, e in rows:
+            start = min(start, datetime.strptime(s, "%Y-%m-%d").date())
+            end = max(end, datetime.strptime(e, "%Y-%m-%d").date())
+            self._conn.execute("DELETE FROM coverage WHERE rowid = ?", (rowid,))
+        self._conn.execute(
+            "INSERT INTO coverage (series, start_day, end_day) VALUES (?, ?, ?)",
+            (series, start.isoformat(), end.isoformat())
+        )
+
+    def load(self, series, start, end):
+        """Cached bars for [start, end] as a DataFrame indexed by date"""
+        lo = pd.Timestamp(_day(start)).value
+        hi = (pd.Timestamp(_day(end)) + pd.Timedelta(days=1)).value
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, open, high, low, close, volume FROM bars "
+                "WHERE series = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                (series, lo, hi)
+            ).fetchall()
+        data = pd.DataFrame(rows, columns=['date'] + BAR_COLUMNS)
+        data['date'] = pd.to_datetime(data['date'].astype(np.int64), unit='ns')
+        data.set_index('date', inplace=True)
+        return data
+
+
+def _duration_for(start, end):
+    """IB durationStr covering [start, end]"""
+    days = (end - start).days + 1
+    if days > 365:
+        return f"{-(-days // 365)} Y"
+    return f"{days} D"
+
+
+class CachedBarRequest:
+    """
+    Handle for bars served from the cache, plus at most one IB gap request
+
+    result() waits for the gap request (if any), merges it into the cache and
+    returns the full [start, end] window from disk. With a StageTimer, the
+    merge and the DataFrame build are timed as "bars.store" and "bars.frame".
+    """
+
+    def __init__(self, cache, series, start, end, future=None, span=None, timer=None):
+        self.cache = cache
+        self.series = series
+        self.start = start
+        self.end = end
+        self.future = future
+        self.span = span
+        self.timer = timer
+        self._data = None
+
+    def result(self, timeout=None):
+        if self._data is None:
+            if self.future is not None:
+                bars = self.future.result(timeout=timeout)
+                with self._timed("bars.store"):
+                    self.cache.store(self.series, bars, *self.span)
+                self.future = None
+            with self._timed("bars.frame"):
+                self._data = self.cache.load(self.series, self.start, self.end)
+        return self._data
+
+    def _timed(self, stage):
+        return self.timer.span(stage) if self.timer is not None else nullcontext()
+
+
+def request_cached_bars(scheduler, cache, contract, what_to_show, start, end,
+                        bar_size="1 day", use_rth=1, timer=None, **submit_kwargs):
+    """
+    Serve a historical bar window from the cache, requesting only what is missing
+
+    The missing ranges are collapsed into one request spanning the first to
+    the last gap, which is usually a single gap at either edge of the cached
+    window. When nothing is missing no request is sent. Requests go through
+    the HistoricalRequestScheduler so they respect IB's pacing limits; extra
+    keyword arguments (e.g. priority) are passed on to scheduler.submit.
+    timer is an optional StageTimer for the returned handle.
+    """
+    series = series_key(contract, what_to_show, bar_size)
+    missing = cache.missing_ranges(series, start, end)
+    if not missing:
+        return CachedBarRequest(cache, series, start, end, timer=timer)
+
+    gap_start, gap_end = missing[0][0], missing[-1][1]
+    future = scheduler.submit(
+        contract,
+        what_to_show,
+        (gap_end + timedelta(days=1)).strftime("%Y%m%d %H:%M:%S"),
+        _duration_for(gap_start, gap_end),
+        bar_size=bar_size,
+        use_rth=use_rth,
+        **submit_kwargs
+    )
+    return CachedBarRequest(cache, series, start, end, future, (gap_start, gap_end), timer)
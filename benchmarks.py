@@ -0,0 +1,334 @@
+"""
+Benchmarks for option_math and the analysis pipeline
+
+    python benchmarks.py                                  # run and print
+    python benchmarks.py --save baseline.json             # store a JSON baseline
+    python benchmarks.py --compare baseline.json          # fail on regressions
+    python benchmarks.py --only option_math --max-size 10000000
+
+Every case reports the best per-call time over several repeats. With
+--compare, any case slower than its baseline by more than --threshold
+(default 25%) is listed and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Python-loop ("scalar") cases get slow quickly; they stop at this size
+MAX_SCALAR_SIZE = 10_000
+# American pricers are timed on option-chain sized batches only
+MAX_AMERICAN_SIZE = 10_000
+# Tree steps timed for the American tree: fast and the default
+AMERICAN_TREE_STEPS = (51, 101)
+
+DEFAULT_THRESHOLD = 0.25
+
+
+def _time(func, repeat=5, min_time=0.05):
+    """Best seconds per call of func(), calibrating the loop count like timeit"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _option_inputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    S = rng.uniform(50, 150, n)
+    K = rng.uniform(50, 150, n)
+    T = rng.uniform(0.02, 1.0, n)
+    sigma = rng.uniform(0.1, 1.0, n)
+    return S, K, T, 0.05, sigma
+
+
+def synthetic_bars(n_days=60, start="2025-07-01", base=100.0, seed=0):
+    """Daily OHLCV bars following a random walk"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(start, periods=n_days, name='date')
+    close = base * np.exp(np.cumsum(rng.normal(0, 0.02, n_days)))
+    open_ = close * (1 + rng.normal(0, 0.005, n_days))
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) * 1.01,
+        'low': np.minimum(open_, close) * 0.99,
+        'close': close,
+        'volume': rng.integers(100_000, 1_000_000, n_days).astype(float),
+    }, index=index)
+
+
+def synthetic_iv(index, pre=0.6, post=0.35, crush_at=None):
+    """OPTION_IMPLIED_VOLATILITY-style bars that drop from pre to post"""
+    crush_at = len(index) // 2 if crush_at is None else crush_at
+    vol = np.where(np.arange(len(index)) < crush_at, pre, post)
+    return pd.DataFrame({'close': vol, 'implied_vol': vol}, index=index)
+
+
+def bench_option_math(sizes):
+    import option_math as om
+
+    results = {}
+    scalar_funcs = {
+        'black_scholes_call': om.black_scholes_call,
+        'black_scholes_put': om.black_scholes_put,
+        'calculate_delta': om.calculate_delta,
+        'calculate_vega': om.calculate_vega,
+    }
+    for n in sizes:
+        S, K, T, r, sigma = _option_inputs(n)
+
+        for name, func in scalar_funcs.items():
+            results[f'option_math.{name}.array[{n}]'] = _time(lambda: func(S, K, T, r, sigma), repeat=3)
+            if n <= MAX_SCALAR_SIZE:
+                args = list(zip(S.tolist(), K.tolist(), T.tolist(), sigma.tolist()))
+                results[f'option_math.{name}.scalar[{n}]'] = _time(
+                    lambda: [func(s, k, t, r, v) for s, k, t, v in args], repeat=3)
+
+        results[f'option_math.black_scholes_greeks.array[{n}]'] = _time(
+            lambda: om.black_scholes_greeks(S, K, T, r, sigma), repeat=3)
+        out = om.allocate_greeks(n)
+        results[f'option_math.black_scholes_greeks.preallocated[{n}]'] = _time(
+            lambda: om.black_scholes_greeks(S, K, T, r, sigma, out=out), repeat=3)
+        if n <= MAX_SCALAR_SIZE:
+            args = list(zip(S.tolist(), K.tolist(), T.tolist(), sigma.tolist()))
+            results[f'option_math.black_scholes_greeks.scalar[{n}]'] = _time(
+                lambda: [om.black_scholes_greeks(s, k, t, r, v) for s, k, t, v in args], repeat=3)
+
+        prices = om.black_scholes_call(S, K, T, r, sigma)
+        results[f'option_math.implied_volatility.array[{n}]'] = _time(
+            lambda: om.implied_volatility(prices, S, K, T, r), repeat=3)
+
+        if n <= MAX_AMERICAN_SIZE:
+            results[f'option_math.american_baw_greeks.array[{n}]'] = _time(
+                lambda: om.american_baw_greeks(S, K, T, r, sigma, q=0.02), repeat=3)
+            for steps in AMERICAN_TREE_STEPS:
+                results[f'option_math.american_tree_greeks.steps{steps}[{n}]'] = _time(
+                    lambda: om.american_tree_greeks(S, K, T, r, sigma, q=0.02, steps=steps), repeat=3)
+    return results
+
+
+def bench_analysis(n_events):
+    from iv_analysis import run_iv_crush_analysis, run_batch_analysis
+
+    results = {}
+    stock = synthetic_bars()
+    iv = synthetic_iv(stock.index)
+    earnings_date = stock.index[len(stock) // 2 - 1]
+    results['analysis.run_iv_crush_analysis'] = _time(
+        lambda: run_iv_crush_analysis(stock, iv, None, earnings_date, 30, 0.05))
+
+    tickers = [f"T{i}" for i in range(max(n_events // 20, 1))]
+    stock_bars = {t: synthetic_bars(n_days=750, start="2022-01-03", seed=i) for i, t in enumerate(tickers)}
+    iv_bars = {t: synthetic_iv(data.index) for t, data in stock_bars.items()}
+    rng = np.random.default_rng(0)
+    events = pd.DataFrame({
+        'ticker': rng.choice(tickers, n_events),
+        'earnings_date': pd.Timestamp("2022-02-01") + pd.to_timedelta(rng.integers(0, 900, n_events), 'D'),
+        'days_to_expiry': 30,
+    })
+    results[f'analysis.run_batch_analysis[{n_events}]'] = _time(
+        lambda: run_batch_analysis(events, stock_bars, iv_bars), repeat=3)
+
+    from straddle_mc import simulate_straddle_pnl, DEFAULT_PATHS
+    results[f'analysis.simulate_straddle_pnl[{DEFAULT_PATHS}]'] = _time(
+        lambda: simulate_straddle_pnl(100.0, 0.6, 0.35, 30, 0.05, seed=0), repeat=3)
+    return results
+
+
+def bench_bar_frames(n_bars):
+    from ibapi.common import BarData
+    from bar_buffer import BarBuffer
+
+    bars = []
+    for ts in pd.date_range("2020-01-01 09:30", periods=n_bars, freq="min"):
+        bar = BarData()
+        bar.date = ts.strftime("%Y%m%d  %H:%M:%S")
+        bar.open = bar.high = bar.low = bar.close = 100.0
+        bar.volume = 1000
+        bars.append(bar)
+
+    def columnar():
+        buffer = BarBuffer()
+        for bar in bars:
+            buffer.append(bar)
+        return buffer.to_frame()
+
+    def dict_rows():
+        # The original list-of-dicts path, for reference
+        rows = [{'date': b.date, 'open': b.open, 'high': b.high, 'low': b.low,
+                 'close': b.close, 'volume': b.volume} for b in bars]
+        data = pd.DataFrame(rows)
+        data['date'] = pd.to_datetime(data['date'])
+        return data.set_index('date')
+
+    return {
+        f'bars.bar_buffer_frame[{n_bars}]': _time(columnar, repeat=3),
+        f'bars.dict_rows_frame[{n_bars}]': _time(dict_rows, repeat=3),
+    }
+
+
+def bench_visualizations():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from chart_renderer import ChartRenderer
+    from iv_analysis import run_iv_crush_analysis
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+    renderer = ChartRenderer(fig, ax1, ax2, fig.canvas)
+
+    # Two tickers at different price levels, so switching changes the axes
+    analyses = []
+    for seed, base in ((0, 100.0), (1, 450.0)):
+        stock = synthetic_bars(base=base, seed=seed)
+        iv = synthetic_iv(stock.index)
+        earnings_date = stock.index[len(stock) // 2 - 1].to_pydatetime()
+        options = run_iv_crush_analysis(stock, iv, None, earnings_date, 30, 0.05)["options"]
+        analyses.append((f"T{seed}", earnings_date, stock, iv, options))
+    vix = synthetic_bars(base=20, seed=2)
+
+    results = {}
+    for name, vix_data in (('vix', vix), ('straddle_bars', None)):
+        state = {'i': 0}
+
+        def switch():
+            state['i'] ^= 1
+            ticker, earnings_date, stock, iv, options = analyses[state['i']]
+            renderer.update(ticker, earnings_date, stock, iv, vix_data, options)
+
+        def same():
+            ticker, earnings_date, stock, iv, options = analyses[0]
+            renderer.update(ticker, earnings_date, stock, iv, vix_data, options)
+
+        def new():
+            # A ticker not seen before: new limits on both charts, so no cached background fits
+            state['n'] = state.get('n', 0) + 1
+            scale = 2 + state['n'] % 1000 * 1e-3
+            ticker, earnings_date, stock, iv, options = analyses[0]
+            renderer.update(ticker, earnings_date, stock * scale, iv, vix_data,
+                            {key: value * scale for key, value in options.items()})
+
+        results[f'render.switch_ticker.{name}'] = _time(switch, repeat=3, min_time=0.2)
+        results[f'render.new_ticker.{name}'] = _time(new, repeat=3, min_time=0.2)
+        results[f'render.same_ticker.{name}'] = _time(same, repeat=3, min_time=0.2)
+
+    plt.close(fig)
+    return results
+
+
+def bench_reports():
+    import os
+    import tempfile
+    from iv_analysis import run_batch_analysis
+    from report_render import ReportTemplate
+
+    stock = synthetic_bars(seed=0)
+    iv = synthetic_iv(stock.index)
+    vix = synthetic_bars(base=20, seed=2)
+    events = pd.DataFrame({'ticker': 'T0', 'earnings_date': stock.index[[15, 30, 45]], 'days_to_expiry': 30})
+    rows = run_batch_analysis(events, {'T0': stock}, {'T0': iv}, vix)
+    template = ReportTemplate()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, 'report')
+        for formats in (('png',), ('png', 'html'), ('pdf',)):
+            state = {'i': 0}
+
+            def render():
+                state['i'] += 1
+                template.render(rows.iloc[state['i'] % len(rows)], stock, iv, vix, path, formats)
+
+            results[f"report.{'+'.join(formats)}"] = _time(render, repeat=3, min_time=0.2)
+    return results
+
+
+def run(only=None, max_size=1_000_000, n_events=10_000, n_bars=100_000):
+    sizes = [10 ** p for p in range(int(np.log10(max_size)) + 1)]
+    groups = {
+        'option_math': lambda: bench_option_math(sizes),
+        'analysis': lambda: bench_analysis(n_events),
+        'bars': lambda: bench_bar_frames(n_bars),
+        'render': bench_visualizations,
+        'report': bench_reports,
+    }
+    results = {}
+    for name, bench in groups.items():
+        if only and name not in only:
+            continue
+        print(f"Running {name} benchmarks...", file=sys.stderr)
+        results.update(bench())
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Cases slower than baseline by more than threshold: [(name, baseline, current)]"""
+    regressions = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base and seconds > base * (1 + threshold):
+            regressions.append((name, base, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark option_math and the analysis pipeline")
+    parser.add_argument("--only", nargs="+", choices=["option_math", "analysis", "bars", "render", "report"])
+    parser.add_argument("--max-size", type=float, default=1e6, help="Largest array size (up to 1e7)")
+    parser.add_argument("--events", type=int, default=10_000, help="Events for the batch benchmark")
+    parser.add_argument("--bars", type=int, default=100_000, help="Bars for the DataFrame benchmark")
+    parser.add_argument("--save", help="Write results as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown before failing (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.only, int(args.max_size), args.events, args.bars)
+    for name, seconds in results.items():
+        print(f"{name:60s} {seconds * 1e3:12.4f} ms")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                'meta': {
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'pandas': pd.__version__,
+                    'machine': platform.platform(),
+                },
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, seconds in regressions:
+            print(f"REGRESSION {name}: {base * 1e3:.4f} ms -> {seconds * 1e3:.4f} ms "
+                  f"({seconds / base - 1:+.0%})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,488 @@
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.ticker import FixedLocator, FixedFormatter
+from matplotlib.transforms import Bbox
+
+# Days either side of earnings shown on the charts
+WINDOW_DAYS = 5
+
+OPTION_TYPES = ['Call', 'Put', 'Straddle']
+
+# Chart backgrounds kept for blitting, by layout and axes limits (about 2 MB
+# each on the dashboard figure), so switching back to a ticker skips the draw
+PANEL_CACHE_SIZE = 12
+
+
+def _window(data, earnings_date, column):
+    """(date numbers, values) of `column` within WINDOW_DAYS of earnings"""
+    if data is None or len(data) == 0:
+        return np.empty(0), np.empty(0)
+    mask = ((data.index >= earnings_date - timedelta(days=WINDOW_DAYS)) &
+            (data.index <= earnings_date + timedelta(days=WINDOW_DAYS)))
+    window = data[mask]
+    return mdates.date2num(window.index), window[column].to_numpy(dtype=float)
+
+
+class ChartRenderer:
+    """
+    Draws the IV crush charts by updating artists created once
+
+    Every line, bar, text and legend (and the IV twin axis) is built up front
+    and only has its data, heights and visibility changed on update(). The
+    data artists are always redrawn over a cached background (blitting).
+    Backgrounds are kept per chart, left and right, for each set of axes
+    limits and titles, so a ticker switch only redraws the chart whose limits
+    changed, and switching back to a recent ticker redraws nothing but the
+    data. The canvas is only redrawn in full (draw_idle) the first time a
+    layout is seen, to find where to split it. tight_layout only runs when
+    something that affects it changes: the right chart's mode (VIX vs option
+    bars), whether the IV axis is shown, or the width of the tick labels, and
+    its result is remembered for each such layout.
+
+    Parameters:
+    fig, ax1, ax2: The dashboard figure and its two axes
+    canvas: Canvas the figure is drawn on
+    timer: Optional StageTimer; full draws are recorded as "ui.canvas_draw",
+           single-chart redraws as "ui.panel_draw" and blitted updates as "ui.blit"
+    interactive: False for off-screen figures that are only saved: update()
+                 then just sets up the artists and layout, and the caller
+                 does the one draw
+    """
+
+    def __init__(self, fig, ax1, ax2, canvas, timer=None, interactive=True):
+        self.fig = fig
+        self.ax1 = ax1
+        self.ax2 = ax2
+        self.canvas = canvas
+        self.timer = timer
+        self.interactive = interactive
+
+        self._capturing = False
+        self._draw_requested = None
+        self._layout_key = None
+        self._geometry = None # (layout key, canvas bounds) the current backgrounds belong to
+        self._splits = {} # geometry -> x (pixels) between the left and right charts
+        self._regions = {} # chart -> its current background
+        self._keys = {} # chart -> limits, titles and mode its background was drawn with
+        self._cache = OrderedDict() # (geometry, chart, key) -> background, least recently used first
+        self._layouts = {} # layout key -> subplot params from tight_layout
+        self._mode = None
+
+        if interactive:
+            canvas.mpl_connect('draw_event', self._on_draw)
+        self._build()
+
+    def _build(self):
+        ax1, ax2 = self.ax1, self.ax2
+
+        # Left: stock price, earnings marker and IV on a twin axis
+        self.stock_line, = ax1.plot([], [], 'b-', linewidth=2, label='Stock Price')
+        self.earnings_line1 = ax1.axvline(x=0, color='red', linestyle='--', alpha=0.7, label='Earnings Date')
+        ax1.xaxis_date()
+        ax1.set_xlabel('Date')
+        ax1.set_ylabel('Stock Price ($)', color='blue')
+        ax1.tick_params(axis='y', labelcolor='blue')
+        ax1.tick_params(axis='x', rotation=45)
+        ax1.grid(True, alpha=0.3)
+        self.stock_legend = ax1.legend(loc='upper left')
+
+        self.ax1_twin = ax1.twinx()
+        self.iv_line, = self.ax1_twin.plot([], [], 'g-', linewidth=2,
+                                           label=f'Implied Volatility (% annualized √252={np.sqrt(252):.1f})')
+        self.ax1_twin.set_ylabel('Implied Volatility (% annualized)', color='green')
+        self.ax1_twin.tick_params(axis='y', labelcolor='green')
+        self.ax1_twin.legend(loc='upper right')
+
+        # Right, VIX mode: VIX line and earnings marker
+        self.vix_line, = ax2.plot([], [], 'purple', linewidth=2, label='VIX')
+        self.earnings_line2 = ax2.axvline(x=0, color='red', linestyle='--', alpha=0.7, label='Earnings Date')
+        self.vix_legend = ax2.legend(handles=[self.vix_line, self.earnings_line2])
+        ax2.add_artist(self.vix_legend)
+
+        # Right, bar mode (no VIX data): pre/post option prices
+        x = np.arange(len(OPTION_TYPES))
+        width = 0.35
+        self.pre_bars = ax2.bar(x - width / 2, np.zeros(len(x)), width, label='Pre-Earnings (High IV)',
+                                color=['lightblue', 'lightgreen', 'blue'], alpha=0.8)
+        self.post_bars = ax2.bar(x + width / 2, np.zeros(len(x)), width, label='Post-Earnings (Low IV)',
+                                 color=['lightcoral', 'lightpink', 'red'], alpha=0.8)
+        self.bar_texts = [
+            ax2.text(bar.get_x() + bar.get_width() / 2., 0, '', ha='center', va='bottom', fontsize=9)
+            for bar in list(self.pre_bars) + list(self.post_bars)
+        ]
+        self.straddle_text = ax2.text(0.02, 0.98, '', transform=ax2.transAxes, fontsize=12, fontweight='bold',
+                                      verticalalignment='top',
+                                      bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+        self.bar_legend = ax2.legend(handles=[self.pre_bars, self.post_bars])
+        ax2.grid(True, alpha=0.3)
+
+        # No top ticks, so titles sit at the top edge; a fixed y skips measuring the axes on every draw
+        for ax in (ax1, self.ax1_twin, ax2):
+            ax.set_title('', y=1.0)
+
+        self.vix_artists = [self.vix_line, self.earnings_line2, self.vix_legend]
+        self.bar_artists = (list(self.pre_bars) + list(self.post_bars) + self.bar_texts +
+                            [self.straddle_text, self.bar_legend])
+
+        # Artists redrawn on a blitted update, per axes
+        self.data_artists = [
+            (ax1, [self.stock_line, self.earnings_line1]),
+            (self.ax1_twin, [self.iv_line]),
+            (ax2, [self.vix_line, self.earnings_line2] + list(self.pre_bars) + list(self.post_bars) +
+             self.bar_texts + [self.straddle_text]),
+        ]
+        self.clear()
+
+    def _set_mode(self, mode):
+        """Switch the right chart between 'vix', 'bars' and None (empty)"""
+        if mode == self._mode:
+            return
+        self._mode = mode
+        ax2 = self.ax2
+        for artist in self.vix_artists:
+            artist.set_visible(mode == 'vix')
+        for artist in self.bar_artists:
+            artist.set_visible(mode == 'bars')
+
+        if mode == 'bars':
+            ax2.xaxis.set_major_locator(FixedLocator(np.arange(len(OPTION_TYPES))))
+            ax2.xaxis.set_major_formatter(FixedFormatter(OPTION_TYPES))
+            ax2.tick_params(axis='x', rotation=0)
+            ax2.set_xlabel('Option Strategy')
+            ax2.set_ylabel('Option Price ($)')
+            ax2.set_title('ATM Options & Straddle: IV Crush Impact')
+        elif mode == 'vix':
+            ax2.set_autoscale_on(True)
+            locator = mdates.AutoDateLocator()
+            ax2.xaxis.set_major_locator(locator)
+            ax2.xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
+            ax2.tick_params(axis='x', rotation=45)
+            ax2.set_xlabel('Date')
+            ax2.set_ylabel('VIX Level')
+            ax2.set_title('VIX Around Earnings Date')
+        else:
+            ax2.set_xlabel('')
+            ax2.set_ylabel('')
+            ax2.set_title('')
+
+    def update(self, ticker, earnings_date, stock_data, iv_data=None, vix_data=None, options=None,
+               keep_limits=False):
+        """
+        Show an analysis
+
+        Parameters:
+        ticker, earnings_date: Used for the title and the earnings marker
+        stock_data, iv_data, vix_data: Bar DataFrames (iv_data needs implied_vol)
+        options: run_iv_crush_analysis()["options"], shown as bars when there is no VIX data
+        keep_limits: Keep each axes' limits while its data still fits inside
+                     them (live updates), so small moves are blitted
+        """
+        earnings_x = mdates.date2num(earnings_date)
+
+        x, y = _window(stock_data, earnings_date, 'close')
+        self.stock_line.set_data(x, y)
+        self.earnings_line1.set_xdata([earnings_x, earnings_x])
+        self.earnings_line1.set_visible(True)
+        self.stock_legend.set_visible(True)
+        self.ax1.set_title(f'{ticker} Stock Price Around Earnings')
+
+        iv_x, iv_y = _window(iv_data, earnings_date, 'implied_vol')
+        self.iv_line.set_data(iv_x, iv_y * 100)
+        self.ax1_twin.set_visible(len(iv_x) > 0)
+
+        if vix_data is not None:
+            self._set_mode('vix')
+            x, y = _window(vix_data, earnings_date, 'close')
+            self.vix_line.set_data(x, y)
+            self.earnings_line2.set_xdata([earnings_x, earnings_x])
+        else:
+            self._set_mode('bars')
+            pre = [options[f'pre_{key}'] for key in ('call', 'put', 'straddle')]
+            post = [options[f'post_{key}'] for key in ('call', 'put', 'straddle')]
+            for bar, text, height in zip(list(self.pre_bars) + list(self.post_bars), self.bar_texts, pre + post):
+                bar.set_height(height)
+                text.set_y(height + 0.5)
+                text.set_text(f'${height:.1f}')
+            change = post[2] - pre[2]
+            self.straddle_text.set_text(f'Straddle Loss: {change:+.2f}')
+
+        self._autoscale(keep_limits)
+        self._render()
+
+    def clear(self):
+        """Hide all data, keeping the artists for the next update"""
+        for line in (self.stock_line, self.iv_line, self.vix_line):
+            line.set_data([], [])
+        self.earnings_line1.set_visible(False)
+        self.stock_legend.set_visible(False)
+        self.ax1.set_title('')
+        self.ax1_twin.set_visible(False)
+        self._set_mode(None)
+        self._render()
+
+    def _autoscale(self, keep_limits=False):
+        for ax in (self.ax1, self.ax1_twin, self.ax2):
+            if ax.get_visible():
+                ax.relim(visible_only=True)
+                view, data = ax.viewLim, ax.dataLim
+                if (keep_limits and view.x0 <= data.x0 and data.x1 <= view.x1 and
+                        view.y0 <= data.y0 and data.y1 <= view.y1):
+                    continue
+                ax.autoscale_view()
+        if self._mode == 'bars':
+            # Leave room above the bars for their value labels
+            top = max(bar.get_height() for bar in list(self.pre_bars) + list(self.post_bars))
+            self.ax2.set_xlim(-0.6, len(OPTION_TYPES) - 0.4)
+            self.ax2.set_ylim(0, max(top * 1.15 + 1.0, 1.0))
+
+    def _panels(self):
+        """(name, axes, static key) of the left and right charts"""
+        twin = self.ax1_twin.get_visible()
+        return (
+            ('left', (self.ax1, self.ax1_twin),
+             (twin, self.stock_legend.get_visible(), self.ax1.get_title(),
+              self.ax1.get_xlim() + self.ax1.get_ylim() + (self.ax1_twin.get_ylim() if twin else ()))),
+            ('right', (self.ax2,), (self._mode, self.ax2.get_title(), self.ax2.get_xlim() + self.ax2.get_ylim())),
+        )
+
+    def _render(self):
+        axes = (self.ax1, self.ax1_twin, self.ax2)
+        # Tick label widths only change with the magnitude of the y limits
+        layout_key = (self._mode, self.ax1_twin.get_visible(),
+                      tuple(len(f"{abs(lim):.0f}") for ax in axes for lim in ax.get_ylim()))
+        if layout_key != self._layout_key:
+            self._layout_key = layout_key
+            self._apply_layout(layout_key)
+        if not self.interactive:
+            return
+        if self._capturing:
+            # A full draw is already on its way and will pick up this state
+            return
+
+        geometry = (layout_key, tuple(self.fig.bbox.bounds))
+        if geometry not in self._splits:
+            # First time at this layout: a full draw also finds where the charts split
+            self._request_draw()
+            return
+        if geometry != self._geometry:
+            self._geometry = geometry
+            self._regions, self._keys = {}, {}
+
+        missing = []
+        for name, panel_axes, key in self._panels():
+            if self._keys.get(name) == key:
+                continue
+            region = self._cache.get((geometry, name, key))
+            if region is None:
+                missing.append((name, panel_axes, key))
+                continue
+            self._cache.move_to_end((geometry, name, key))
+            self._regions[name], self._keys[name] = region, key
+        if missing:
+            self._draw_panels(missing)
+        self._blit()
+
+    def _apply_layout(self, layout_key):
+        # tight_layout measures every tick label; reuse its result for layouts seen before
+        params = self._layouts.get(layout_key)
+        if params is None:
+            self.fig.tight_layout()
+            # tight_layout leaves a placeholder layout engine behind, which makes savefig draw twice
+            self.fig.set_layout_engine(None)
+            sp = self.fig.subplotpars
+            params = self._layouts[layout_key] = dict(
+                left=sp.left, right=sp.right, bottom=sp.bottom, top=sp.top, wspace=sp.wspace, hspace=sp.hspace
+            )
+        else:
+            self.fig.subplots_adjust(**params)
+
+    def _set_animated(self, animated):
+        for _, artists in self.data_artists:
+            for artist in artists:
+                artist.set_animated(animated)
+
+    def _panel_bbox(self, name):
+        x0, y0, x1, y1 = self.fig.bbox.extents
+        split = self._splits[self._geometry]
+        return Bbox.from_extents(x0, y0, split, y1) if name == 'left' else Bbox.from_extents(split, y0, x1, y1)
+
+    def _store_panel(self, name, key):
+        region = self.canvas.copy_from_bbox(self._panel_bbox(name))
+        self._regions[name], self._keys[name] = region, key
+        self._cache[(self._geometry, name, key)] = region
+        while len(self._cache) > PANEL_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _request_draw(self):
+        # Draw the static layer alone so it can be cached as the blit background
+        self._set_animated(True)
+        self._capturing = True
+        self._draw_requested = time.perf_counter()
+        self.canvas.draw_idle()
+
+    def _on_draw(self, event):
+        if event.canvas is not self.canvas:
+            # savefig to another format (PDF) draws on its own canvas and leaves this one alone
+            return
+        if not self._capturing:
+            # Redrawn by something else (toolbar, resize); the backgrounds are stale
+            self._splits.clear()
+            self._cache.clear()
+            self._geometry = None
+            return
+        self._capturing = False
+
+        # Split the canvas midway between the charts' tick labels, so each can be redrawn alone
+        renderer = self.canvas.get_renderer()
+        left = Bbox.union([ax.get_tightbbox(renderer) for ax in (self.ax1, self.ax1_twin) if ax.get_visible()])
+        right = self.ax2.get_tightbbox(renderer)
+        self._geometry = (self._layout_key, tuple(self.fig.bbox.bounds))
+        self._splits[self._geometry] = round((left.x1 + right.x0) / 2)
+        self._regions, self._keys = {}, {}
+        for name, _, key in self._panels():
+            self._store_panel(name, key)
+
+        self._set_animated(False)
+        self._draw_data()
+        if self.timer is not None and self._draw_requested is not None:
+            self.timer.record_since("ui.canvas_draw", self._draw_requested)
+
+    def _draw_panels(self, panels):
+        """Redraw the static layer of some charts, keeping the others' backgrounds"""
+        start = time.perf_counter()
+        renderer = self.canvas.get_renderer()
+        redrawn = {name for name, _, _ in panels}
+        self._set_animated(True)
+        renderer.clear()
+        self.fig.patch.draw(renderer)
+        for name, region in self._regions.items():
+            if name not in redrawn:
+                self.canvas.restore_region(region)
+        for name, panel_axes, key in panels:
+            for ax in panel_axes:
+                if ax.get_visible():
+                    self.fig.draw_artist(ax)
+            self._store_panel(name, key)
+        self._set_animated(False)
+        if self.timer is not None:
+            self.timer.record_since("ui.panel_draw", start)
+
+    def _blit(self):
+        start = time.perf_counter()
+        for region in self._regions.values():
+            self.canvas.restore_region(region)
+        self._draw_data()
+        if self.timer is not None:
+            self.timer.record_since("ui.blit", start)
+
+    def _draw_data(self):
+        for ax, artists in self.data_artists:
+            if not ax.get_visible():
+                continue
+            for artist in artists:
+                if artist.get_visible():
+                    ax.draw_artist(artist)
+        self.canvas.blit(self.fig.bbox)
+
+
+def draw_crush_surface(fig, ax, grid, spot=None, title=None, max_labels=15):
+    """
+    Heatmap of a strike × expiry grid (see option_chain.surface_grid)
+
+    Missing cells are left blank. A dashed line marks the spot price when
+    given.
+    """
+    values = np.ma.masked_invalid(grid.to_numpy(dtype=float))
+    image = ax.imshow(values, aspect='auto', origin='lower', cmap='RdYlGn_r', interpolation='nearest')
+
+    strikes = grid.index.to_numpy(dtype=float)
+    rows = np.arange(len(strikes))
+    step = max(len(rows) // max_labels, 1)
+    ax.set_yticks(rows[::step])
+    ax.set_yticklabels([f'{k:g}' for k in strikes[::step]])
+
+    columns = np.arange(grid.shape[1])
+    step = max(len(columns) // max_labels, 1)
+    ax.set_xticks(columns[::step])
+    ax.set_xticklabels([f'{e:%Y-%m-%d}' for e in grid.columns[::step]], rotation=45, ha='right')
+
+    if spot is not None and len(strikes) > 1:
+        ax.axhline(np.interp(spot, strikes, rows), color='black', linestyle='--', linewidth=1, label='Spot')
+        ax.legend(loc='upper right')
+
+    ax.set_xlabel('Expiry')
+    ax.set_ylabel('Strike')
+    if title:
+        ax.set_title(title)
+    fig.colorbar(image, ax=ax, label='IV crush (%)')
+    return image
+
+
+class SweepHeatmap:
+    """
+    Days-to-expiry × strike heatmap of a param_sweep grid, one rate at a time
+
+    The image, colorbar and ticks are built once; show() only swaps in
+    another slice of the (already computed) grid, so moving the rate slider
+    or switching metric never reprices anything. Color limits are fixed per
+    metric across all rates so slices can be compared by eye.
+
+    Parameters:
+    fig, ax, canvas: Figure, axes and canvas to draw on
+    grid: Result of param_sweep.sweep_grid
+    metrics: Dict of metric name -> label (param_sweep.SWEEP_METRICS)
+    title: Title prefix; the rate is appended
+    """
+
+    def __init__(self, fig, ax, canvas, grid, metrics, title="", max_labels=15):
+        self.fig, self.ax, self.canvas = fig, ax, canvas
+        self.grid = grid
+        self.metrics = metrics
+        self.title = title
+        self._limits = {}
+
+        metric = next(iter(metrics))
+        self.image = ax.imshow(grid[metric][0], aspect='auto', origin='lower', interpolation='nearest')
+        self.colorbar = fig.colorbar(self.image, ax=ax)
+
+        moneyness = grid['moneyness']
+        columns = np.arange(len(moneyness))
+        step = -(-len(columns) // max_labels)
+        ax.set_xticks(columns[::step])
+        ax.set_xticklabels([f'{m:+.0%}' for m in moneyness[::step]], rotation=45, ha='right')
+
+        dtes = grid['dtes']
+        rows = np.arange(len(dtes))
+        step = -(-len(rows) // max_labels)
+        ax.set_yticks(rows[::step])
+        ax.set_yticklabels([f'{d:g}' for d in dtes[::step]])
+
+        ax.set_xlabel('Strike vs pre-earnings spot')
+        ax.set_ylabel('Days to expiry')
+        self.show(metric, 0)
+        fig.tight_layout()
+
+    def _clim(self, metric):
+        if metric not in self._limits:
+            values = self.grid[metric]
+            if metric.startswith('pre_') or metric.startswith('post_'):
+                limits = (np.nanmin(values), np.nanmax(values), 'viridis')
+            else:
+                # Changes are centred on zero: red loses for a long straddle
+                bound = np.nanmax(np.abs(values)) or 1.0
+                limits = (-bound, bound, 'RdYlGn')
+            self._limits[metric] = limits
+        return self._limits[metric]
+
+    def show(self, metric, rate_index):
+        low, high, cmap = self._clim(metric)
+        self.image.set_data(self.grid[metric][rate_index])
+        self.image.set_cmap(cmap)
+        self.image.set_clim(low, high)
+        self.colorbar.set_label(self.metrics[metric])
+        self.ax.set_title(f"{self.title}r = {self.grid['rates'][rate_index]:.2%}")
+        self.canvas.draw_idle()
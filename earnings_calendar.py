@@ -0,0 +1,414 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from bar_cache import request_cached_bars, series_key
+from intraday_store import intraday_series, request_intraday_bars
+from iv_analysis import (BATCH_RESULT_COLUMNS, PRE_EVENT_COLUMNS, pre_event_analysis, post_event_analysis,
+                         result_frame, session_open)
+from market_data import EVENT_SERIES, event_window, series_contract, normalize_iv_data
+from request_scheduler import BACKGROUND, INTERACTIVE
+
+DEFAULT_PRE_EVENT_PATH = os.path.join(os.path.expanduser("~"), ".iv_crush", "pre_event.sqlite")
+
+# Regular session in exchange time; outside it (and on weekends) is off-hours
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+# Events prefetched up to this many calendar days ahead
+PREFETCH_HORIZON_DAYS = 14
+# Events still finished this many calendar days after their earnings date
+FINISH_GRACE_DAYS = 5
+# Seconds between passes of EarningsCalendarScheduler.watch
+WATCH_INTERVAL = 60
+# Seconds a pass waits for its bar requests
+PREFETCH_TIMEOUT = 600
+FINISH_TIMEOUT = 60
+
+CALENDAR_COLUMNS = ['ticker', 'earnings_date', 'days_to_expiry']
+
+# Column names used by common calendar feeds -> ours
+CALENDAR_ALIASES = {
+    'symbol': 'ticker',
+    'reportDate': 'earnings_date',
+    'report_date': 'earnings_date',
+    'date': 'earnings_date',
+    'dte': 'days_to_expiry',
+}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS pre_event (
+    ticker TEXT NOT NULL,
+    earnings_date INTEGER NOT NULL,
+    days_to_expiry REAL NOT NULL,
+    risk_free_rate REAL NOT NULL,
+    computed_at INTEGER,
+    iv_source TEXT,
+    {', '.join(f"{c} {'INTEGER' if c == 'pre_date' else 'REAL'}" for c in PRE_EVENT_COLUMNS)},
+    finished_at INTEGER,
+    PRIMARY KEY (ticker, earnings_date, days_to_expiry, risk_free_rate)
+) WITHOUT ROWID;
+"""
+
+_STORE_COLUMNS = ['ticker', 'earnings_date', 'days_to_expiry', 'risk_free_rate', 'computed_at', 'iv_source'] + \
+    PRE_EVENT_COLUMNS + ['finished_at']
+
+
+def _ns(value):
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+def load_calendar(path, days_to_expiry=30):
+    """
+    Earnings calendar from a CSV or JSON file
+
+    CSV and JSON record lists need ticker and earnings_date columns (or the
+    CALENDAR_ALIASES used by common feeds) and may give days_to_expiry; a
+    JSON object of ticker -> date or list of dates works too. Dates follow
+    the dashboard's convention: the pre-event leg is the close of that day.
+
+    Returns a DataFrame of CALENDAR_COLUMNS sorted by date, without duplicates.
+    """
+    if path.lower().endswith(".json"):
+        with open(path) as f:
+            raw = json.load(f)
+        if isinstance(raw, dict) and "events" in raw:
+            raw = raw["events"]
+        if isinstance(raw, dict):
+            raw = [{'ticker': ticker, 'earnings_date': date}
+                   for ticker, dates in raw.items() for date in (dates if isinstance(dates, list) else [dates])]
+        events = pd.DataFrame(raw)
+    else:
+        events = pd.read_csv(path)
+
+    events = events.rename(columns={k: v for k, v in CALENDAR_ALIASES.items() if v not in events})
+    missing = {'ticker', 'earnings_date'} - set(events)
+    if missing:
+        raise ValueError(f"Calendar {path} has no {', '.join(sorted(missing))} column")
+    if 'days_to_expiry' not in events:
+        events['days_to_expiry'] = days_to_expiry
+    events['ticker'] = events['ticker'].astype(str).str.upper()
+    events['earnings_date'] = pd.to_datetime(events['earnings_date']).dt.normalize()
+    events['days_to_expiry'] = events['days_to_expiry'].fillna(days_to_expiry)
+    return (events[CALENDAR_COLUMNS].drop_duplicates()
+            .sort_values(['earnings_date', 'ticker'], ignore_index=True))
+
+
+def next_event(calendar, ticker, now=None):
+    """Date of a ticker's next (or, failing that, latest) calendar event, or None"""
+    dates = calendar.loc[calendar['ticker'] == ticker.upper(), 'earnings_date']
+    if dates.empty:
+        return None
+    today = pd.Timestamp((now or datetime.now(MARKET_TZ)).date())
+    upcoming = dates[dates >= today]
+    return upcoming.min() if not upcoming.empty else dates.max()
+
+
+def is_off_hours(now=None):
+    """True outside the regular session (exchange time) and on weekends"""
+    now = now or datetime.now(MARKET_TZ)
+    return now.weekday() >= 5 or not MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def pre_session_closed(earnings_date, now):
+    """Whether the pre-event leg (the earnings date's close) is final"""
+    day = pd.Timestamp(earnings_date).date()
+    return day < now.date() or (day == now.date() and now.time() >= MARKET_CLOSE)
+
+
+def post_event_day(earnings_date):
+    """First weekday after the event, the day the post-event bar is taken from"""
+    return pd.Timestamp(np.busday_offset(np.datetime64(pd.Timestamp(earnings_date).date(), 'D'), 1,
+                                         roll='forward')).date()
+
+
+def post_bar_due(earnings_date, now, post_time):
+    """Whether the post-event bar at post_time (first weekday after the event) has printed"""
+    post_day = post_event_day(earnings_date)
+    return post_day < now.date() or (post_day == now.date() and
+                                     now.time() >= pd.Timestamp(f"1970-01-01 {post_time}").time())
+
+
+class PreEventStore:
+    """
+    SQLite store of precomputed pre-event halves (pre_event_analysis results)
+
+    One row per (ticker, earnings date, days to expiry, rate), replaced if
+    recomputed, plus which IV source the pre leg used (the post leg must use
+    the same one) and when the event was finished with its post-event bar.
+    """
+
+    def __init__(self, path=DEFAULT_PRE_EVENT_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def put(self, ticker, earnings_date, days_to_expiry, risk_free_rate, pre, iv_source):
+        values = [ticker.upper(), _ns(earnings_date), float(days_to_expiry), float(risk_free_rate),
+                  time.time_ns(), iv_source, _ns(pre['pre_date'])]
+        values += [float(pre[c]) for c in PRE_EVENT_COLUMNS[1:]] + [None]
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO pre_event ({', '.join(_STORE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_STORE_COLUMNS))})",
+                values
+            )
+
+    def get(self, ticker, earnings_date, days_to_expiry, risk_free_rate):
+        """A stored row as a dict (pre_date as a Timestamp), or None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_STORE_COLUMNS)} FROM pre_event "
+                "WHERE ticker = ? AND earnings_date = ? AND days_to_expiry = ? AND risk_free_rate = ?",
+                (ticker.upper(), _ns(earnings_date), float(days_to_expiry), float(risk_free_rate))
+            ).fetchone()
+        if row is None:
+            return None
+        row = dict(zip(_STORE_COLUMNS, row))
+        row['earnings_date'] = pd.Timestamp(row['earnings_date'])
+        row['pre_date'] = pd.Timestamp(row['pre_date'])
+        return row
+
+    def mark_finished(self, ticker, earnings_date, days_to_expiry, risk_free_rate):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE pre_event SET finished_at = ? "
+                "WHERE ticker = ? AND earnings_date = ? AND days_to_expiry = ? AND risk_free_rate = ?",
+                (time.time_ns(), ticker.upper(), _ns(earnings_date), float(days_to_expiry), float(risk_free_rate))
+            )
+
+    def table(self, tickers=None):
+        """Stored rows for some or all tickers, ordered by date and ticker"""
+        query = f"SELECT {', '.join(_STORE_COLUMNS)} FROM pre_event"
+        params = ()
+        if tickers:
+            tickers = [t.upper() for t in tickers]
+            query += f" WHERE ticker IN ({', '.join('?' * len(tickers))})"
+            params = tuple(tickers)
+        with self._lock:
+            data = pd.read_sql_query(query + " ORDER BY earnings_date, ticker", self._conn, params=params)
+        for column in ('earnings_date', 'pre_date', 'computed_at', 'finished_at'):
+            data[column] = pd.to_datetime(data[column])
+        return data
+
+
+class EarningsCalendarScheduler:
+    """
+    Prefetch and precompute upcoming earnings events from a calendar
+
+    prefetch(), meant for off-hours, warms the bar cache with each upcoming
+    event's pre-event bars on the BACKGROUND lane, and once an event's
+    pre-event session has closed stores its pre_event_analysis half. The
+    morning after, finish() requests only the post-event day's intraday
+    bars (on the INTERACTIVE lane) and completes the analysis at post_time,
+    so the watchlist's crush numbers need one small request per series and
+    event. IB's historical pacing limits (see request_scheduler) still cap
+    how many events that covers in the first minutes of a session.
+
+    Parameters:
+    scheduler: HistoricalRequestScheduler
+    cache: BarCache for the daily pre-event bars
+    intraday_store: IntradayStore for the post-event bars
+    pre_store: PreEventStore
+    calendar: load_calendar frame
+    risk_free_rate: Risk-free rate (annualized)
+    bar_size: Intraday bar size of the post-event bars
+    post_time: Post-event bar: first at or after this time (exchange time)
+    log: Called with each diagnostic message (failed requests and passes);
+         stderr by default
+    """
+
+    def __init__(self, scheduler, cache, intraday_store, pre_store, calendar, risk_free_rate=0.05,
+                 bar_size="1 min", post_time="09:45", horizon_days=PREFETCH_HORIZON_DAYS, timer=None, log=None):
+        self.scheduler = scheduler
+        self.cache = cache
+        self.intraday_store = intraday_store
+        self.pre_store = pre_store
+        self.calendar = calendar
+        self.risk_free_rate = risk_free_rate
+        self.bar_size = bar_size
+        self.post_time = post_time
+        self.horizon_days = horizon_days
+        self.timer = timer
+        self.log = log or (lambda message: print(message, file=sys.stderr))
+
+    def _timed(self, stage):
+        return self.timer.span(stage) if self.timer is not None else nullcontext()
+
+    def _events(self, first, last):
+        dates = self.calendar['earnings_date']
+        return self.calendar[(dates >= pd.Timestamp(first)) & (dates <= pd.Timestamp(last))]
+
+    def _pre(self, event):
+        return self.pre_store.get(event.ticker, event.earnings_date, event.days_to_expiry, self.risk_free_rate)
+
+    def prefetch(self, now=None, timeout=PREFETCH_TIMEOUT, offline=False):
+        """
+        Warm the bar cache for upcoming events and precompute their pre-event halves
+
+        Bars are requested up to the earnings date (or today, if sooner);
+        events whose pre-event half is stored already are skipped. With
+        offline=True nothing is requested and only cached bars are used.
+        Returns the pre-event rows computed by this call.
+        """
+        now = now or datetime.now(MARKET_TZ)
+        today = now.date()
+        events = [event for event in self._events(today - timedelta(days=FINISH_GRACE_DAYS),
+                                                  today + timedelta(days=self.horizon_days)).itertuples()
+                  if self._pre(event) is None]
+
+        pending = []
+        with self._timed("calendar.prefetch"):
+            for event in events:
+                start, _ = event_window(event.earnings_date)
+                end = min(event.earnings_date, pd.Timestamp(today))
+                for series, (what_to_show, _) in EVENT_SERIES.items():
+                    contract = series_contract(series, event.ticker)
+                    if offline:
+                        handle = self.cache.load(series_key(contract, what_to_show, "1 day"), start, end)
+                    else:
+                        handle = request_cached_bars(self.scheduler, self.cache, contract, what_to_show, start, end,
+                                                     timer=self.timer, priority=BACKGROUND)
+                    pending.append((event, series, handle))
+
+            deadline = time.time() + timeout
+            bars = {}
+            for event, series, handle in pending:
+                try:
+                    data = handle if isinstance(handle, pd.DataFrame) else \
+                        handle.result(timeout=max(deadline - time.time(), 0))
+                except Exception as e:
+                    self.log(f"{event.ticker} {event.earnings_date:%Y-%m-%d}: "
+                             f"{EVENT_SERIES[series][1]} prefetch failed ({e!r})")
+                    continue
+                bars[(event.Index, series)] = data
+
+        rows = []
+        with self._timed("calendar.precompute"):
+            for event in events:
+                if not pre_session_closed(event.earnings_date, now):
+                    continue
+                stock_data = bars.get((event.Index, "stock"))
+                if stock_data is None or stock_data.empty:
+                    continue
+                iv_data = bars.get((event.Index, "iv"))
+                vix_data = bars.get((event.Index, "vix"))
+                if iv_data is not None and not iv_data.empty:
+                    normalize_iv_data(iv_data)
+                    iv_source = "iv"
+                else:
+                    iv_data = None
+                    iv_source = "vix" if vix_data is not None and not vix_data.empty else "none"
+                try:
+                    pre = pre_event_analysis(stock_data, iv_data, vix_data if iv_source == "vix" else None,
+                                             event.earnings_date, event.days_to_expiry, self.risk_free_rate)
+                except Exception as e:
+                    self.log(f"{event.ticker} {event.earnings_date:%Y-%m-%d}: precompute failed ({e!r})")
+                    continue
+                self.pre_store.put(event.ticker, event.earnings_date, event.days_to_expiry, self.risk_free_rate,
+                                   pre, iv_source)
+                rows.append({'ticker': event.ticker, 'earnings_date': event.earnings_date,
+                             'days_to_expiry': event.days_to_expiry, 'iv_source': iv_source, **pre})
+        return pd.DataFrame(rows, columns=CALENDAR_COLUMNS + ['iv_source'] + PRE_EVENT_COLUMNS)
+
+    def finish(self, now=None, timeout=FINISH_TIMEOUT, offline=False):
+        """
+        Complete every precomputed event whose post-event bar is due
+
+        Requests only the post-event day's intraday stock bars, plus IV or VIX
+        bars (whichever the pre leg used), and prices the post-event leg at
+        post_time. Finished events are marked in the PreEventStore and not
+        done again. Returns a run_batch_analysis-style frame of the results.
+        """
+        now = now or datetime.now(MARKET_TZ)
+        today = now.date()
+        due = []
+        for event in self._events(today - timedelta(days=FINISH_GRACE_DAYS), today).itertuples():
+            pre = self._pre(event)
+            if pre is None or pre['finished_at'] is not None or not post_bar_due(event.earnings_date, now,
+                                                                               self.post_time):
+                continue
+            series = ["stock"] + ([pre['iv_source']] if pre['iv_source'] != "none" else [])
+            due.append((event, pre, post_event_day(event.earnings_date), series))
+
+        rows = []
+        with self._timed("calendar.finish"):
+            pending = []
+            for event, pre, post_day, series in due if not offline else ():
+                for name in series:
+                    try:
+                        pending.append(request_intraday_bars(
+                            self.scheduler, self.intraday_store, series_contract(name, event.ticker),
+                            EVENT_SERIES[name][0], [post_day], self.bar_size, timer=self.timer, priority=INTERACTIVE
+                        ))
+                    except Exception as e:
+                        self.log(f"{event.ticker} {event.earnings_date:%Y-%m-%d}: post-event request failed ({e!r})")
+            deadline = time.time() + timeout
+            for handle in pending:
+                try:
+                    handle.result(timeout=max(deadline - time.time(), 0))
+                except Exception as e:
+                    self.log(f"{handle.series}: post-event bars unavailable ({e!r})")
+
+            for event, pre, post_day, series in due:
+                data = {name: self.intraday_store.load(
+                    intraday_series(series_contract(name, event.ticker), EVENT_SERIES[name][0], self.bar_size),
+                    post_day, post_day) for name in series}
+                if data["stock"].empty:
+                    continue
+                iv_data = data.get("iv")
+                if iv_data is not None:
+                    if iv_data.empty:
+                        continue
+                    normalize_iv_data(iv_data)
+                try:
+                    results = post_event_analysis(pre, data["stock"], iv_data, data.get("vix"), event.earnings_date,
+                                                  event.days_to_expiry, self.risk_free_rate, self.post_time)
+                except Exception as e:
+                    self.log(f"{event.ticker} {event.earnings_date:%Y-%m-%d}: finish failed ({e!r})")
+                    continue
+                post_open = session_open(data["stock"], results["dates"][1])
+                rows.append(result_frame(event.ticker, event.earnings_date, event.days_to_expiry, results,
+                                         post_open))
+                self.pre_store.mark_finished(event.ticker, event.earnings_date, event.days_to_expiry,
+                                             self.risk_free_rate)
+        if not rows:
+            return pd.DataFrame(columns=BATCH_RESULT_COLUMNS)
+        return pd.concat(rows, ignore_index=True)
+
+    def watch(self, stop, on_results=None, interval=WATCH_INTERVAL):
+        """
+        Run prefetch() off-hours and finish() whenever events are due, until stop (an Event) is set
+
+        Passes are skipped while IB isn't connected. on_results(frame) is
+        called with each non-empty finish() result, from this thread.
+        """
+        while not stop.is_set():
+            if self.scheduler.app.ready.is_set():
+                try:
+                    now = datetime.now(MARKET_TZ)
+                    if is_off_hours(now):
+                        self.prefetch(now)
+                    results = self.finish()
+                    if len(results) and on_results is not None:
+                        on_results(results)
+                except Exception as e:
+                    self.log(f"Earnings calendar pass failed: {e!r}")
+            stop.wait(interval)
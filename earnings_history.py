@@ -0,0 +1,277 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from iv_analysis import result_frame
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".iv_crush", "earnings_history.sqlite")
+
+# Events in the rolling statistics (two years of quarters)
+ROLLING_EVENTS = 8
+
+EVENT_COLUMNS = [
+    'ticker', 'earnings_date', 'pre_spot', 'post_open', 'pre_straddle',
+    'implied_move', 'realized_move', 'iv_crush_pct',
+]
+
+STATS_COLUMNS = [
+    'ticker', 'earnings_date', 'n_events', 'n_crush_events',
+    'mean_implied_move', 'mean_realized_move', 'mean_crush_pct', 'hit_rate',
+    'rolling_implied_move', 'rolling_realized_move', 'rolling_crush_pct', 'rolling_hit_rate',
+]
+
+# Added after the first release; older stores get them as NULL
+_ADDED_STATS_COLUMNS = {'n_crush_events': "INTEGER"}
+
+# Columns percentile_rank can rank against
+RANKED_COLUMNS = ('implied_move', 'realized_move', 'iv_crush_pct')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    ticker TEXT NOT NULL,
+    earnings_date INTEGER NOT NULL,
+    pre_spot REAL, post_open REAL, pre_straddle REAL,
+    implied_move REAL, realized_move REAL, iv_crush_pct REAL,
+    PRIMARY KEY (ticker, earnings_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stats (
+    ticker TEXT NOT NULL,
+    earnings_date INTEGER NOT NULL,
+    n_events INTEGER,
+    n_crush_events INTEGER,
+    mean_implied_move REAL, mean_realized_move REAL, mean_crush_pct REAL, hit_rate REAL,
+    rolling_implied_move REAL, rolling_realized_move REAL, rolling_crush_pct REAL, rolling_hit_rate REAL,
+    PRIMARY KEY (ticker, earnings_date)
+) WITHOUT ROWID;
+"""
+
+
+def _ns(value):
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+def event_moves(pre_spot, post_open, pre_straddle):
+    """
+    Implied and realized earnings moves
+
+    The implied move is the pre-event ATM straddle as a fraction of spot; the
+    realized move is the absolute overnight gap from the pre-event close to
+    the post-event open. Works on scalars or arrays.
+    """
+    implied = np.asarray(pre_straddle, dtype=np.float64) / pre_spot
+    realized = np.abs(np.asarray(post_open, dtype=np.float64) / pre_spot - 1)
+    return implied, realized
+
+
+class EarningsHistory:
+    """
+    Per-ticker history of implied vs realized earnings moves
+
+    Each earnings event is stored once (events table), and a stats table
+    holds, for every event, the statistics of all events of that ticker up
+    to and including it: expanding and rolling (ROLLING_EVENTS) means of the
+    implied move, realized move and IV crush, plus hit rates (realized move
+    larger than implied). Events without an IV crush (no post-event IV)
+    still count towards the moves; n_crush_events counts those with one.
+    Adding events only recomputes the stats rows of the affected tickers
+    from the earliest new date on, so a new quarter touches a single row.
+    Lookups are primary-key reads on (ticker, date).
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(stats)")}
+        with self._conn:
+            for column, definition in _ADDED_STATS_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE stats ADD COLUMN {column} {definition}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add_events(self, results):
+        """
+        Store events from a run_batch_analysis frame and update their statistics
+
+        Rows without both spots or a pre-event straddle are skipped. Returns the
+        number of events stored.
+        """
+        results = results.dropna(subset=['pre_spot', 'post_open', 'pre_straddle'])
+        if results.empty:
+            return 0
+        implied, realized = event_moves(results['pre_spot'].to_numpy(), results['post_open'].to_numpy(),
+                                        results['pre_straddle'].to_numpy())
+        tickers = results['ticker'].astype(str).str.upper().to_numpy()
+        dates = pd.DatetimeIndex(results['earnings_date']).as_unit('ns').asi8
+
+        rows = zip(
+            tickers.tolist(), dates.tolist(),
+            results['pre_spot'].tolist(), results['post_open'].tolist(), results['pre_straddle'].tolist(),
+            implied.tolist(), realized.tolist(), results['iv_crush_pct'].tolist(),
+        )
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO events (ticker, earnings_date, pre_spot, post_open, pre_straddle, "
+                "implied_move, realized_move, iv_crush_pct) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            for ticker, since in pd.Series(dates).groupby(tickers).min().items():
+                self._update_stats(ticker, int(since))
+        return len(results)
+
+    def add_event(self, ticker, earnings_date, result, post_open):
+        """Store one run_iv_crush_analysis result (post_open: open of the post-event day)"""
+        return self.add_events(result_frame(ticker, earnings_date, np.nan, result, post_open))
+
+    def _update_stats(self, ticker, since):
+        # Rolling windows need the ROLLING_EVENTS - 1 events before `since`
+        events = pd.read_sql_query(
+            "SELECT earnings_date, implied_move, realized_move, iv_crush_pct FROM events "
+            "WHERE ticker = ? AND earnings_date >= COALESCE(("
+            "  SELECT MIN(earnings_date) FROM (SELECT earnings_date FROM events "
+            "  WHERE ticker = ? AND earnings_date < ? ORDER BY earnings_date DESC LIMIT ?)), ?) "
+            "ORDER BY earnings_date",
+            self._conn, params=(ticker, ticker, since, ROLLING_EVENTS - 1, since)
+        )
+        # Expanding statistics continue from the last stats row before the window
+        previous = self._conn.execute(
+            "SELECT n_events, n_crush_events, mean_implied_move, mean_realized_move, mean_crush_pct, hit_rate "
+            "FROM stats WHERE ticker = ? AND earnings_date < ? ORDER BY earnings_date DESC LIMIT 1",
+            (ticker, int(events['earnings_date'].iloc[0]))
+        ).fetchone()
+        n0, n_crush0, implied0, realized0, crush0, hit0 = previous if previous else (0, 0, 0.0, 0.0, 0.0, 0.0)
+
+        hit = (events['realized_move'] > events['implied_move']).astype(float)
+
+        def expanding(values, mean0, count0):
+            # NaN values don't count; a NULL seed (no values yet) counts as none
+            if mean0 is None or count0 is None:
+                mean0, count0 = 0.0, 0
+            counts = count0 + values.notna().cumsum()
+            with np.errstate(invalid='ignore'):
+                return (mean0 * count0 + values.fillna(0.0).cumsum()) / counts.where(counts > 0), counts
+
+        mean_implied, n = expanding(events['implied_move'], implied0, n0)
+        mean_realized, _ = expanding(events['realized_move'], realized0, n0)
+        mean_crush, n_crush = expanding(events['iv_crush_pct'], crush0, n_crush0)
+        hit_rate, _ = expanding(hit, hit0, n0)
+
+        stats = pd.DataFrame({
+            'ticker': ticker,
+            'earnings_date': events['earnings_date'],
+            'n_events': n,
+            'n_crush_events': n_crush,
+            'mean_implied_move': mean_implied,
+            'mean_realized_move': mean_realized,
+            'mean_crush_pct': mean_crush,
+            'hit_rate': hit_rate,
+            'rolling_implied_move': events['implied_move'].rolling(ROLLING_EVENTS, min_periods=1).mean(),
+            'rolling_realized_move': events['realized_move'].rolling(ROLLING_EVENTS, min_periods=1).mean(),
+            'rolling_crush_pct': events['iv_crush_pct'].rolling(ROLLING_EVENTS, min_periods=1).mean(),
+            'rolling_hit_rate': hit.rolling(ROLLING_EVENTS, min_periods=1).mean(),
+        }, columns=STATS_COLUMNS)
+
+        # The context rows at the start of the window only seeded the rolling means
+        stats = stats[stats['earnings_date'] >= since]
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO stats ({', '.join(STATS_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(STATS_COLUMNS))})",
+            stats.itertuples(index=False, name=None)
+        )
+
+    def stats(self, ticker, as_of=None):
+        """Statistics row of the latest event at or before as_of (default: latest), or None"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(STATS_COLUMNS)} FROM stats WHERE ticker = ? AND earnings_date <= ? "
+                "ORDER BY earnings_date DESC LIMIT 1",
+                (ticker.upper(), _ns(as_of) if as_of is not None else np.iinfo(np.int64).max)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        stats = dict(zip(STATS_COLUMNS, row))
+        stats['earnings_date'] = pd.Timestamp(stats['earnings_date'])
+        return stats
+
+    def percentile_rank(self, ticker, column, value, before=None):
+        """
+        Percentile rank (0-100) of value among a ticker's past events
+
+        Only events strictly before `before` count when it is given; ties
+        count half. Returns NaN with no history.
+        """
+        if column not in RANKED_COLUMNS:
+            raise ValueError(f"Can't rank by {column!r}; use one of {', '.join(RANKED_COLUMNS)}")
+        with self._lock:
+            below, ties, total = self._conn.execute(
+                f"SELECT TOTAL({column} < ?), TOTAL({column} = ?), COUNT({column}) FROM events "
+                "WHERE ticker = ? AND earnings_date < ?",
+                (value, value, ticker.upper(), _ns(before) if before is not None else np.iinfo(np.int64).max)
+            ).fetchone()
+        return (below + 0.5 * ties) / total * 100 if total else float('nan')
+
+    def log_gaps(self, ticker, before=None):
+        """
+        Past earnings gaps of a ticker as log returns (pre-event close to
+        post-event open), oldest first, for straddle_mc.calibrate_gap
+
+        Only events strictly before `before` count when it is given.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pre_spot, post_open FROM events WHERE ticker = ? AND earnings_date < ? "
+                "ORDER BY earnings_date",
+                (ticker.upper(), _ns(before) if before is not None else np.iinfo(np.int64).max)
+            ).fetchall()
+        spots = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gaps = np.log(spots[:, 1] / spots[:, 0])
+        return gaps[np.isfinite(gaps)]
+
+    def events(self, ticker):
+        """All stored events of a ticker, oldest first"""
+        with self._lock:
+            data = pd.read_sql_query(
+                f"SELECT {', '.join(EVENT_COLUMNS)} FROM events WHERE ticker = ? ORDER BY earnings_date",
+                self._conn, params=(ticker.upper(),)
+            )
+        data['earnings_date'] = pd.to_datetime(data['earnings_date'])
+        return data
+
+    def stats_table(self, tickers=None):
+        """Statistics rows for some or all tickers, ordered by ticker and date"""
+        query = f"SELECT {', '.join(STATS_COLUMNS)} FROM stats"
+        params = ()
+        if tickers:
+            tickers = [t.upper() for t in tickers]
+            query += f" WHERE ticker IN ({', '.join('?' * len(tickers))})"
+            params = tuple(tickers)
+        with self._lock:
+            data = pd.read_sql_query(query + " ORDER BY ticker, earnings_date", self._conn, params=params)
+        data['earnings_date'] = pd.to_datetime(data['earnings_date'])
+        return data
+
+    def summary(self, ticker, earnings_date, implied_move, realized_move, iv_crush_pct):
+        """
+        History statistics for a current event
+
+        Returns the stats of the events before earnings_date plus the
+        event's percentile ranks against them, or None with no history.
+        """
+        stats = self.stats(ticker, pd.Timestamp(earnings_date) - pd.Timedelta(1, 'ns'))
+        if stats is None:
+            return None
+        for column, value in (('implied_move', implied_move), ('realized_move', realized_move),
+                              ('iv_crush_pct', iv_crush_pct)):
+            stats[f'{column}_rank'] = self.percentile_rank(ticker, column, value, before=earnings_date)
+        return stats
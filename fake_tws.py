@@ -0,0 +1,518 @@
+"""
+Local stand-in for TWS / IB Gateway that replays recorded bars
+
+Speaks enough of the TWS API socket protocol for IBApp: the v100+
+handshake, startApi -> nextValidId/managedAccounts, reqIds, and
+reqHistoricalData -> historicalData/historicalDataEnd, reqCurrentTime, plus
+error messages. drop_connections() and broadcast_error() simulate Gateway
+restarts and connectivity notices for testing reconnects.
+Streaming is simulated too: keepUpToDate requests keep sending
+historicalDataUpdate for the latest bar, and reqMktData streams random-walk
+trade (and, with generic tick 106, implied volatility) ticks at --tick-rate.
+Bars come from fixtures: a BarCache recorded by earlier live sessions, or a
+JSON file of series key -> [[date, open, high, low, close, volume], ...].
+
+    python fake_tws.py --port 7497 --cache ~/.iv_crush/bar_cache.sqlite --latency 0.05
+
+Latency, jitter and IB's pacing rules are configurable so the client path
+can be benchmarked and load-tested without a brokerage account.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import pandas as pd
+from ibapi.contract import Contract
+
+from bar_cache import series_key
+from request_scheduler import SMALL_BAR_SIZES
+
+# Server version negotiated with clients. 157 keeps the pre-fractional-size
+# message layouts, which every ibapi release from 9.76 onwards understands.
+SERVER_VERSION = 157
+
+# Incoming (client -> server) message ids
+REQ_MKT_DATA = 1
+CANCEL_MKT_DATA = 2
+REQ_IDS = 8
+REQ_HISTORICAL_DATA = 20
+CANCEL_HISTORICAL_DATA = 25
+REQ_CURRENT_TIME = 49
+REQ_MARKET_DATA_TYPE = 59
+START_API = 71
+
+# Outgoing (server -> client) message ids
+TICK_PRICE = 1
+ERR_MSG = 4
+NEXT_VALID_ID = 9
+MANAGED_ACCTS = 15
+HISTORICAL_DATA = 17
+TICK_GENERIC = 45
+CURRENT_TIME = 49
+HISTORICAL_DATA_UPDATE = 90
+
+# Tick types sent for market data subscriptions
+LAST_TICK = 4
+OPTION_IMPLIED_VOL_TICK = 24
+# Streamed ticks are sent in batches every this many seconds
+TICK_BATCH_INTERVAL = 0.01
+
+# Error codes/texts as TWS sends them
+NO_DATA = (162, "Historical Market Data Service error message:HMDS query returned no data")
+PACING_VIOLATION = (162, "Historical Market Data Service error message:Historical data request pacing violation")
+NO_SECURITY = (200, "No security definition has been found for the request")
+
+_DURATION_UNITS = {"S": timedelta(seconds=1), "D": timedelta(days=1), "W": timedelta(weeks=1),
+                   "M": timedelta(days=31), "Y": timedelta(days=366)}
+
+
+def _field(value):
+    return f"{value}\0"
+
+
+def _frame(*fields):
+    payload = "".join(_field(f) for f in fields).encode()
+    return struct.pack("!I", len(payload)) + payload
+
+
+def load_fixture_file(path):
+    """Load a JSON fixture file: {series key: [[date, open, high, low, close, volume], ...]}"""
+    with open(path) as f:
+        raw = json.load(f)
+    fixtures = {}
+    for key, rows in raw.items():
+        data = pd.DataFrame(rows, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+        data['date'] = pd.to_datetime(data['date'])
+        fixtures[key] = data.set_index('date')
+    return fixtures
+
+
+def _parse_end(value):
+    value = value.strip()
+    if not value:
+        return datetime.now()
+    # "20250827 16:00:00", optionally followed by a time zone, or "20250827-16:00:00"
+    return datetime.strptime(value[:17].replace("-", " "), "%Y%m%d %H:%M:%S")
+
+
+def _parse_duration(value):
+    amount, unit = value.split()
+    return int(amount) * _DURATION_UNITS[unit.upper()]
+
+
+def _format_bar_date(ts, bar_size, format_date):
+    if format_date == 2:
+        return str(int(ts.timestamp()))
+    if bar_size.endswith(("day", "days", "week", "weeks", "month", "months")):
+        return ts.strftime("%Y%m%d")
+    return ts.strftime("%Y%m%d  %H:%M:%S")
+
+
+class ReplayTWSServer:
+    """
+    Threaded socket server replaying fixture bars over the TWS API protocol
+
+    Parameters:
+    fixtures: Dict of series key (bar_cache.series_key) -> bar DataFrame
+    cache: Optional BarCache consulted for series missing from fixtures
+    latency, jitter: Seconds added to every historical data response
+        (uniformly in latency ± jitter)
+    pacing_limit, pacing_window: Reply with a pacing-violation error once a
+        connection sends more than pacing_limit small-bar requests (30
+        seconds or less, as IB counts them) in pacing_window seconds
+        (None disables)
+    reject_identical: Apply IB's no-identical-request-within-15s rule
+    error_rate: Probability of failing a request with a pacing violation
+    tick_rate: Trade ticks per second per market data subscription
+    update_interval: Seconds between historicalDataUpdate messages of a
+        keepUpToDate request
+    """
+
+    def __init__(self, fixtures=None, cache=None, host="127.0.0.1", port=0,
+                 latency=0.0, jitter=0.0, pacing_limit=None, pacing_window=600,
+                 reject_identical=False, error_rate=0.0, seed=None, account="DU0000000",
+                 tick_rate=10.0, update_interval=1.0):
+        self.fixtures = fixtures or {}
+        self.cache = cache
+        self.latency = latency
+        self.jitter = jitter
+        self.pacing_limit = pacing_limit
+        self.pacing_window = pacing_window
+        self.reject_identical = reject_identical
+        self.error_rate = error_rate
+        self.account = account
+        self.tick_rate = tick_rate
+        self.update_interval = update_interval
+        self._random = random.Random(seed)
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen()
+        self.host, self.port = self._sock.getsockname()
+
+        self.requests_served = 0
+        self._stopped = threading.Event()
+        self._connections = []
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)   # wakes the blocked accept()
+        except OSError:
+            pass
+        self._sock.close()
+        for conn in list(self._connections):
+            conn.close()
+
+    def drop_connections(self):
+        """Close every client socket but keep listening, like a Gateway restart"""
+        for conn in list(self._connections):
+            conn.close()
+
+    def broadcast_error(self, code, text):
+        """Send an error with reqId -1 to every client (e.g. 1100/1102 connectivity notices)"""
+        for conn in list(self._connections):
+            try:
+                conn.error(-1, code, text)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                sock, _ = self._sock.accept()
+            except OSError:
+                return
+            conn = _Connection(self, sock)
+            self._connections.append(conn)
+            threading.Thread(target=conn.serve, daemon=True).start()
+
+    def bars_for(self, contract, what_to_show, bar_size, end, duration):
+        """Fixture bars for a request window, or None if the series is unknown"""
+        key = series_key(contract, what_to_show, bar_size)
+        start = end - duration
+        data = self.fixtures.get(key)
+        if data is None and self.cache is not None:
+            data = self.cache.load(key, start, end)
+            if data.empty:
+                data = None
+        if data is None:
+            return None
+        return data[(data.index >= start) & (data.index < end)]
+
+    def last_close(self, contract, what_to_show="TRADES"):
+        """Latest recorded daily close of a contract, or None"""
+        bars = self.bars_for(contract, what_to_show, "1 day", pd.Timestamp.now(), timedelta(days=3660))
+        return None if bars is None or bars.empty else float(bars['close'].iloc[-1])
+
+    def response_delay(self):
+        return max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+
+
+class _Connection:
+    """One client session: reads requests and schedules delayed replies"""
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.version = SERVER_VERSION
+        self.next_order_id = 1
+        self.request_log = deque()
+        self.recent_requests = {}
+        self.cancelled = set()
+
+        # Replies are released by one scheduler thread in due-time order
+        self._due = []
+        self._seq = itertools.count()
+        self._due_cond = threading.Condition()
+        self._closed = False
+
+    def close(self):
+        self._closed = True
+        with self._due_cond:
+            self._due_cond.notify()
+        try:
+            # shutdown first: close() alone leaves a recv() blocked in serve()
+            # holding the socket open, so the client would never see it go
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def send(self, *fields):
+        with self.send_lock:
+            self.sock.sendall(_frame(*fields))
+
+    def schedule(self, delay, func):
+        with self._due_cond:
+            heapq.heappush(self._due, (time.monotonic() + delay, next(self._seq), func))
+            self._due_cond.notify()
+
+    def _reply_loop(self):
+        while True:
+            with self._due_cond:
+                while not self._closed and (not self._due or self._due[0][0] > time.monotonic()):
+                    timeout = self._due[0][0] - time.monotonic() if self._due else None
+                    self._due_cond.wait(timeout)
+                if self._closed:
+                    return
+                _, _, func = heapq.heappop(self._due)
+            try:
+                func()
+            except OSError:
+                return
+
+    def _recv_exact(self, n, buf):
+        while len(buf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("client closed")
+            buf += chunk
+        return buf
+
+    def _messages(self, buf):
+        while True:
+            buf = self._recv_exact(4, buf)
+            size = struct.unpack("!I", buf[:4])[0]
+            buf = self._recv_exact(4 + size, buf)
+            payload, buf = buf[4:4 + size], buf[4 + size:]
+            yield payload.decode(errors="replace").split("\0")[:-1]
+
+    def serve(self):
+        try:
+            buf = self._handshake()
+            threading.Thread(target=self._reply_loop, daemon=True).start()
+            for fields in self._messages(buf):
+                self._dispatch(fields)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.close()
+            if self in self.server._connections:
+                self.server._connections.remove(self)
+
+    def _handshake(self):
+        buf = self._recv_exact(4, b"")
+        if buf[:4] != b"API\0":
+            raise ConnectionError("not a TWS API client")
+        buf = self._recv_exact(8, buf)
+        size = struct.unpack("!I", buf[4:8])[0]
+        buf = self._recv_exact(8 + size, buf)
+        versions = buf[8:8 + size].decode().split()[0]     # "v100..157" plus options
+        low, high = (int(v) for v in versions.lstrip("v").split(".."))
+        if low > SERVER_VERSION:
+            raise ConnectionError(f"client requires server version {low}")
+        self.version = min(high, SERVER_VERSION)
+        self.send(self.version, datetime.now().strftime("%Y%m%d %H:%M:%S EST"))
+        return buf[8 + size:]
+
+    def _dispatch(self, fields):
+        msg_id = int(fields[0])
+        if msg_id == START_API:
+            self.send(MANAGED_ACCTS, 1, self.server.account)
+            self.send(NEXT_VALID_ID, 1, self.next_order_id)
+        elif msg_id == REQ_IDS:
+            self.send(NEXT_VALID_ID, 1, self.next_order_id)
+        elif msg_id == REQ_HISTORICAL_DATA:
+            self._historical_data(fields)
+        elif msg_id == CANCEL_HISTORICAL_DATA:
+            self.cancelled.add(int(fields[2]))
+        elif msg_id == REQ_MKT_DATA:
+            self._market_data(fields)
+        elif msg_id == CANCEL_MKT_DATA:
+            self.cancelled.add(int(fields[2]))
+        elif msg_id == REQ_CURRENT_TIME:
+            self.send(CURRENT_TIME, 1, int(time.time()))
+        elif msg_id == REQ_MARKET_DATA_TYPE:
+            pass
+
+    def error(self, req_id, code, text):
+        self.send(ERR_MSG, 2, req_id, code, text)
+
+    def _pacing_violation(self, key, bar_size):
+        server = self.server
+        now = time.monotonic()
+        if server.reject_identical:
+            last = self.recent_requests.get(key)
+            self.recent_requests[key] = now
+            if last is not None and now - last < 15:
+                return True
+        if server.pacing_limit is not None and bar_size in SMALL_BAR_SIZES:
+            while self.request_log and now - self.request_log[0] >= server.pacing_window:
+                self.request_log.popleft()
+            self.request_log.append(now)
+            if len(self.request_log) > server.pacing_limit:
+                return True
+        return server.error_rate > 0 and server._random.random() < server.error_rate
+
+    def _historical_data(self, fields):
+        # Layout for server versions >= 124 (no message version field)
+        it = iter(fields[1:])
+        req_id = int(next(it))
+        contract = Contract()
+        contract.conId = int(next(it) or 0)
+        contract.symbol = next(it)
+        contract.secType = next(it)
+        contract.lastTradeDateOrContractMonth = next(it)
+        contract.strike = float(next(it) or 0)
+        contract.right = next(it)
+        contract.multiplier = next(it)
+        contract.exchange = next(it)
+        contract.primaryExchange = next(it)
+        contract.currency = next(it)
+        contract.localSymbol = next(it)
+        contract.tradingClass = next(it)
+        next(it)                                            # includeExpired
+        end_str, bar_size, duration_str = next(it), next(it), next(it)
+        next(it)                                            # useRTH
+        what_to_show = next(it)
+        format_date = int(next(it))
+        keep_up_to_date = contract.secType != "BAG" and next(it, "0") == "1"
+
+        key = (series_key(contract, what_to_show, bar_size), end_str, duration_str)
+        if self._pacing_violation(key, bar_size):
+            self.schedule(self.server.response_delay(), lambda: self.error(req_id, *PACING_VIOLATION))
+            return
+
+        try:
+            end, duration = _parse_end(end_str), _parse_duration(duration_str)
+        except (ValueError, KeyError):
+            self.error(req_id, 321, f"Error validating request:-'{duration_str}' is invalid")
+            return
+
+        bars = self.server.bars_for(contract, what_to_show, bar_size, end, duration)
+        self.server.requests_served += 1
+        if bars is None:
+            reply = lambda: self.error(req_id, *NO_SECURITY)
+        elif bars.empty:
+            reply = lambda: self.error(req_id, *NO_DATA)
+        else:
+            start_str = (end - duration).strftime("%Y%m%d  %H:%M:%S")
+            out = [HISTORICAL_DATA, req_id, start_str, end.strftime("%Y%m%d  %H:%M:%S"), len(bars)]
+            for ts, row in zip(bars.index, bars.itertuples(index=False)):
+                out += [_format_bar_date(ts, bar_size, format_date),
+                        row.open, row.high, row.low, row.close, int(row.volume),
+                        (row.high + row.low + row.close) / 3, -1]
+            reply = lambda: None if req_id in self.cancelled else self.send(*out)
+            if keep_up_to_date:
+                last = bars.iloc[-1]
+                self._schedule_updates(req_id, _format_bar_date(bars.index[-1], bar_size, format_date),
+                                       last['open'], last['high'], last['low'], last['close'], last['volume'])
+        self.schedule(self.server.response_delay(), reply)
+
+    def _schedule_updates(self, req_id, date, open_, high, low, close, volume):
+        """Random-walk the latest bar of a keepUpToDate request until it is cancelled"""
+        bar = [open_, high, low, close, volume]
+
+        def update():
+            if self._closed or req_id in self.cancelled:
+                return
+            close = bar[3] * (1 + self.server._random.gauss(0, 0.001))
+            bar[1], bar[2], bar[3] = max(bar[1], close), min(bar[2], close), close
+            bar[4] += self.server._random.randint(1, 100)
+            self.send(HISTORICAL_DATA_UPDATE, req_id, -1, date, bar[0], bar[3], bar[1], bar[2],
+                      (bar[1] + bar[2] + bar[3]) / 3, int(bar[4]))
+            self.schedule(self.server.update_interval, update)
+
+        self.schedule(self.server.response_delay() + self.server.update_interval, update)
+
+    def _market_data(self, fields):
+        # fields: id, version, reqId, conId, symbol, secType, ..., tradingClass, deltaNeutral, genericTicks
+        req_id = int(fields[2])
+        contract = Contract()
+        contract.symbol, contract.secType = fields[4], fields[5]
+        contract.exchange, contract.currency = fields[10], fields[12]
+        generic_ticks = fields[16].split(",") if len(fields) > 16 else []
+
+        close = self.server.last_close(contract)
+        if close is None:
+            self.error(req_id, *NO_SECURITY)
+            return
+        iv = self.server.last_close(contract, "OPTION_IMPLIED_VOLATILITY") or 0.4
+        state = [close, iv]
+
+        server = self.server
+        per_batch = server.tick_rate * TICK_BATCH_INTERVAL
+        carry = [0.0]
+
+        def send_batch():
+            if self._closed or req_id in self.cancelled:
+                return
+            carry[0] += per_batch
+            n, carry[0] = int(carry[0]), carry[0] % 1
+            for _ in range(n):
+                state[0] = round(state[0] * (1 + server._random.gauss(0, 0.0005)), 2)
+                self.send(TICK_PRICE, 6, req_id, LAST_TICK, state[0], server._random.randint(1, 500), 0)
+            if n and "106" in generic_ticks:
+                state[1] = max(state[1] * (1 + server._random.gauss(0, 0.002)), 0.01)
+                self.send(TICK_GENERIC, 6, req_id, OPTION_IMPLIED_VOL_TICK, state[1])
+            self.schedule(TICK_BATCH_INTERVAL, send_batch)
+
+        self.schedule(server.response_delay(), send_batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded bars over the TWS API protocol")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7497)
+    parser.add_argument("--fixtures", help="JSON fixture file")
+    parser.add_argument("--cache", help="BarCache database to replay")
+    parser.add_argument("--latency", type=float, default=0.0, help="Response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency jitter in seconds")
+    parser.add_argument("--pacing-limit", type=int, help="Max small-bar requests per pacing window")
+    parser.add_argument("--pacing-window", type=float, default=600)
+    parser.add_argument("--reject-identical", action="store_true",
+                        help="Reject identical requests within 15 seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Probability of a random pacing violation")
+    parser.add_argument("--tick-rate", type=float, default=10.0,
+                        help="Trade ticks per second per market data subscription")
+    parser.add_argument("--update-interval", type=float, default=1.0,
+                        help="Seconds between keepUpToDate bar updates")
+    args = parser.parse_args(argv)
+
+    cache = None
+    if args.cache:
+        from bar_cache import BarCache
+        cache = BarCache(args.cache)
+    fixtures = load_fixture_file(args.fixtures) if args.fixtures else {}
+
+    server = ReplayTWSServer(
+        fixtures, cache, args.host, args.port, latency=args.latency, jitter=args.jitter,
+        pacing_limit=args.pacing_limit, pacing_window=args.pacing_window,
+        reject_identical=args.reject_identical, error_rate=args.error_rate,
+        tick_rate=args.tick_rate, update_interval=args.update_interval
+    ).start()
+    print(f"Replaying bars on {server.host}:{server.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import os
+import threading
+from concurrent.futures import wait
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from IBApp import IBRequestError
+from bar_buffer import PRICE_COLUMNS
+from market_data import EVENT_SERIES, series_contract
+
+DEFAULT_INTRADAY_DIR = os.path.join(os.path.expanduser("~"), ".iv_crush", "intraday")
+
+# Bar size -> requests covering one regular-hours day: (end time, durationStr).
+# IB caps 5-second bar requests at an hour, so those days take seven.
+INTRADAY_BAR_SIZES = {
+    "1 min": [("16:00:00", "1 D")],
+    "5 secs": [(f"{hour}:30:00", "3600 S") for hour in range(10, 16)] + [("16:00:00", "3600 S")],
+}
+
+# Trading days fetched around an event: from this many before the earnings
+# date to this many after it, so the pre/post days are there across holidays
+INTRADAY_EVENT_DAYS = (-1, 2)
+
+# Error 162 with this text: no bars that day (e.g. a market holiday)
+NO_DATA_TEXT = "returned no data"
+
+_COMPLETE = "complete"
+_DAY_NS = 86_400_000_000_000
+
+
+def intraday_series(contract, what_to_show, bar_size):
+    """Store directory (relative) of one bar series: one folder per symbol"""
+    return os.path.join(contract.symbol, f"{contract.secType}_{what_to_show}_{bar_size.replace(' ', '')}")
+
+
+def event_days(earnings_date):
+    """Weekdays fetched for an event (see INTRADAY_EVENT_DAYS)"""
+    day = np.datetime64(pd.Timestamp(earnings_date).date(), 'D')
+    before, after = INTRADAY_EVENT_DAYS
+    first = np.busday_offset(day, before, roll='backward')
+    last = np.busday_offset(day, after, roll='backward')
+    return [d.date() for d in pd.bdate_range(str(first), str(last))]
+
+
+class IntradayStore:
+    """
+    Append-only memory-mapped column files of intraday bars
+
+    Each series gets a folder per trading day holding one raw file per column
+    (int64 epoch-ns times, float64 OHLCV). Bars are only ever appended, in
+    time order, so a day's files are read back with np.memmap and sliced by
+    searchsorted on the times: loading a window touches only the days (and
+    pages) inside it, however many years of bars are stored.
+
+    A day is marked complete once it has been fetched after it ended; the
+    current day is left open so later requests can append to it.
+    """
+
+    def __init__(self, root=DEFAULT_INTRADAY_DIR):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _day_dir(self, series, day):
+        return os.path.join(self.root, series, day.strftime("%Y%m%d"))
+
+    def days(self, series):
+        """Stored days of a series, oldest first"""
+        folder = os.path.join(self.root, series)
+        if not os.path.isdir(folder):
+            return []
+        return [datetime.strptime(name, "%Y%m%d").date() for name in sorted(os.listdir(folder))]
+
+    def missing_days(self, series, days):
+        """Days not yet marked complete"""
+        return [day for day in days if not os.path.exists(os.path.join(self._day_dir(series, day), _COMPLETE))]
+
+    def mark_complete(self, series, day):
+        folder = self._day_dir(series, day)
+        os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, _COMPLETE), "w").close()
+
+    def day_columns(self, series, day):
+        """
+        Read-only memmaps of one day's columns (ts plus PRICE_COLUMNS)
+
+        The length is that of the shortest file, so a day being appended to
+        by another thread reads as its last complete row.
+        """
+        folder = self._day_dir(series, day)
+        sizes = {}
+        for name, dtype in (('ts', np.int64),) + tuple((c, np.float64) for c in PRICE_COLUMNS):
+            path = os.path.join(folder, name)
+            sizes[name] = (path, dtype, os.path.getsize(path) // 8 if os.path.exists(path) else 0)
+        n = min(size for _, _, size in sizes.values())
+        if n == 0:
+            return {name: np.empty(0, dtype) for name, (_, dtype, _) in sizes.items()}
+        return {name: np.memmap(path, dtype=dtype, mode='r', shape=(n,)) for name, (path, dtype, _) in sizes.items()}
+
+    def append(self, series, ts, columns):
+        """
+        Append bars (int64 epoch-ns times and a dict of PRICE_COLUMNS arrays)
+
+        Bars are split by day; on each day only bars newer than the last one
+        stored are written, so overlapping requests never duplicate a row.
+        Returns the number of bars written.
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        if len(ts) == 0:
+            return 0
+        order = np.argsort(ts, kind='stable')
+        ts = ts[order]
+        keep = np.r_[ts[1:] != ts[:-1], True]     # last bar of each duplicate time wins
+        ts = ts[keep]
+        values = {name: np.asarray(columns[name], dtype=np.float64)[order][keep] for name in PRICE_COLUMNS}
+
+        written = 0
+        bounds = np.flatnonzero(np.diff(ts // _DAY_NS)) + 1
+        with self._lock:
+            for rows in np.split(np.arange(len(ts)), bounds):
+                day = pd.Timestamp(ts[rows[0]]).date()
+                stored = self.day_columns(series, day)['ts']
+                if len(stored):
+                    rows = rows[ts[rows] > stored[-1]]
+                if len(rows) == 0:
+                    continue
+                folder = self._day_dir(series, day)
+                os.makedirs(folder, exist_ok=True)
+                # Times last: a partly written row is ignored by day_columns
+                for name in PRICE_COLUMNS + ('ts',):
+                    data = ts[rows] if name == 'ts' else values[name][rows]
+                    with open(os.path.join(folder, name), "ab") as f:
+                        f.write(data.tobytes())
+                written += len(rows)
+        return written
+
+    def load(self, series, start, end):
+        """Bars with start <= time <= end as a DataFrame indexed by date"""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        if end == end.normalize():
+            end += pd.Timedelta(days=1) - pd.Timedelta(1)     # a bare date means the whole day
+        lo, hi = start.as_unit('ns').value, end.as_unit('ns').value
+
+        parts = {name: [] for name in ('ts',) + PRICE_COLUMNS}
+        for day in self.days(series):
+            if not start.date() <= day <= end.date():
+                continue
+            columns = self.day_columns(series, day)
+            i = np.searchsorted(columns['ts'], lo, side='left')
+            j = np.searchsorted(columns['ts'], hi, side='right')
+            if j > i:
+                for name, column in columns.items():
+                    parts[name].append(np.array(column[i:j]))
+
+        index = pd.DatetimeIndex(np.concatenate(parts['ts']).view('datetime64[ns]') if parts['ts']
+                                 else np.empty(0, 'datetime64[ns]'), name='date')
+        return pd.DataFrame({name: np.concatenate(parts[name]) if parts[name] else np.empty(0)
+                             for name in PRICE_COLUMNS}, index=index)
+
+
+class IntradayBarRequest:
+    """
+    Handle for an intraday window: bars on disk plus IB requests for missing days
+
+    Bars are appended to the store as their requests complete (from the
+    futures' callbacks), so a caller that stops waiting loses nothing that
+    arrives later. Requests are stored in time order and stop at the first
+    failure, so what is stored for a day is always its start. result() waits
+    for the rest, marks fetched past days complete and returns the window
+    from the memmaps, like bar_cache.CachedBarRequest.
+    """
+
+    def __init__(self, store, series, start, end, requests=(), timer=None):
+        self.store = store
+        self.series = series
+        self.start = start
+        self.end = end
+        self.requests = list(requests)
+        self.timer = timer
+        self._data = None
+        self._error = None
+        self._lock = threading.Lock()
+        for _, future in self.requests:
+            future.add_done_callback(lambda _: self._drain())
+
+    def _drain(self):
+        """Store the leading requests that have completed"""
+        with self._lock:
+            while self.requests and self._error is None:
+                day, future = self.requests[0]
+                if not future.done():
+                    return
+                try:
+                    bars = future.result()
+                except IBRequestError as e:
+                    if e.errorCode != 162 or NO_DATA_TEXT not in e.errorString.lower():
+                        self._error = e
+                        return
+                    bars = None
+                except BaseException as e:      # includes a cancelled request
+                    self._error = e
+                    return
+                with self._timed("bars.store"):
+                    if bars:
+                        self.store.append(self.series, bars.ts[:len(bars)], bars.columns())
+                    # All of a day's requests are consecutive; mark it once its last is in
+                    if (len(self.requests) == 1 or self.requests[1][0] != day) and day < datetime.now().date():
+                        self.store.mark_complete(self.series, day)
+                self.requests.pop(0)
+
+    def result(self, timeout=None):
+        if self._data is None:
+            while True:
+                self._drain()
+                with self._lock:
+                    error = self._error
+                    head = self.requests[0][1] if self.requests else None
+                if error is not None:
+                    raise error
+                if head is None:
+                    break
+                if not wait([head], timeout).done:
+                    raise TimeoutError(f"Intraday bars for {self.series} still pending")
+            with self._timed("bars.frame"):
+                self._data = self.store.load(self.series, self.start, self.end)
+        return self._data
+
+    def _timed(self, stage):
+        return self.timer.span(stage) if self.timer is not None else nullcontext()
+
+
+def request_intraday_bars(scheduler, store, contract, what_to_show, days, bar_size="1 min", timer=None,
+                          **submit_kwargs):
+    """
+    Serve intraday bars for some trading days from the store, requesting
+    the days not stored yet (regular trading hours, see INTRADAY_BAR_SIZES)
+
+    Extra keyword arguments (e.g. priority) are passed on to scheduler.submit.
+    """
+    if bar_size not in INTRADAY_BAR_SIZES:
+        raise ValueError(f"Unsupported intraday bar size {bar_size!r}; use one of {', '.join(INTRADAY_BAR_SIZES)}")
+    series = intraday_series(contract, what_to_show, bar_size)
+    requests = []
+    for day in store.missing_days(series, days):
+        for end_time, duration in INTRADAY_BAR_SIZES[bar_size]:
+            future = scheduler.submit(contract, what_to_show, f"{day:%Y%m%d} {end_time}", duration,
+                                      bar_size=bar_size, use_rth=1, **submit_kwargs)
+            requests.append((day, future))
+    return IntradayBarRequest(store, series, min(days), max(days), requests, timer)
+
+
+def request_intraday_event_bars(scheduler, store, ticker, earnings_date, bar_size="1 min", timer=None,
+                                **submit_kwargs):
+    """
+    Intraday stock, VIX and IV bars around one earnings event
+
+    Same shape as market_data.request_event_bars: series name ->
+    IntradayBarRequest, or the exception raised while requesting it.
+    """
+    days = event_days(earnings_date)
+    handles = {}
+    for series, (what_to_show, _) in EVENT_SERIES.items():
+        try:
+            handles[series] = request_intraday_bars(
+                scheduler, store, series_contract(series, ticker), what_to_show, days, bar_size,
+                timer=timer, **submit_kwargs
+            )
+        except Exception as e:
+            handles[series] = e
+    return handles
@@ -0,0 +1,401 @@
+import pandas as pd
+import numpy as np
+
+from option_math import DEFAULT_TREE_STEPS, option_greeks
+
+# Columns of the tidy frame returned by run_batch_analysis
+BATCH_RESULT_COLUMNS = [
+    'ticker', 'earnings_date', 'days_to_expiry',
+    'pre_date', 'post_date', 'pre_spot', 'post_open', 'post_spot',
+    'pre_iv', 'post_iv', 'iv_crush_pct',
+    'pre_call', 'pre_put', 'post_call', 'post_put',
+    'pre_straddle', 'post_straddle',
+    'pre_delta', 'post_delta', 'pre_vega', 'post_vega',
+]
+
+
+def _time_of_day(value):
+    """'15:59', '09:45:30' or a datetime.time as a Timedelta since midnight"""
+    moment = pd.Timestamp(f"1970-01-01 {value}")
+    return moment - moment.normalize()
+
+
+# Columns of a pre_event_analysis result: everything known before the event
+PRE_EVENT_COLUMNS = [
+    'pre_date', 'pre_spot', 'pre_iv',
+    'pre_call', 'pre_put', 'pre_straddle', 'pre_delta', 'pre_vega',
+]
+
+
+def _pre_point(stock_data, iv_data, vix_data, earnings_date, pre_time=None, intraday=False):
+    """(date, spot, iv) of the pre-event leg; see run_iv_crush_analysis"""
+    stock_dates = stock_data.index
+    if not intraday:
+        pre_date = stock_dates[stock_dates <= earnings_date].max()
+    else:
+        days = stock_dates.normalize()
+        pre_day = days[days <= earnings_date].max()
+        pre_bars = stock_dates[days == pre_day]
+        if pre_time is not None:
+            pre_bars = pre_bars[pre_bars <= pre_day + _time_of_day(pre_time)]
+        if len(pre_bars) == 0:
+            raise ValueError(f"No bars at {pre_time} on {pre_day:%Y-%m-%d}")
+        pre_date = pre_bars.max()
+    pre_spot = stock_data.loc[pre_date, 'close']
+
+    if iv_data is not None:
+        pre_iv = iv_data.loc[iv_data.index <= pre_date].iloc[-1]['implied_vol']
+    else:
+        pre_vix = vix_data.loc[vix_data.index <= pre_date].iloc[-1]['close'] if vix_data is not None else 20
+        pre_iv = pre_vix / 100 * 1.5
+    return pre_date, pre_spot, pre_iv
+
+
+def _post_point(stock_data, iv_data, vix_data, earnings_date, post_time=None, intraday=False):
+    """(date, spot, iv) of the post-event leg; see run_iv_crush_analysis"""
+    stock_dates = stock_data.index
+    if not intraday:
+        post_date = stock_dates[stock_dates > earnings_date].min()
+        post_spot = (stock_data.loc[post_date, 'open'] +
+                     stock_data.loc[post_date, 'close']) / 2
+    else:
+        days = stock_dates.normalize()
+        post_day = days[days > earnings_date].min()
+        post_bars = stock_dates[days == post_day]
+        if post_time is not None:
+            post_bars = post_bars[post_bars >= post_day + _time_of_day(post_time)]
+        if len(post_bars) == 0:
+            raise ValueError(f"No bars at {post_time} on {post_day:%Y-%m-%d}")
+        post_date = post_bars.min()
+        post_spot = stock_data.loc[post_date, 'close']
+
+    if iv_data is not None:
+        post_iv = iv_data.loc[iv_data.index >= post_date].iloc[0]['implied_vol']
+    else:
+        post_vix = vix_data.loc[vix_data.index >= post_date].iloc[0]['close'] if vix_data is not None else 20
+        post_iv = post_vix / 100 * 1.2
+    return post_date, post_spot, post_iv
+
+
+def run_iv_crush_analysis(
+    stock_data,
+    iv_data,
+    vix_data,
+    earnings_date,
+    days_to_expiry,
+    risk_free_rate,
+    pre_time=None,
+    post_time=None,
+    intraday=None,
+    model="black_scholes",
+    dividend_yield=0.0,
+    tree_steps=DEFAULT_TREE_STEPS
+):
+    """
+    IV crush, option prices and Greeks before and after one earnings event
+
+    With daily bars the pre-event spot is the last close on or before the
+    earnings date and the post-event spot the mean of the next day's open
+    and close. With intraday bars, pre_time and post_time (e.g. "15:59" and
+    "09:45") pick exact bars instead: the last bar at or before pre_time on
+    the pre-event day and the first bar at or after post_time on the
+    post-event day, priced at their closes. IV (and VIX) are then taken at
+    those same timestamps. intraday says which kind of bars these are
+    (default: whether either time is given); intraday bars without a time
+    use the last bar of the earnings day and the first of the next day.
+
+    model picks the pricer (see option_math.PRICING_MODELS): European
+    Black-Scholes, or American options by the Barone-Adesi-Whaley
+    approximation ("baw") or a Leisen-Reimer tree of tree_steps steps
+    ("tree"). dividend_yield is a continuous yield, which is what makes
+    early exercise of the calls worth anything.
+    """
+    # --- Dates, spots and IV ---
+    if intraday is None:
+        intraday = pre_time is not None or post_time is not None
+    pre_date, pre_spot, pre_iv = _pre_point(stock_data, iv_data, vix_data, earnings_date, pre_time, intraday)
+    post_date, post_spot, post_iv = _post_point(stock_data, iv_data, vix_data, earnings_date, post_time, intraday)
+
+    # --- Options ---
+    T = days_to_expiry / 365
+    K = pre_spot
+
+    # Price pre and post legs together through a single kernel call
+    g = option_greeks(
+        np.array([pre_spot, post_spot]), K, T, risk_free_rate, np.array([pre_iv, post_iv]),
+        model, dividend_yield, tree_steps
+    )
+    pre_call, post_call = g['call']
+    pre_put, post_put = g['put']
+
+    pre_straddle = pre_call + pre_put
+    post_straddle = post_call + post_put
+
+    # --- Greeks ---
+    pre_delta, post_delta = g['call_delta'] + g['put_delta']
+    pre_vega, post_vega = 2 * g['vega']
+
+    return {
+        "dates": (pre_date, post_date),
+        "spot": (pre_spot, post_spot),
+        "iv": (pre_iv, post_iv),
+        "iv_crush_pct": (pre_iv - post_iv) / pre_iv * 100,
+        "options": {
+            "pre_call": pre_call,
+            "pre_put": pre_put,
+            "post_call": post_call,
+            "post_put": post_put,
+            "pre_straddle": pre_straddle,
+            "post_straddle": post_straddle
+        },
+        "greeks": {
+            "pre_delta": pre_delta,
+            "post_delta": post_delta,
+            "pre_vega": pre_vega,
+            "post_vega": post_vega
+        }
+    }
+
+
+def pre_event_analysis(stock_data, iv_data, vix_data, earnings_date, days_to_expiry, risk_free_rate,
+                       pre_time=None, model="black_scholes", dividend_yield=0.0, tree_steps=DEFAULT_TREE_STEPS,
+                       intraday=None):
+    """
+    The pre-event half of run_iv_crush_analysis, computable once the
+    pre-event session has closed
+
+    Returns a dict of PRE_EVENT_COLUMNS. pre_time picks an intraday bar as
+    in run_iv_crush_analysis; without it the pre-event leg is the daily close.
+    model, dividend_yield, tree_steps and intraday are as in
+    run_iv_crush_analysis.
+    """
+    pre_date, pre_spot, pre_iv = _pre_point(stock_data, iv_data, vix_data, earnings_date, pre_time,
+                                            pre_time is not None if intraday is None else intraday)
+    g = {key: values[0] for key, values in option_greeks(
+        np.array([pre_spot]), pre_spot, days_to_expiry / 365, risk_free_rate, np.array([pre_iv]),
+        model, dividend_yield, tree_steps).items()}
+    return {
+        'pre_date': pre_date,
+        'pre_spot': pre_spot,
+        'pre_iv': pre_iv,
+        'pre_call': g['call'],
+        'pre_put': g['put'],
+        'pre_straddle': g['call'] + g['put'],
+        'pre_delta': g['call_delta'] + g['put_delta'],
+        'pre_vega': 2 * g['vega'],
+    }
+
+
+def post_event_analysis(pre, stock_data, iv_data, vix_data, earnings_date, days_to_expiry, risk_free_rate,
+                        post_time=None, model="black_scholes", dividend_yield=0.0, tree_steps=DEFAULT_TREE_STEPS,
+                        intraday=None):
+    """
+    Finish a pre_event_analysis result with the post-event bar
+
+    Only the post-event leg is priced (at the pre-event spot's strike), so
+    stock_data and iv_data need only cover the post-event day. post_time
+    picks an intraday bar as in run_iv_crush_analysis; without it the
+    post-event spot is the mean of the day's open and close. Price with the
+    same model as the pre-event half; intraday is as in run_iv_crush_analysis.
+
+    Returns the same dict as run_iv_crush_analysis.
+    """
+    post_date, post_spot, post_iv = _post_point(stock_data, iv_data, vix_data, earnings_date, post_time,
+                                               post_time is not None if intraday is None else intraday)
+    g = {key: values[0] for key, values in option_greeks(
+        np.array([post_spot]), pre['pre_spot'], days_to_expiry / 365, risk_free_rate, np.array([post_iv]),
+        model, dividend_yield, tree_steps).items()}
+    pre_iv = pre['pre_iv']
+    return {
+        "dates": (pre['pre_date'], post_date),
+        "spot": (pre['pre_spot'], post_spot),
+        "iv": (pre_iv, post_iv),
+        "iv_crush_pct": (pre_iv - post_iv) / pre_iv * 100,
+        "options": {
+            "pre_call": pre['pre_call'],
+            "pre_put": pre['pre_put'],
+            "post_call": g['call'],
+            "post_put": g['put'],
+            "pre_straddle": pre['pre_straddle'],
+            "post_straddle": g['call'] + g['put']
+        },
+        "greeks": {
+            "pre_delta": pre['pre_delta'],
+            "post_delta": g['call_delta'] + g['put_delta'],
+            "pre_vega": pre['pre_vega'],
+            "post_vega": 2 * g['vega']
+        }
+    }
+
+
+def session_open(stock_data, date):
+    """Open of the first bar on date's day: the day's open for daily or intraday bars"""
+    day = pd.Timestamp(date).normalize()
+    return stock_data.loc[(stock_data.index >= day) & (stock_data.index < day + pd.Timedelta(days=1)),
+                          'open'].iloc[0]
+
+
+def result_frame(ticker, earnings_date, days_to_expiry, results, post_open=np.nan):
+    """One run_iv_crush_analysis result as a run_batch_analysis row"""
+    pre_date, post_date = results["dates"]
+    (pre_spot, post_spot), (pre_iv, post_iv) = results["spot"], results["iv"]
+    options, greeks = results["options"], results["greeks"]
+    return pd.DataFrame({
+        'ticker': [ticker],
+        'earnings_date': [pd.Timestamp(earnings_date)],
+        'days_to_expiry': [days_to_expiry],
+        'pre_date': [pd.Timestamp(pre_date)],
+        'post_date': [pd.Timestamp(post_date)],
+        'pre_spot': [pre_spot],
+        'post_open': [post_open],
+        'post_spot': [post_spot],
+        'pre_iv': [pre_iv],
+        'post_iv': [post_iv],
+        'iv_crush_pct': [results["iv_crush_pct"]],
+        **{key: [options[key]] for key in ('pre_call', 'pre_put', 'post_call', 'post_put',
+                                          'pre_straddle', 'post_straddle')},
+        **{key: [greeks[key]] for key in ('pre_delta', 'post_delta', 'pre_vega', 'post_vega')},
+    }, columns=BATCH_RESULT_COLUMNS)
+
+
+def _as_ns(values):
+    """Datetime-like values as a datetime64[ns] array, for searchsorted"""
+    return np.asarray(pd.DatetimeIndex(values).as_unit('ns').values)
+
+
+def _series_at(index_ns, values, dates, side):
+    """
+    Look up values for many dates at once on a sorted index
+
+    side='before' takes the last row at or before each date (like
+    iv_data.index <= date ... .iloc[-1]); side='after' takes the first row at
+    or after each date. Dates with no such row come back as NaN.
+    """
+    if len(index_ns) == 0:
+        return np.full(len(dates), np.nan)
+    if side == 'before':
+        pos = np.searchsorted(index_ns, dates, side='right') - 1
+        found = pos >= 0
+    else:
+        pos = np.searchsorted(index_ns, dates, side='left')
+        found = pos < len(index_ns)
+    pos = np.clip(pos, 0, len(index_ns) - 1)
+    return np.where(found & ~np.isnat(dates), values[pos], np.nan)
+
+
+def run_batch_analysis(events, stock_bars, iv_bars=None, vix_data=None, risk_free_rate=0.05,
+                       model="black_scholes", dividend_yield=0.0, tree_steps=DEFAULT_TREE_STEPS):
+    """
+    Run the IV crush analysis over many (ticker, earnings date) events
+
+    Pre/post dates for every event of a ticker are located with one
+    searchsorted over its sorted bar index, and all events are priced
+    through a single option_greeks call.
+
+    Parameters:
+    events: DataFrame with ticker, earnings_date and days_to_expiry columns
+    stock_bars: Dict of upper-case ticker -> stock DataFrame (date index, open/close)
+    iv_bars: Optional dict of ticker -> IV DataFrame with an implied_vol column
+    vix_data: Optional VIX DataFrame used when a ticker has no IV bars
+    risk_free_rate: Risk-free rate (annualized)
+    model, dividend_yield, tree_steps: Pricer, as in run_iv_crush_analysis
+
+    Returns a DataFrame with one row per event (see BATCH_RESULT_COLUMNS).
+    Events whose dates fall outside the available bars have NaN results.
+    """
+    iv_bars = iv_bars or {}
+    n = len(events)
+
+    tickers = events['ticker'].astype(str).str.upper().to_numpy()
+    earnings_dates = _as_ns(pd.to_datetime(events['earnings_date']))
+    days_to_expiry = events['days_to_expiry'].to_numpy(dtype=np.float64)
+
+    pre_date = np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+    post_date = pre_date.copy()
+    pre_spot = np.full(n, np.nan)
+    post_open = np.full(n, np.nan)
+    post_spot = np.full(n, np.nan)
+    pre_iv = np.full(n, np.nan)
+    post_iv = np.full(n, np.nan)
+
+    if vix_data is not None and len(vix_data):
+        vix_index = _as_ns(vix_data.index)
+        vix_close = vix_data['close'].to_numpy(dtype=np.float64)
+    else:
+        vix_index = vix_close = None
+
+    # One pass per ticker; every event of that ticker is located at once
+    for ticker, rows in pd.Series(np.arange(n)).groupby(tickers):
+        rows = rows.to_numpy()
+        stock_data = stock_bars.get(ticker)
+        if stock_data is None or len(stock_data) == 0:
+            continue
+
+        stock_data = stock_data.sort_index()
+        stock_index = _as_ns(stock_data.index)
+        dates = earnings_dates[rows]
+
+        # pre: last bar on or before earnings, post: first bar after it
+        pos = np.searchsorted(stock_index, dates, side='right')
+        has_both = (pos > 0) & (pos < len(stock_index)) & ~np.isnat(dates)
+        rows, pos = rows[has_both], pos[has_both]
+
+        open_ = stock_data['open'].to_numpy(dtype=np.float64)
+        close = stock_data['close'].to_numpy(dtype=np.float64)
+        pre_date[rows] = stock_index[pos - 1]
+        post_date[rows] = stock_index[pos]
+        pre_spot[rows] = close[pos - 1]
+        post_open[rows] = open_[pos]
+        post_spot[rows] = (open_[pos] + close[pos]) / 2
+
+        iv_data = iv_bars.get(ticker)
+        if iv_data is not None:
+            iv_data = iv_data.sort_index()
+            iv_index = _as_ns(iv_data.index)
+            iv_values = iv_data['implied_vol'].to_numpy(dtype=np.float64)
+            pre_iv[rows] = _series_at(iv_index, iv_values, pre_date[rows], 'before')
+            post_iv[rows] = _series_at(iv_index, iv_values, post_date[rows], 'after')
+        elif vix_close is not None:
+            pre_iv[rows] = _series_at(vix_index, vix_close, pre_date[rows], 'before') / 100 * 1.5
+            post_iv[rows] = _series_at(vix_index, vix_close, post_date[rows], 'after') / 100 * 1.2
+        else:
+            pre_iv[rows] = 20 / 100 * 1.5
+            post_iv[rows] = 20 / 100 * 1.2
+
+    # --- Options: pre legs in the first half, post legs in the second ---
+    T = np.tile(days_to_expiry / 365, 2)
+    K = np.tile(pre_spot, 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        g = option_greeks(
+            np.concatenate([pre_spot, post_spot]), K, T, risk_free_rate,
+            np.concatenate([pre_iv, post_iv]), model, dividend_yield, tree_steps
+        )
+        iv_crush_pct = (pre_iv - post_iv) / pre_iv * 100
+
+    straddle = g['call'] + g['put']
+    delta = g['call_delta'] + g['put_delta']
+    vega = 2 * g['vega']
+
+    return pd.DataFrame({
+        'ticker': tickers,
+        'earnings_date': earnings_dates,
+        'days_to_expiry': days_to_expiry,
+        'pre_date': pre_date,
+        'post_date': post_date,
+        'pre_spot': pre_spot,
+        'post_open': post_open,
+        'post_spot': post_spot,
+        'pre_iv': pre_iv,
+        'post_iv': post_iv,
+        'iv_crush_pct': iv_crush_pct,
+        'pre_call': g['call'][:n],
+        'pre_put': g['put'][:n],
+        'post_call': g['call'][n:],
+        'post_put': g['put'][n:],
+        'pre_straddle': straddle[:n],
+        'post_straddle': straddle[n:],
+        'pre_delta': delta[:n],
+        'post_delta': delta[n:],
+        'pre_vega': vega[:n],
+        'post_vega': vega[n:],
+    }, columns=BATCH_RESULT_COLUMNS)
@@ -0,0 +1,589 @@
+"""
+Headless command line entry point for IV crush analysis
+
+    python -m ivcrush analyze --tickers NVDA AAPL --dates 2025-08-27 2025-07-31
+    python -m ivcrush analyze --events events.csv --output results.parquet
+    python -m ivcrush scan --events watchlist.csv --workers 8
+    python -m ivcrush chain --tickers NVDA --dates 2025-08-27 --output nvda_chain.csv
+    python -m ivcrush report --events watchlist.csv --report-dir reports --formats png pdf html
+    python -m ivcrush history --events nvda_earnings.csv --output nvda_history.csv
+    python -m ivcrush intraday --tickers NVDA --dates 2025-08-27 --pre-time 15:59 --post-time 09:45
+    python -m ivcrush calendar prefetch --events earnings_calendar.csv
+    python -m ivcrush calendar finish --events earnings_calendar.csv --post-time 09:31 --output crush.csv
+    python -m ivcrush query --min-crush 40 --min-abs-delta-change 0.2 --output crushed.csv
+    python -m ivcrush startup
+
+Only the standard library is imported at module load. The analysis and data
+layers are imported inside the commands that need them, and tkinter and
+matplotlib are never imported, so this runs on a headless server.
+"""
+import argparse
+import sys
+
+# Cold-start budget for importing the headless analysis and data layers (seconds)
+STARTUP_BUDGET = 1.5
+
+# Modules a headless analysis loads, and GUI modules it must not pull in
+HEADLESS_MODULES = ("iv_analysis", "market_data", "bar_cache", "request_scheduler", "IBApp", "option_chain",
+                    "results_store", "intraday_store", "earnings_calendar")
+GUI_MODULES = ("tkinter", "matplotlib")
+
+OUTPUT_FORMATS = ("csv", "json", "parquet")
+
+# option_math.PRICING_MODELS and DEFAULT_TREE_STEPS, spelled out so building
+# the parser doesn't import numpy; _pricing checks they still match
+PRICING_MODELS = ("black_scholes", "baw", "tree")
+DEFAULT_TREE_STEPS = 101
+
+
+def _load_events(args):
+    import pandas as pd
+
+    if args.events:
+        events = pd.read_csv(args.events)
+    else:
+        tickers, dates = args.tickers or [], args.dates or []
+        if len(dates) == 1:
+            dates = dates * len(tickers)
+        if not tickers or len(tickers) != len(dates):
+            raise SystemExit("Pass --events, or --tickers with one --dates entry per ticker (or a single date)")
+        events = pd.DataFrame({'ticker': tickers, 'earnings_date': dates})
+
+    if 'days_to_expiry' not in events:
+        events['days_to_expiry'] = args.days_to_expiry
+    events['ticker'] = events['ticker'].str.upper()
+    events['earnings_date'] = pd.to_datetime(events['earnings_date'])
+    return events
+
+
+def _connect(host, port, client_id, timeout, timer=None):
+    from IBApp import IBApp
+
+    # Reconnects (and re-sends pending requests) if the Gateway restarts mid-batch
+    app = IBApp(timer=timer)
+    if not app.start(host, port, client_id, timeout=timeout):
+        app.disconnect()
+        raise SystemExit(f"Could not connect to IB at {host}:{port}")
+    return app
+
+
+def _fetch_events(events, cache, scheduler, timeout, timer=None):
+    """Fill the bar cache for every event, requesting only missing days"""
+    import time
+    from market_data import EVENT_SERIES, request_event_bars
+
+    pending = []
+    for ticker, earnings_date in zip(events['ticker'], events['earnings_date']):
+        for series, handle in request_event_bars(scheduler, cache, ticker, earnings_date, timer=timer).items():
+            pending.append((ticker, earnings_date, series, handle))
+
+    deadline = time.time() + timeout
+    for ticker, earnings_date, series, handle in pending:
+        try:
+            if isinstance(handle, Exception):
+                raise handle
+            handle.result(timeout=max(deadline - time.time(), 0))
+        except Exception as e:
+            name = EVENT_SERIES[series][1]
+            print(f"{ticker} {earnings_date:%Y-%m-%d}: {name} data unavailable ({e!r})", file=sys.stderr)
+
+
+def _load_bars(events, cache):
+    """Per-ticker stock/IV frames and one VIX frame covering every event window"""
+    from bar_cache import series_key
+    from market_data import EVENT_SERIES, event_window, series_contract, normalize_iv_data
+
+    windows = events['earnings_date'].map(event_window)
+    events = events.assign(start=windows.str[0], end=windows.str[1])
+
+    stock_bars, iv_bars = {}, {}
+    for ticker, group in events.groupby('ticker'):
+        start, end = group['start'].min(), group['end'].max()
+        for series, target in (("stock", stock_bars), ("iv", iv_bars)):
+            key = series_key(series_contract(series, ticker), EVENT_SERIES[series][0], "1 day")
+            data = cache.load(key, start, end)
+            if not data.empty:
+                target[ticker] = data
+    for data in iv_bars.values():
+        normalize_iv_data(data)
+
+    key = series_key(series_contract("vix", None), EVENT_SERIES["vix"][0], "1 day")
+    vix_data = cache.load(key, events['start'].min(), events['end'].max())
+    return stock_bars, iv_bars, (vix_data if not vix_data.empty else None)
+
+
+def _write_results(results, output, fmt):
+    if fmt is None:
+        fmt = output.rsplit(".", 1)[-1].lower() if output != "-" and "." in output else "csv"
+    if fmt not in OUTPUT_FORMATS:
+        raise SystemExit(f"Unknown output format {fmt!r}; use one of {', '.join(OUTPUT_FORMATS)}")
+
+    if fmt == "parquet":
+        if output == "-":
+            raise SystemExit("Parquet output needs a file path")
+        results.to_parquet(output, index=False)
+    elif fmt == "json":
+        results.to_json(sys.stdout if output == "-" else output, orient="records", date_format="iso")
+    else:
+        results.to_csv(sys.stdout if output == "-" else output, index=False)
+
+
+def cmd_analyze(args):
+    from bar_cache import BarCache, DEFAULT_CACHE_PATH
+    from iv_analysis import run_batch_analysis
+    from stage_timing import StageTimer
+
+    timer = StageTimer()
+    if args.profile:
+        timer.enable_profiling(args.profile)
+
+    events = _load_events(args)
+    cache = BarCache(args.cache or DEFAULT_CACHE_PATH)
+
+    if not args.offline:
+        from request_scheduler import HistoricalRequestScheduler
+
+        app = _connect(args.host, args.port, args.client_id, args.connect_timeout, timer)
+        try:
+            with timer.span("fetch.total"):
+                _fetch_events(events, cache, HistoricalRequestScheduler(app), args.timeout, timer)
+        finally:
+            app.disconnect()
+
+    with timer.span("bars.load"):
+        stock_bars, iv_bars, vix_data = _load_bars(events, cache)
+    with timer.span("analysis.batch"):
+        if args.command == "scan":
+            from universe_scan import scan_universe
+
+            results = scan_universe(events, stock_bars, iv_bars, vix_data, risk_free_rate=args.rate,
+                                    workers=args.workers, **_pricing(args))
+        else:
+            results = run_batch_analysis(events, stock_bars, iv_bars, vix_data, risk_free_rate=args.rate,
+                                         **_pricing(args))
+    if not args.no_store:
+        from results_store import ResultsStore, DEFAULT_RESULTS_PATH
+
+        store = ResultsStore(args.store or DEFAULT_RESULTS_PATH)
+        with timer.span("results.store"):
+            store.append(results, source=args.command, risk_free_rate=args.rate, model=args.model,
+                         dividend_yield=args.dividend_yield)
+        store.close()
+    if args.command == "history":
+        from earnings_history import EarningsHistory, DEFAULT_HISTORY_PATH
+
+        history = EarningsHistory(args.history or DEFAULT_HISTORY_PATH)
+        with timer.span("history.update"):
+            history.add_events(results)
+        results = history.stats_table(events['ticker'].unique().tolist())
+        history.close()
+    if args.command == "report":
+        from report_render import render_reports
+
+        with timer.span("report.render"):
+            paths = render_reports(results, stock_bars, iv_bars, vix_data, args.report_dir, args.formats,
+                                   workers=args.workers, dpi=args.dpi)
+        results['report'] = paths.to_numpy()
+        print(f"Wrote {paths.notna().sum()} reports to {args.report_dir}", file=sys.stderr)
+    _write_results(results, args.output, args.format)
+
+    if args.timings:
+        timer.export(args.timings)
+    return 0
+
+
+def cmd_chain(args):
+    import pandas as pd
+    from bar_cache import BarCache, DEFAULT_CACHE_PATH
+    from option_chain import run_chain_analysis
+    from request_scheduler import HistoricalRequestScheduler
+    from stage_timing import StageTimer
+
+    if args.offline:
+        raise SystemExit("chain needs a live IB connection for the option parameters")
+
+    timer = StageTimer()
+    if args.profile:
+        timer.enable_profiling(args.profile)
+
+    events = _load_events(args)
+    cache = BarCache(args.cache or DEFAULT_CACHE_PATH)
+    # Chain selection left unset falls back to run_chain_analysis's pacing-sized defaults
+    selection = {name: getattr(args, name) for name in ("moneyness", "max_expiries", "max_contracts")
+                 if getattr(args, name) is not None}
+    app = _connect(args.host, args.port, args.client_id, args.connect_timeout, timer)
+    tables = []
+    try:
+        scheduler = HistoricalRequestScheduler(app)
+        _fetch_events(events, cache, scheduler, args.timeout, timer)
+        stock_bars, _, _ = _load_bars(events, cache)
+
+        for ticker, earnings_date in zip(events['ticker'], events['earnings_date']):
+            if ticker not in stock_bars:
+                print(f"{ticker} {earnings_date:%Y-%m-%d}: no stock bars, skipping", file=sys.stderr)
+                continue
+            try:
+                with timer.span("chain.total"):
+                    table, _ = run_chain_analysis(
+                        app, scheduler, cache, ticker, earnings_date, stock_bars[ticker],
+                        risk_free_rate=args.rate, timeout=args.quote_timeout, **selection
+                    )
+            except Exception as e:
+                print(f"{ticker} {earnings_date:%Y-%m-%d}: option chain failed ({e!r})", file=sys.stderr)
+                continue
+            table.insert(0, 'earnings_date', earnings_date)
+            table.insert(0, 'ticker', ticker)
+            tables.append(table)
+    finally:
+        app.disconnect()
+
+    if not tables:
+        return 1
+    _write_results(pd.concat(tables, ignore_index=True), args.output, args.format)
+    if args.timings:
+        timer.export(args.timings)
+    return 0
+
+
+def cmd_intraday(args):
+    import pandas as pd
+    from intraday_store import (IntradayStore, DEFAULT_INTRADAY_DIR, event_days, intraday_series,
+                                request_intraday_event_bars)
+    from iv_analysis import run_iv_crush_analysis, result_frame, session_open
+    from market_data import EVENT_SERIES, series_contract, normalize_iv_data
+    from stage_timing import StageTimer
+
+    timer = StageTimer()
+    if args.profile:
+        timer.enable_profiling(args.profile)
+
+    events = _load_events(args)
+    store = IntradayStore(args.intraday_dir or DEFAULT_INTRADAY_DIR)
+
+    if not args.offline:
+        import time
+        from request_scheduler import HistoricalRequestScheduler
+
+        app = _connect(args.host, args.port, args.client_id, args.connect_timeout, timer)
+        try:
+            scheduler = HistoricalRequestScheduler(app)
+            pending = []
+            with timer.span("fetch.total"):
+                for ticker, earnings_date in zip(events['ticker'], events['earnings_date']):
+                    handles = request_intraday_event_bars(scheduler, store, ticker, earnings_date, args.bar_size,
+                                                          timer=timer)
+                    pending += [(ticker, earnings_date, series, handle) for series, handle in handles.items()]
+                deadline = time.time() + args.timeout
+                for ticker, earnings_date, series, handle in pending:
+                    try:
+                        if isinstance(handle, Exception):
+                            raise handle
+                        handle.result(timeout=max(deadline - time.time(), 0))
+                    except Exception as e:
+                        name = EVENT_SERIES[series][1]
+                        print(f"{ticker} {earnings_date:%Y-%m-%d}: {name} data unavailable ({e!r})",
+                              file=sys.stderr)
+        finally:
+            app.disconnect()
+
+    rows = []
+    for ticker, earnings_date, days_to_expiry in zip(events['ticker'], events['earnings_date'],
+                                                      events['days_to_expiry']):
+        days = event_days(earnings_date)
+        with timer.span("bars.load"):
+            data = {series: store.load(intraday_series(series_contract(series, ticker), what_to_show, args.bar_size),
+                                       min(days), max(days))
+                    for series, (what_to_show, _) in EVENT_SERIES.items()}
+        if data["stock"].empty:
+            print(f"{ticker} {earnings_date:%Y-%m-%d}: no intraday stock bars, skipping", file=sys.stderr)
+            continue
+        iv_data = data["iv"] if not data["iv"].empty else None
+        vix_data = data["vix"] if not data["vix"].empty else None
+        if iv_data is not None:
+            normalize_iv_data(iv_data)
+        try:
+            with timer.span("analysis.run_iv_crush"):
+                results = run_iv_crush_analysis(data["stock"], iv_data, vix_data, earnings_date, days_to_expiry, args.rate,
+                                                pre_time=args.pre_time or None, post_time=args.post_time or None,
+                                                intraday=True, **_pricing(args))
+        except Exception as e:
+            print(f"{ticker} {earnings_date:%Y-%m-%d}: analysis failed ({e!r})", file=sys.stderr)
+            continue
+        post_open = session_open(data["stock"], results["dates"][1])
+        rows.append(result_frame(ticker, earnings_date, days_to_expiry, results, post_open))
+
+    if not rows:
+        return 1
+    results = pd.concat(rows, ignore_index=True)
+    if not args.no_store:
+        from results_store import ResultsStore, DEFAULT_RESULTS_PATH
+
+        results_store = ResultsStore(args.store or DEFAULT_RESULTS_PATH)
+        with timer.span("results.store"):
+            results_store.append(results, source="intraday", risk_free_rate=args.rate, model=args.model,
+                                 dividend_yield=args.dividend_yield)
+        results_store.close()
+    _write_results(results, args.output, args.format)
+    if args.timings:
+        timer.export(args.timings)
+    return 0
+
+
+def _store_results(results, args, source):
+    from results_store import ResultsStore, DEFAULT_RESULTS_PATH
+
+    results_store = ResultsStore(args.store or DEFAULT_RESULTS_PATH)
+    results_store.append(results, source=source, risk_free_rate=args.rate)
+    results_store.close()
+
+
+def cmd_calendar(args):
+    import threading
+    from bar_cache import BarCache, DEFAULT_CACHE_PATH
+    from earnings_calendar import (EarningsCalendarScheduler, PreEventStore, DEFAULT_PRE_EVENT_PATH,
+                                   CALENDAR_COLUMNS, load_calendar)
+    from intraday_store import IntradayStore, DEFAULT_INTRADAY_DIR
+    from stage_timing import StageTimer
+
+    if args.action == "watch" and args.offline:
+        raise SystemExit("calendar watch needs a live IB connection")
+
+    timer = StageTimer()
+    if args.profile:
+        timer.enable_profiling(args.profile)
+
+    if args.events:
+        calendar = load_calendar(args.events, args.days_to_expiry)
+    else:
+        calendar = _load_events(args)[CALENDAR_COLUMNS]
+    pre_store = PreEventStore(args.pre_event_store or DEFAULT_PRE_EVENT_PATH)
+
+    app = scheduler = None
+    if not args.offline:
+        from request_scheduler import HistoricalRequestScheduler
+
+        app = _connect(args.host, args.port, args.client_id, args.connect_timeout, timer)
+        scheduler = HistoricalRequestScheduler(app)
+    calendar_scheduler = EarningsCalendarScheduler(
+        scheduler, BarCache(args.cache or DEFAULT_CACHE_PATH), IntradayStore(args.intraday_dir or DEFAULT_INTRADAY_DIR),
+        pre_store, calendar, risk_free_rate=args.rate, bar_size=args.bar_size, post_time=args.post_time,
+        horizon_days=args.horizon, timer=timer
+    )
+    try:
+        if args.action == "prefetch":
+            results = calendar_scheduler.prefetch(timeout=args.timeout, offline=args.offline)
+            print(f"Precomputed {len(results)} pre-event halves", file=sys.stderr)
+        elif args.action == "finish":
+            results = calendar_scheduler.finish(timeout=args.timeout, offline=args.offline)
+            print(f"Finished {len(results)} events", file=sys.stderr)
+            if len(results) and not args.no_store:
+                _store_results(results, args, "calendar")
+        else:
+            def on_results(results):
+                for row in results.itertuples():
+                    print(f"{row.ticker} {row.earnings_date:%Y-%m-%d}: IV crush {row.iv_crush_pct:.1f}%, "
+                          f"straddle {row.pre_straddle:.2f} -> {row.post_straddle:.2f}", file=sys.stderr)
+                if not args.no_store:
+                    _store_results(results, args, "calendar")
+
+            print(f"Watching {len(calendar)} calendar events (Ctrl+C to stop)", file=sys.stderr)
+            try:
+                calendar_scheduler.watch(threading.Event(), on_results, interval=args.interval)
+            except KeyboardInterrupt:
+                pass
+            return 0
+    finally:
+        pre_store.close()
+        if app is not None:
+            app.disconnect()
+
+    _write_results(results, args.output, args.format)
+    if args.timings:
+        timer.export(args.timings)
+    return 0
+
+
+def cmd_query(args):
+    from results_store import ResultsStore, DEFAULT_RESULTS_PATH
+
+    ranges = {}
+    for column, low, high in args.range or []:
+        ranges[column] = (float(low) if low != "-" else None, float(high) if high != "-" else None)
+    if args.min_crush is not None or args.max_crush is not None:
+        ranges['iv_crush_pct'] = (args.min_crush, args.max_crush)
+    if args.min_abs_delta_change is not None:
+        ranges['abs_delta_change'] = (args.min_abs_delta_change, None)
+
+    store = ResultsStore(args.store or DEFAULT_RESULTS_PATH)
+    try:
+        results = store.query(tickers=args.tickers, start=args.start, end=args.end, expr=args.expr,
+                              latest=not args.all_runs, limit=args.limit, **ranges)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    finally:
+        store.close()
+    _write_results(results, args.output, args.format)
+    return 0
+
+
+def measure_startup():
+    """Import the headless layers in a fresh interpreter; returns (seconds, GUI modules loaded)"""
+    import json
+    import os
+    import subprocess
+
+    probe = (
+        "import json, sys, time\n"
+        "t = time.perf_counter()\n"
+        f"for name in {HEADLESS_MODULES!r}: __import__(name)\n"
+        "elapsed = time.perf_counter() - t\n"
+        f"gui = [m for m in {GUI_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps([elapsed, gui]))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", probe], cwd=here, check=True,
+                            capture_output=True, text=True).stdout
+    elapsed, gui = json.loads(output)
+    return elapsed, gui
+
+
+def cmd_startup(args):
+    elapsed, gui = measure_startup()
+    print(f"Headless import time: {elapsed * 1000:.0f} ms (budget {args.budget * 1000:.0f} ms)")
+    if gui:
+        print(f"GUI modules imported by the headless layers: {', '.join(gui)}")
+    return 0 if elapsed <= args.budget and not gui else 1
+
+
+def _add_event_arguments(parser):
+    parser.add_argument("--tickers", nargs="+", help="Tickers to analyze")
+    parser.add_argument("--dates", nargs="+", help="Earnings dates (YYYY-MM-DD), one per ticker or one for all")
+    parser.add_argument("--events", help="CSV with ticker, earnings_date and optional days_to_expiry columns "
+                                         "(calendar also takes JSON)")
+    parser.add_argument("--days-to-expiry", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=0.05, help="Risk-free rate (annualized)")
+    parser.add_argument("--output", default="-", help="Output path, or - for stdout")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="Defaults to the output file extension")
+    parser.add_argument("--cache", help="Bar cache path")
+    parser.add_argument("--offline", action="store_true", help="Use cached bars only; don't connect to IB")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7497)
+    parser.add_argument("--client-id", type=int, default=1)
+    parser.add_argument("--connect-timeout", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for all data requests")
+    parser.add_argument("--timings", help="Write per-stage p50/p95/p99 timings to this .csv or .json file")
+    parser.add_argument("--profile", metavar="DIR", help="Profile each stage with cProfile into DIR")
+    parser.add_argument("--store", help="Results store path")
+    parser.add_argument("--no-store", action="store_true", help="Don't append the results to the results store")
+
+
+def _add_pricing_arguments(parser):
+    parser.add_argument("--model", choices=PRICING_MODELS, default=PRICING_MODELS[0],
+                        help="European Black-Scholes, or American by Barone-Adesi-Whaley or a binomial tree")
+    parser.add_argument("--dividend-yield", type=float, default=0.0, help="Continuous dividend yield (annualized)")
+    parser.add_argument("--tree-steps", type=int, default=DEFAULT_TREE_STEPS,
+                        help="Steps for --model tree: more is more accurate, and quadratically slower")
+
+
+def _pricing(args):
+    import option_math
+
+    if (option_math.PRICING_MODELS, option_math.DEFAULT_TREE_STEPS) != (PRICING_MODELS, DEFAULT_TREE_STEPS):
+        raise SystemExit("ivcrush's PRICING_MODELS/DEFAULT_TREE_STEPS are out of date with option_math")
+    return {'model': args.model, 'dividend_yield': args.dividend_yield, 'tree_steps': args.tree_steps}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ivcrush", description="Headless IV crush analysis")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    analyze = commands.add_parser("analyze", help="Analyze IV crush for earnings events")
+    _add_event_arguments(analyze)
+    _add_pricing_arguments(analyze)
+    analyze.set_defaults(func=cmd_analyze)
+
+    scan = commands.add_parser("scan", help="Analyze a watchlist of events on a process pool")
+    _add_event_arguments(scan)
+    _add_pricing_arguments(scan)
+    scan.add_argument("--workers", type=int, help="Worker processes (defaults to the CPU count)")
+    scan.set_defaults(func=cmd_analyze)
+
+    report = commands.add_parser("report", help="Write PNG/PDF/HTML chart reports for each event")
+    _add_event_arguments(report)
+    _add_pricing_arguments(report)
+    report.add_argument("--report-dir", default="reports", help="Directory for the report files")
+    report.add_argument("--formats", nargs="+", default=["png", "html"], choices=("png", "pdf", "html"))
+    report.add_argument("--workers", type=int, help="Worker processes (defaults to the CPU count)")
+    report.add_argument("--dpi", type=int, default=80)
+    report.set_defaults(func=cmd_analyze)
+
+    chain = commands.add_parser("chain", help="IV crush for every strike and expiry of each event's option chain")
+    _add_event_arguments(chain)
+    chain.add_argument("--moneyness", type=float, help="Keep strikes within spot * (1 +/- this)")
+    chain.add_argument("--max-expiries", type=int, help="Nearest expiries after the event to keep")
+    chain.add_argument("--max-contracts", type=int,
+                       help="Cap on contracts per event, keeping strikes nearest spot")
+    chain.add_argument("--quote-timeout", type=float,
+                       help="Seconds to wait for the option quotes (default: sized to the number of requests)")
+    chain.set_defaults(func=cmd_chain)
+
+    history = commands.add_parser("history", help="Add past earnings events to the per-ticker move history "
+                                                   "and write its statistics")
+    _add_event_arguments(history)
+    _add_pricing_arguments(history)
+    history.add_argument("--history", help="Earnings history database path")
+    history.set_defaults(func=cmd_analyze)
+
+    intraday = commands.add_parser("intraday", help="Analyze events at exact intraday pre/post bars")
+    _add_event_arguments(intraday)
+    _add_pricing_arguments(intraday)
+    intraday.add_argument("--bar-size", default="1 min", choices=("1 min", "5 secs"))
+    intraday.add_argument("--pre-time", default="15:59", help="Pre-event bar: last at or before this time")
+    intraday.add_argument("--post-time", default="09:45", help="Post-event bar: first at or after this time")
+    intraday.add_argument("--intraday-dir", help="Intraday bar store directory")
+    intraday.set_defaults(func=cmd_intraday)
+
+    calendar = commands.add_parser("calendar", help="Prefetch and precompute upcoming earnings from a calendar "
+                                                     "off-hours, and finish them from the post-event bar")
+    calendar.add_argument("action", choices=("prefetch", "finish", "watch"),
+                          help="prefetch: warm caches and store pre-event halves; finish: complete due events; "
+                               "watch: both, on a loop")
+    _add_event_arguments(calendar)
+    calendar.add_argument("--horizon", type=int, default=14, help="Prefetch events up to this many days ahead")
+    calendar.add_argument("--bar-size", default="1 min", choices=("1 min", "5 secs"))
+    calendar.add_argument("--post-time", default="09:45", help="Post-event bar: first at or after this time")
+    calendar.add_argument("--interval", type=float, default=60, help="Seconds between watch passes")
+    calendar.add_argument("--pre-event-store", help="Precomputed pre-event store path")
+    calendar.add_argument("--intraday-dir", help="Intraday bar store directory")
+    calendar.set_defaults(func=cmd_calendar)
+
+    query = commands.add_parser("query", help="Query stored analysis results")
+    query.add_argument("--tickers", nargs="+", help="Only these tickers")
+    query.add_argument("--start", help="Earliest earnings date (YYYY-MM-DD)")
+    query.add_argument("--end", help="Latest earnings date (YYYY-MM-DD)")
+    query.add_argument("--min-crush", type=float, help="Minimum IV crush (%%)")
+    query.add_argument("--max-crush", type=float, help="Maximum IV crush (%%)")
+    query.add_argument("--min-abs-delta-change", type=float, help="Minimum |straddle delta change|")
+    query.add_argument("--range", nargs=3, action="append", metavar=("COLUMN", "LOW", "HIGH"),
+                       help="Bound any stored column (abs_ prefix for its absolute value, - for open)")
+    query.add_argument("--expr", help="Extra pandas query expression, e.g. \"source == 'scan'\"")
+    query.add_argument("--all-runs", action="store_true", help="Include superseded runs of the same event")
+    query.add_argument("--limit", type=int)
+    query.add_argument("--store", help="Results store path")
+    query.add_argument("--output", default="-", help="Output path, or - for stdout")
+    query.add_argument("--format", choices=OUTPUT_FORMATS, help="Defaults to the output file extension")
+    query.set_defaults(func=cmd_query)
+
+    startup = commands.add_parser("startup", help="Measure cold-start import time against the budget")
+    startup.add_argument("--budget", type=float, default=STARTUP_BUDGET, help="Budget in seconds")
+    startup.set_defaults(func=cmd_startup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
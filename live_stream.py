@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+from IBApp import DELAYED_FALLBACK
+from market_data import EVENT_SERIES, create_equity_contract, normalize_iv_data, series_contract
+from option_math import black_scholes_greeks
+
+# Daily bars streamed with keepUpToDate; covers event_window before the event
+LIVE_DURATION = "1 M"
+# Generic tick 106: the underlying's 30-day implied volatility
+IV_GENERIC_TICKS = "106"
+# Chart/label refresh cap for live mode
+LIVE_FPS = 5
+
+
+def _pre_index(ts, cutoff):
+    """Position of the last entry at or before cutoff (ns), or -1"""
+    return int(np.searchsorted(ts, cutoff, side='right')) - 1
+
+
+class LiveIVCrush:
+    """
+    run_iv_crush_analysis for streaming prices
+
+    The pre-event leg depends only on completed bars, so it is priced once
+    and reused; each update only reprices the post-event leg at the latest
+    spot and IV (one scalar Black-Scholes call prices the call/put pair),
+    and not even that if neither has moved. The result dict has the same
+    layout as run_iv_crush_analysis, so the dashboard labels and charts
+    take it unchanged.
+    """
+
+    def __init__(self, days_to_expiry, risk_free_rate):
+        self.T = days_to_expiry / 365
+        self.r = risk_free_rate
+        self._pre = None
+        self._pre_key = None
+        self._post_key = None
+        self._results = None
+
+    def set_pre(self, pre_date, pre_spot, pre_iv):
+        key = (pre_date, pre_spot, pre_iv)
+        if key == self._pre_key:
+            return
+        g = black_scholes_greeks(pre_spot, pre_spot, self.T, self.r, pre_iv)
+        self._pre = dict(date=pre_date, spot=pre_spot, iv=pre_iv, call=float(g['call']), put=float(g['put']),
+                         delta=float(g['call_delta'] + g['put_delta']), vega=float(2 * g['vega']))
+        self._pre_key = key
+        self._post_key = None
+
+    def update(self, post_date, post_spot, post_iv):
+        """Results for the latest post-event spot and IV, or None before set_pre"""
+        pre = self._pre
+        if pre is None:
+            return None
+        key = (post_date, post_spot, post_iv)
+        if key == self._post_key:
+            return self._results
+
+        g = black_scholes_greeks(post_spot, pre["spot"], self.T, self.r, post_iv)
+        post_call, post_put = float(g['call']), float(g['put'])
+        self._post_key = key
+        self._results = {
+            "dates": (pre["date"], post_date),
+            "spot": (pre["spot"], post_spot),
+            "iv": (pre["iv"], post_iv),
+            "iv_crush_pct": (pre["iv"] - post_iv) / pre["iv"] * 100,
+            "options": {
+                "pre_call": pre["call"],
+                "pre_put": pre["put"],
+                "post_call": post_call,
+                "post_put": post_put,
+                "pre_straddle": pre["call"] + pre["put"],
+                "post_straddle": post_call + post_put
+            },
+            "greeks": {
+                "pre_delta": pre["delta"],
+                "post_delta": float(g['call_delta'] + g['put_delta']),
+                "pre_vega": pre["vega"],
+                "post_vega": float(2 * g['vega'])
+            }
+        }
+        return self._results
+
+
+class LiveSession:
+    """
+    Stream one earnings event's stock, VIX and IV data
+
+    The stock, VIX and IV daily bars are requested with keepUpToDate, so the
+    current day's bar updates in place, and the stock's trades and 30-day IV
+    also stream as market data ticks. IBApp writes everything into fixed-size
+    ring buffers from its reader thread; nothing is posted to the UI per
+    tick. The UI calls poll() on its own timer (LIVE_FPS), which returns None
+    when no buffer has changed, so a burst of ticks costs one refresh.
+
+    The pre-event leg uses the last completed bar on or before the earnings
+    date; the post-event leg uses the latest trade (or bar close) and IV
+    (tick, IV bar, or VIX-based estimate like run_iv_crush_analysis).
+    """
+
+    def __init__(self, app, scheduler, ticker, earnings_date, days_to_expiry, risk_free_rate):
+        self.app = app
+        self.scheduler = scheduler
+        self.ticker = ticker
+        self.earnings_date = pd.Timestamp(earnings_date)
+        self.metrics = LiveIVCrush(days_to_expiry, risk_free_rate)
+        self.bars = {}
+        self.ticks = None
+        self.req_ids = []
+        self._versions = None
+        self._reported = set()
+
+    def start(self):
+        self.app.reqMarketDataType(DELAYED_FALLBACK)
+        for series, (what_to_show, _) in EVENT_SERIES.items():
+            req_id = self.scheduler.next_req_id()
+            self.req_ids.append(req_id)
+            self.bars[series] = self.app.stream_bars(
+                req_id, series_contract(series, self.ticker), what_to_show, LIVE_DURATION)["bars"]
+        req_id = self.scheduler.next_req_id()
+        self.req_ids.append(req_id)
+        self.ticks = self.app.stream_market_data(req_id, create_equity_contract(self.ticker), IV_GENERIC_TICKS)
+
+    def stop(self):
+        for req_id in self.req_ids:
+            self.app.cancel_stream(req_id)
+        self.req_ids = []
+
+    def errors(self):
+        """Stream errors not reported by an earlier call"""
+        new = []
+        for req_id in self.req_ids:
+            error = self.app.stream_errors.get(req_id)
+            if error is not None and req_id not in self._reported:
+                self._reported.add(req_id)
+                new.append(error)
+        return new
+
+    def poll(self):
+        """
+        Latest data if anything changed since the last poll, else None
+
+        Returns a dict with stock_data, iv_data and vix_data frames (like the
+        fetched bars; iv_data has implied_vol) and results (None until there
+        is a pre-event bar and a bar after it or a trade).
+        """
+        rings = list(self.bars.values()) + list(self.ticks.values())
+        versions = tuple(ring.version for ring in rings)
+        if versions == self._versions:
+            return None
+        self._versions = versions
+
+        stock_data = self.bars["stock"].to_frame()
+        vix_data = self.bars["vix"].to_frame()
+        iv_data = self.bars["iv"].to_frame()
+        normalize_iv_data(iv_data)
+        if stock_data.empty:
+            return None
+
+        return {
+            "stock_data": stock_data,
+            "iv_data": iv_data if not iv_data.empty else None,
+            "vix_data": vix_data if not vix_data.empty else None,
+            "results": self._update_metrics(stock_data, iv_data, vix_data),
+        }
+
+    def _update_metrics(self, stock_data, iv_data, vix_data):
+        ts = stock_data.index.asi8
+        cutoff = self.earnings_date.as_unit('ns').value
+        pre = _pre_index(ts, cutoff)
+        # The latest bar is still forming; the pre-event leg needs a completed one
+        pre = min(pre, len(ts) - 2)
+        if pre < 0:
+            return None
+        pre_date = stock_data.index[pre]
+
+        last = self.ticks["last"].last()
+        post_spot = last[1]["value"] if last is not None else stock_data['close'].iloc[-1]
+        post_date = stock_data.index[-1]
+
+        iv_tick = self.ticks["iv"].last()
+        if not iv_data.empty and _pre_index(iv_data.index.asi8, pre_date.value) >= 0:
+            pre_iv = iv_data['implied_vol'].iloc[_pre_index(iv_data.index.asi8, pre_date.value)]
+            post_iv = iv_tick[1]["value"] if iv_tick is not None else iv_data['implied_vol'].iloc[-1]
+        else:
+            vix = vix_data['close'] if not vix_data.empty else None
+            pre_vix = vix.iloc[max(_pre_index(vix.index.asi8, pre_date.value), 0)] if vix is not None else 20
+            post_vix = vix.iloc[-1] if vix is not None else 20
+            pre_iv = pre_vix / 100 * 1.5
+            post_iv = iv_tick[1]["value"] if iv_tick is not None else post_vix / 100 * 1.2
+
+        self.metrics.set_pre(pre_date, float(stock_data['close'].iloc[pre]), float(pre_iv))
+        return self.metrics.update(post_date, float(post_spot), float(post_iv))
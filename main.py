@@ -1,90 +1,77 @@
-# Interactive Brokers API
-from ibapi.client import EClient
-from ibapi.wrapper import EWrapper
-from ibapi.contract import Contract
-
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import os
 import threading
+import queue
 import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
-from ui_setup import setup_ui
+from ui_setup import setup_ui, setup_chain_window, setup_sweep_window
 from IBApp import IBApp
-from option_math import black_scholes_call, black_scholes_put, calculate_delta, calculate_vega
-
-def run_iv_crush_analysis(
-    stock_data,
-    iv_data,
-    vix_data,
-    earnings_date,
-    days_to_expiry,
-    risk_free_rate
-):
-    # --- Dates ---
-    stock_dates = stock_data.index
-    pre_date = stock_dates[stock_dates <= earnings_date].max()
-    post_date = stock_dates[stock_dates > earnings_date].min()
-
-    pre_spot = stock_data.loc[pre_date, 'close']
-    post_spot = (stock_data.loc[post_date, 'open'] +
-                 stock_data.loc[post_date, 'close']) / 2
-
-    # --- IV ---
-    if iv_data is not None:
-        pre_iv = iv_data.loc[iv_data.index <= pre_date].iloc[-1]['implied_vol']
-        post_iv = iv_data.loc[iv_data.index >= post_date].iloc[0]['implied_vol']
-    else:
-        pre_vix = vix_data.loc[vix_data.index <= pre_date].iloc[-1]['close'] if vix_data is not None else 20
-        post_vix = vix_data.loc[vix_data.index >= post_date].iloc[0]['close'] if vix_data is not None else 20
-        pre_iv = pre_vix / 100 * 1.5
-        post_iv = post_vix / 100 * 1.2
-
-    # --- Options ---
-    T = days_to_expiry / 365
-    K = pre_spot
-
-    pre_call = black_scholes_call(pre_spot, K, T, risk_free_rate, pre_iv)
-    pre_put = black_scholes_put(pre_spot, K, T, risk_free_rate, pre_iv)
-    post_call = black_scholes_call(post_spot, K, T, risk_free_rate, post_iv)
-    post_put = black_scholes_put(post_spot, K, T, risk_free_rate, post_iv)
-
-    pre_straddle = pre_call + pre_put
-    post_straddle = post_call + post_put
-
-    # --- Greeks ---
-    pre_delta = calculate_delta(pre_spot, K, T, risk_free_rate, pre_iv, 'call') + \
-                calculate_delta(pre_spot, K, T, risk_free_rate, pre_iv, 'put')
-
-    post_delta = calculate_delta(post_spot, K, T, risk_free_rate, post_iv, 'call') + \
-                 calculate_delta(post_spot, K, T, risk_free_rate, post_iv, 'put')
-
-    pre_vega = 2 * calculate_vega(pre_spot, K, T, risk_free_rate, pre_iv)
-    post_vega = 2 * calculate_vega(post_spot, K, T, risk_free_rate, post_iv)
-
-    return {
-        "dates": (pre_date, post_date),
-        "spot": (pre_spot, post_spot),
-        "iv": (pre_iv, post_iv),
-        "iv_crush_pct": (pre_iv - post_iv) / pre_iv * 100,
-        "options": {
-            "pre_call": pre_call,
-            "pre_put": pre_put,
-            "post_call": post_call,
-            "post_put": post_put,
-            "pre_straddle": pre_straddle,
-            "post_straddle": post_straddle
-        },
-        "greeks": {
-            "pre_delta": pre_delta,
-            "post_delta": post_delta,
-            "pre_vega": pre_vega,
-            "post_vega": post_vega
-        }
-    }
+from bar_cache import BarCache
+from market_data import EVENT_SERIES, request_event_bars, normalize_iv_data
+from request_scheduler import HistoricalRequestScheduler, INTERACTIVE
+from iv_analysis import run_iv_crush_analysis, result_frame, session_open
+from stage_timing import StageTimer
+from option_chain import run_chain_analysis, surface_grid
+from chart_renderer import draw_crush_surface, SweepHeatmap
+from straddle_mc import calibrate_gap, event_move_std, simulate_straddle_pnl
+from earnings_history import EarningsHistory, event_moves
+from live_stream import LiveSession, LIVE_FPS
+from results_store import ResultsStore
+from param_sweep import sweep_grid, SWEEP_METRICS
+from intraday_store import IntradayStore, request_intraday_event_bars
+from report_render import render_report, REPORT_FORMATS
+from earnings_calendar import EarningsCalendarScheduler, PreEventStore, load_calendar, next_event
+
+# How often the Tk thread drains work posted by worker threads (~60fps)
+UI_POLL_MS = 16
+# Max queued items handled per drain so a burst can't stall the event loop
+UI_QUEUE_BATCH = 200
+
+# Seconds to wait for TWS/Gateway to answer a connect
+CONNECT_TIMEOUT = 10
+
+# Seconds to wait for an analysis's bars; intraday days take several requests each,
+# and small bars also wait for IB's pacing (added on top, see pacing_wait)
+BAR_TIMEOUT = 15
+INTRADAY_BAR_TIMEOUT = 90
+# Warn when pacing alone will hold an analysis up longer than this
+PACING_WARNING = 30
+
+# Where the diagnostics panel's profiling toggle writes .prof files
+PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".iv_crush", "profiles")
+
+
+class AnalysisCancelled(Exception):
+    """Raised inside a worker when its analysis has been superseded"""
+
+
+class AnalysisJob:
+    """Inputs and cancellation flag for one analysis run"""
+
+    def __init__(self, ticker, earnings_date, days_to_expiry):
+        self.ticker = ticker
+        self.earnings_date = earnings_date
+        self.days_to_expiry = days_to_expiry
+        self.monte_carlo = False
+        # Intraday bar size ("1 min", "5 secs") and pre/post bar times, or None for daily bars
+        self.intraday = None
+        self.pre_time = None
+        self.post_time = None
+        self.started = time.perf_counter()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
 
 
 class EarningsTradingDashboard:
@@ -97,103 +84,155 @@ class EarningsTradingDashboard:
         self.stock_data = None
         self.vix_data = None
         self.iv_data = None
+        self.results = None
         self.earnings_date = None
         self.ticker = None
 
+        # Per-stage timing spans, shown in the diagnostics panel
+        self.timer = StageTimer()
+
         # IB connection
-        self.ib_app = IBApp()
+        self.ib_app = IBApp(timer=self.timer)
+        self.ib_app.connection_listeners.append(self.on_connection_state)
         self.connected = False
 
+        # Local historical bar cache and paced request queue, shared across analyses
+        self.bar_cache = BarCache()
+        self.intraday_store = IntradayStore()
+        self.request_scheduler = HistoricalRequestScheduler(self.ib_app)
+
+        # Per-ticker implied vs realized move history, grown by every analysis
+        self.earnings_history = EarningsHistory()
+        # Every analysis run, for cross-sectional queries later
+        self.results_store = ResultsStore()
+
         # Option pricing parameters
         self.risk_free_rate = 0.05  # 5% risk-free rate
 
-        # Chart management
-        self.ax1_twin = None  # Keep track of twin axis
+        # Loaded earnings calendar, prefetched off-hours and finished at the open
+        self.calendar = None
+        self.calendar_scheduler = None
+        self.calendar_stop = threading.Event()
+        self.pre_event_store = PreEventStore()
+
+        # Worker threads post UI work here; drained on the Tk thread
+        self.ui_queue = queue.Queue()
+        self.analysis_job = None
+        self.chain_job = None
+        self.live_session = None
 
         setup_ui(self)
+        self.ticker_var.trace_add("write", self.fill_earnings_date)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(UI_POLL_MS, self.process_ui_queue)
+
+    def post_to_ui(self, func, *args):
+        """Run func(*args) on the Tk thread; safe to call from any thread"""
+        self.ui_queue.put((func, args))
+
+    def process_ui_queue(self):
+        """Drain work posted by worker threads, then reschedule"""
+        log_lines = []
+        for _ in range(UI_QUEUE_BATCH):
+            try:
+                func, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if func is self._append_log:
+                log_lines.append(args[0])
+                continue
+            if log_lines:
+                self._append_log("".join(log_lines))
+                log_lines = []
+            try:
+                func(*args)
+            except Exception as e:
+                self._append_log(f"UI update error: {e}\n")
+        if log_lines:
+            self._append_log("".join(log_lines))
 
-    def create_equity_contract(self, symbol):
-        """Create an equity contract for the given symbol"""
-        contract = Contract()
-        contract.symbol = symbol.upper()
-        contract.secType = "STK"
-        contract.exchange = "SMART"
-        contract.currency = "USD"
-        return contract
-
-    def create_vix_contract(self):
-        """Create a VIX contract"""
-        contract = Contract()
-        contract.symbol = "VIX"
-        contract.secType = "IND"
-        contract.exchange = "CBOE"
-        contract.currency = "USD"
-        return contract
+        self.root.after(UI_POLL_MS, self.process_ui_queue)
 
+    def _append_log(self, text):
+        self.status_text.insert(tk.END, text)
+        self.status_text.see(tk.END)
 
     def log_message(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.status_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.status_text.see(tk.END)
-        self.root.update_idletasks()
+        self.post_to_ui(self._append_log, f"[{timestamp}] {message}\n")
 
     def connect_ib(self):
         try:
             host = self.host_var.get()
             port = int(self.port_var.get())
+        except ValueError:
+            self.log_message("Connection error: port must be a number")
+            return
 
-            self.log_message(f"Connecting to IB at {host}:{port}...")
+        self.log_message(f"Connecting to IB at {host}:{port}...")
+        self.connect_btn.config(state="disabled")
 
-            # Start connection in separate thread
-            def connect_thread():
-                try:
-                    self.ib_app.connect(host, port, 0)
-                    self.ib_app.run()
-                except Exception as e:
-                    self.log_message(f"Connection error: {e}")
-
-            thread = threading.Thread(target=connect_thread, daemon=True)
-            thread.start()
-
-            # Wait for connection and server version
-            for i in range(100):  # Wait up to 10 seconds
-                if self.ib_app.connected:
-                    try:
-                        server_version = self.ib_app.serverVersion()
-                        if server_version is not None and server_version > 0:
-                            break
-                    except:
-                        pass
-                time.sleep(0.1)
-
-            if self.ib_app.connected:
-                try:
-                    server_version = self.ib_app.serverVersion()
-                    if server_version is not None and server_version > 0:
-                        self.connected = True
-                        self.connect_btn.config(state="disabled")
-                        self.disconnect_btn.config(state="normal")
-                        self.analyze_btn.config(state="normal")
-                        self.log_message(
-                            f"Successfully connected to Interactive Brokers (Server Version: {server_version})")
-                    else:
-                        self.log_message(
-                            "Connected but server version not available. Please wait a moment and try again.")
-                except Exception as e:
-                    self.log_message(f"Connection established but server version check failed: {e}")
-            else:
+        # start() returns as soon as nextValidId arrives; the Tk thread never waits on it
+        def connect_thread():
+            try:
+                if self.ib_app.start(host, port, 0, timeout=CONNECT_TIMEOUT):
+                    self.post_to_ui(self.on_ib_connected)
+                    return
+                self.ib_app.disconnect()    # stop retrying in the background
                 self.log_message("Failed to connect to Interactive Brokers")
-
-        except Exception as e:
-            self.log_message(f"Connection error: {e}")
+            except Exception as e:
+                self.log_message(f"Connection error: {e}")
+            self.post_to_ui(lambda: self.connect_btn.config(state="normal"))
+
+        threading.Thread(target=connect_thread, daemon=True).start()
+
+    def on_ib_connected(self):
+        self.connected = True
+        self.refresh_diagnostics()
+        self.connect_btn.config(state="disabled")
+        self.disconnect_btn.config(state="normal")
+        self.analyze_btn.config(state="normal")
+        self.chain_btn.config(state="normal")
+        self.live_btn.config(state="normal")
+        self.log_message(
+            f"Successfully connected to Interactive Brokers (Server Version: {self.ib_app.serverVersion()})")
+
+    def on_connection_state(self, state, message):
+        """IBApp connection listener (IB threads): log drops and reconnects while connected"""
+        if not self.connected:
+            return
+        if state == "closed":
+            # Gave up reconnecting; the user hanging up clears self.connected first
+            self.log_message("Lost the connection to Interactive Brokers")
+            self.post_to_ui(self.disconnect_ib)
+        elif state != "connected" or self.ib_app.sessions > 1:
+            self.log_message(message)
+
+    def on_close(self):
+        """Window closed: drop pending work so nothing keeps requesting, then exit"""
+        for job in (self.analysis_job, self.chain_job):
+            if job is not None:
+                job.cancel()
+        self.calendar_stop.set()
+        if self.connected:
+            self.disconnect_ib()
+        self.request_scheduler.stop()
+        self.root.destroy()
 
     def disconnect_ib(self):
         try:
-            self.ib_app.disconnect()
+            for job in (self.analysis_job, self.chain_job):
+                if job is not None:
+                    job.cancel()
+            self.stop_live()
+            # Cleared first so the listener doesn't take this for a lost connection
             self.connected = False
+            self.ib_app.disconnect()
             self.connect_btn.config(state="normal")
             self.disconnect_btn.config(state="disabled")
             self.analyze_btn.config(state="disabled")
+            self.chain_btn.config(state="disabled")
+            self.live_btn.config(state="disabled")
 
             # Clear any existing analysis results
             self.clear_analysis_results()
@@ -204,20 +243,8 @@ class EarningsTradingDashboard:
 
     def clear_analysis_results(self):
         """Clear all analysis results and reset displays"""
-        # Clear charts completely including any twin axes
-        self.ax1.clear()
-        self.ax2.clear()
-
-        # Clear any twin axes that might exist
-        if self.ax1_twin is not None:
-            try:
-                self.ax1_twin.remove()
-            except:
-                pass
-            self.ax1_twin = None
-
-        # Redraw the canvas
-        self.canvas.draw()
+        # Hide chart data; the artists are kept for the next analysis
+        self.chart_renderer.clear()
 
         # Reset all metric displays
         self.stock_price_label.config(text="N/A", foreground="black")
@@ -260,219 +287,484 @@ class EarningsTradingDashboard:
         self.post_vega_label.config(text="N/A", foreground="black")
         self.vega_change_label.config(text="N/A", foreground="black")
 
+        # Reset Monte Carlo displays
+        for side in ("long", "short"):
+            for field in ("win", "median", "p05", "p95", "es05"):
+                getattr(self, f"mc_{side}_{field}_label").config(text="N/A", foreground="black")
+        self.update_history_labels(None)
+
         # Reset data storage
         self.stock_data = None
         self.vix_data = None
         self.iv_data = None
-
-        # Clear IB historical data cache
-        if hasattr(self, 'ib_app') and self.ib_app:
-            self.ib_app.historical_data.clear()
+        self.results = None
+        self.sweep_btn.config(state="disabled")
+        self.report_btn.config(state="disabled")
 
         self.log_message("Analysis results cleared - ready for new analysis")
 
 
-    def analyze_iv_crush(self):
+    def read_analysis_inputs(self):
+        """Check the connection and parse the setup fields; returns an AnalysisJob or None"""
         if not self.connected or not self.ib_app.connected:
             messagebox.showerror("Error", "Not connected to Interactive Brokers")
-            return
+            return None
 
         # Check if we have a valid server version
         try:
             server_version = self.ib_app.serverVersion()
             if server_version is None or server_version <= 0:
                 messagebox.showerror("Error", "Connection not fully established. Please wait and try again.")
-                return
+                return None
         except Exception as e:
             self.log_message(f"Connection error: {e}")
             messagebox.showerror("Error", "Connection not stable. Please reconnect.")
-            return
+            return None
 
-        self.ticker = self.ticker_var.get().upper()
+        ticker = self.ticker_var.get().upper()
         earnings_date_str = self.earnings_date_var.get()
 
         try:
-            self.earnings_date = datetime.strptime(earnings_date_str, "%Y-%m-%d")
+            earnings_date = datetime.strptime(earnings_date_str, "%Y-%m-%d")
         except ValueError:
             messagebox.showerror("Error", "Invalid date format. Use YYYY-MM-DD")
+            return None
+
+        try:
+            days_to_expiry = int(self.days_to_expiry_var.get())
+        except ValueError:
+            days_to_expiry = 30
+            self.days_to_expiry_var.set("30")
+
+        return AnalysisJob(ticker, earnings_date, days_to_expiry)
+
+    def analyze_iv_crush(self):
+        job = self.read_analysis_inputs()
+        if job is None:
             return
+        job.monte_carlo = self.monte_carlo_var.get()
+        if self.intraday_var.get():
+            job.intraday = self.intraday_bar_size_var.get()
+            job.pre_time = self.pre_time_var.get().strip() or None
+            job.post_time = self.post_time_var.get().strip() or None
+        self.stop_live()
 
-        self.log_message(f"Starting IV crush analysis for {self.ticker} around earnings on {earnings_date_str}")
+        self.log_message(
+            f"Starting IV crush analysis for {job.ticker} around earnings on {job.earnings_date:%Y-%m-%d}")
 
         # Clear previous visualizations and reset displays
         self.clear_analysis_results()
 
-        # Calculate date range (3 days before and after earnings)
-        start_date = self.earnings_date - timedelta(days=10)  # Extra buffer for data
-        end_date = self.earnings_date + timedelta(days=10)
+        # Cancel whatever is still running for the previous ticker
+        if self.analysis_job is not None:
+            self.analysis_job.cancel()
+        self.analysis_job = job
 
-        # Clear previous data
-        self.ib_app.historical_data.clear()
+        # Fetch and analyze on a worker thread; rendering is posted back to Tk
+        threading.Thread(target=self.run_analysis_job, args=(job,), daemon=True).start()
 
-        # Query stock price data
-        self.log_message(f"Querying stock price data for {self.ticker}...")
-        stock_contract = self.create_equity_contract(self.ticker)
+    def toggle_live(self):
+        if self.live_session is not None:
+            self.stop_live()
+            self.log_message("Live mode stopped")
+            return
 
-        # Clear any existing data for this request ID before making new request
-        if 1 in self.ib_app.historical_data:
-            del self.ib_app.historical_data[1]
+        job = self.read_analysis_inputs()
+        if job is None:
+            return
+        if self.analysis_job is not None:
+            self.analysis_job.cancel()
+        self.clear_analysis_results()
+        self.ticker = job.ticker
+        self.earnings_date = job.earnings_date
+
+        self.live_session = LiveSession(self.ib_app, self.request_scheduler, job.ticker, job.earnings_date,
+                                        job.days_to_expiry, self.risk_free_rate)
+        self.live_session.start()
+        self.live_btn.config(text="Stop Live")
+        self.log_message(f"Streaming {job.ticker} stock, VIX and IV data (refresh capped at {LIVE_FPS} fps)")
+        self.root.after(1000 // LIVE_FPS, self.refresh_live, self.live_session)
+
+    def stop_live(self):
+        if self.live_session is not None:
+            self.live_session.stop()
+            self.live_session = None
+        self.live_btn.config(text="Go Live")
+
+    def refresh_live(self, session):
+        """Redraw from the live ring buffers at most LIVE_FPS times a second (Tk thread)"""
+        if session is not self.live_session:
+            return
+        for error in session.errors():
+            self.log_message(f"Live data error: {error}")
+
+        snapshot = session.poll()
+        if snapshot is not None:
+            with self.timer.span("ui.live_refresh"):
+                self.stock_data = snapshot["stock_data"]
+                self.vix_data = snapshot["vix_data"]
+                self.iv_data = snapshot["iv_data"]
+                results = snapshot["results"]
+                if self.vix_data is not None:
+                    self.vix_level_label.config(text=f"{self.vix_data['close'].iloc[-1]:.2f}")
+                if results is not None:
+                    self.update_ui_from_results(results)
+                    self.chart_renderer.update(
+                        self.ticker, self.earnings_date, self.stock_data, iv_data=self.iv_data,
+                        vix_data=self.vix_data, options=results["options"], keep_limits=True
+                    )
+        self.root.after(1000 // LIVE_FPS, self.refresh_live, session)
+
+    def analyze_chain(self):
+        job = self.read_analysis_inputs()
+        if job is None:
+            return
 
+        if self.chain_job is not None:
+            self.chain_job.cancel()
+        self.chain_job = job
+        self.log_message(f"Fetching the {job.ticker} option chain around {job.earnings_date:%Y-%m-%d}...")
+        threading.Thread(target=self.run_chain_job, args=(job,), daemon=True).start()
+
+    def run_chain_job(self, job):
+        """Fetch an option chain and compute its IV crush surface (worker thread)"""
         try:
-            self.ib_app.reqHistoricalData(
-                reqId=1,
-                contract=stock_contract,
-                endDateTime=end_date.strftime("%Y%m%d %H:%M:%S"),
-                durationStr="3 W",
-                barSizeSetting="1 day",
-                whatToShow="TRADES",
-                useRTH=1,
-                formatDate=1,
-                keepUpToDate=False,
-                chartOptions=[]
-            )
+            data = self.fetch_analysis_data(job)
+            if data is None or job.cancelled:
+                return
+            with self.timer.span("chain.total"):
+                table, pre_spot = run_chain_analysis(
+                    self.ib_app, self.request_scheduler, self.bar_cache, job.ticker, job.earnings_date,
+                    data[0], risk_free_rate=self.risk_free_rate, cancelled=lambda: job.cancelled
+                )
+            if job.cancelled:
+                return
+            quoted = int(table['pre_iv'].notna().sum())
+            self.log_message(f"Option chain: {len(table)} contracts, {quoted} with a pre-earnings IV")
+            self.post_to_ui(self.show_chain_surface, job, table, pre_spot)
+        except AnalysisCancelled:
+            pass
         except Exception as e:
-            self.log_message(f"Error requesting stock data: {e}")
-            messagebox.showerror("Error", f"Failed to request stock data: {e}")
-            return
+            self.log_message(f"Option chain error: {e}")
 
-        # Wait for stock data
-        timeout = 15
-        start_time = time.time()
-        while 1 not in self.ib_app.historical_data and (time.time() - start_time) < timeout:
-            time.sleep(0.1)
-
-        if 1 not in self.ib_app.historical_data:
-            self.log_message("Failed to get stock price data")
+    def show_chain_surface(self, job, table, pre_spot):
+        """Open a heatmap of the chain's IV crush (Tk thread)"""
+        grid = surface_grid(table, pre_spot)
+        if grid.empty or grid.isna().all().all():
+            self.log_message("No option quotes to build an IV crush surface from")
+            return
+        title = f"{job.ticker} IV crush surface, earnings {job.earnings_date:%Y-%m-%d}"
+        fig, ax, canvas = setup_chain_window(self, title)
+        draw_crush_surface(fig, ax, grid, spot=pre_spot, title=title)
+        fig.tight_layout()
+        canvas.draw_idle()
+
+    def show_sweep(self):
+        """Open a DTE × strike × rate sweep of the last analysed event (Tk thread)"""
+        if self.results is None:
             return
+        (pre_spot, post_spot), (pre_iv, post_iv) = self.results["spot"], self.results["iv"]
+        with self.timer.span("sweep.grid"):
+            grid = sweep_grid(pre_spot, post_spot, pre_iv, post_iv)
 
-        # Process stock data
-        stock_data = pd.DataFrame(self.ib_app.historical_data[1])
-        stock_data['date'] = pd.to_datetime(stock_data['date'])
-        stock_data.set_index('date', inplace=True)
-        self.stock_data = stock_data
-        self.log_message(f"Received {len(stock_data)} stock price data points")
+        labels = list(SWEEP_METRICS.values())
+        names = dict(zip(labels, SWEEP_METRICS))
+        title = f"{self.ticker} parameter sweep, earnings {self.earnings_date:%Y-%m-%d}"
 
-        # Query VIX data
-        self.log_message("Querying VIX data...")
-        vix_contract = self.create_vix_contract()
+        # Slider and metric moves only re-slice the grid computed above
+        def on_change():
+            heatmap.show(names[metric_var.get()], rate_var.get())
 
-        # Clear any existing VIX data for this request ID
-        if 2 in self.ib_app.historical_data:
-            del self.ib_app.historical_data[2]
+        fig, ax, canvas, rate_var, metric_var = setup_sweep_window(self, title, grid['rates'], labels, on_change)
+        heatmap = SweepHeatmap(fig, ax, canvas, grid, SWEEP_METRICS, title=f"{title}, ")
 
+    def export_report(self):
+        """Save the current analysis as a PNG, PDF or HTML report (rendered off-screen)"""
+        if self.results is None:
+            return
+        job = self.analysis_job
+        path = filedialog.asksaveasfilename(
+            defaultextension=".html",
+            initialfile=f"{job.ticker}_{job.earnings_date:%Y%m%d}",
+            filetypes=[("HTML report", "*.html"), ("PNG image", "*.png"), ("PDF document", "*.pdf")]
+        )
+        if not path:
+            return
+        base, ext = os.path.splitext(path)
+        fmt = ext.lstrip(".").lower() or "html"
+        if fmt not in REPORT_FORMATS:
+            messagebox.showerror("Error", f"Reports can be saved as {', '.join(REPORT_FORMATS)}")
+            return
+        row = result_frame(job.ticker, job.earnings_date, job.days_to_expiry, self.results).iloc[0]
         try:
-            self.ib_app.reqHistoricalData(
-                reqId=2,
-                contract=vix_contract,
-                endDateTime=end_date.strftime("%Y%m%d %H:%M:%S"),
-                durationStr="3 W",
-                barSizeSetting="1 day",
-                whatToShow="TRADES",
-                useRTH=1,
-                formatDate=1,
-                keepUpToDate=False,
-                chartOptions=[]
-            )
+            with self.timer.span("ui.export_report"):
+                render_report(row, self.stock_data, self.iv_data, self.vix_data, base, (fmt,))
+            self.log_message(f"Report saved to {base}.{fmt}")
         except Exception as e:
-            self.log_message(f"Error requesting VIX data: {e}")
-            # Continue without VIX data
-
-        # Wait for VIX data
-        start_time = time.time()
-        while 2 not in self.ib_app.historical_data and (time.time() - start_time) < timeout:
-            time.sleep(0.1)
-
-        if 2 in self.ib_app.historical_data:
-            vix_data = pd.DataFrame(self.ib_app.historical_data[2])
-            vix_data['date'] = pd.to_datetime(vix_data['date'])
-            vix_data.set_index('date', inplace=True)
-            self.vix_data = vix_data
-            self.log_message(f"Received {len(vix_data)} VIX data points")
+            self.log_message(f"Report export error: {e}")
+
+    def load_earnings_calendar(self):
+        """Load a CSV/JSON earnings calendar and start prefetching its events"""
+        path = filedialog.askopenfilename(filetypes=[("Earnings calendar", "*.csv *.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            days_to_expiry = int(self.days_to_expiry_var.get())
+        except ValueError:
+            days_to_expiry = 30
+        try:
+            calendar = load_calendar(path, days_to_expiry)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not load the calendar: {e}")
+            return
+
+        self.calendar = calendar
+        self.fill_earnings_date()
+        if self.calendar_scheduler is None:
+            self.calendar_scheduler = EarningsCalendarScheduler(
+                self.request_scheduler, self.bar_cache, self.intraday_store, self.pre_event_store, calendar,
+                self.risk_free_rate, bar_size=self.intraday_bar_size_var.get(), post_time=self.post_time_var.get(),
+                timer=self.timer, log=self.log_message
+            )
+            threading.Thread(target=self.calendar_scheduler.watch, args=(self.calendar_stop, self.on_calendar_results),
+                             daemon=True).start()
         else:
-            self.log_message("VIX data not available")
-            self.vix_data = None
+            self.calendar_scheduler.calendar = calendar
+        self.log_message(f"Loaded {len(calendar)} earnings events from {os.path.basename(path)}; "
+                         f"upcoming ones are prefetched off-hours while connected")
 
-        # Query IV data for the stock
-        self.log_message(f"Querying implied volatility data for {self.ticker}...")
+    def fill_earnings_date(self, *args):
+        """Set the earnings date to the ticker's next calendar event, if it has one"""
+        if self.calendar is None:
+            return
+        date = next_event(self.calendar, self.ticker_var.get())
+        if date is not None:
+            self.earnings_date_var.set(f"{date:%Y-%m-%d}")
+
+    def on_calendar_results(self, results):
+        """Events finished by the calendar scheduler (its thread)"""
+        self.results_store.append(results, source="calendar", risk_free_rate=self.risk_free_rate)
+        for row in results.itertuples():
+            self.log_message(f"{row.ticker} {row.earnings_date:%Y-%m-%d}: IV crush {row.iv_crush_pct:.1f}%, "
+                             f"straddle ${row.pre_straddle:.2f} → ${row.post_straddle:.2f}")
+
+    def run_analysis_job(self, job):
+        """Fetch → analyze stages of an analysis (worker thread)"""
+        try:
+            data = self.fetch_analysis_data(job)
+            if data is None or job.cancelled:
+                return
 
-        # Clear any existing IV data for this request ID
-        if 3 in self.ib_app.historical_data:
-            del self.ib_app.historical_data[3]
+            self.log_message("Performing IV crush analysis...")
+            stock_data, vix_data, iv_data = data
+            with self.timer.span("analysis.run_iv_crush"):
+                results = run_iv_crush_analysis(
+                    stock_data=stock_data,
+                    iv_data=iv_data,
+                    vix_data=vix_data,
+                    earnings_date=job.earnings_date,
+                    days_to_expiry=job.days_to_expiry,
+                    risk_free_rate=self.risk_free_rate,
+                    pre_time=job.pre_time,
+                    post_time=job.post_time,
+                    intraday=job.intraday is not None
+                )
+            if job.cancelled:
+                return
 
+            simulation = None
+            if job.monte_carlo:
+                with self.timer.span("analysis.monte_carlo"):
+                    # Blend the implied move with the ticker's past earnings gaps
+                    pre_iv, post_iv = results["iv"]
+                    gaps = self.earnings_history.log_gaps(job.ticker, before=job.earnings_date)
+                    gap_std, gap_df = calibrate_gap(event_move_std(pre_iv, post_iv, job.days_to_expiry), gaps)
+                    simulation = simulate_straddle_pnl(
+                        results["spot"][0], pre_iv, post_iv, job.days_to_expiry, self.risk_free_rate,
+                        gap_std=gap_std, gap_df=gap_df
+                    )
+                self.log_message(
+                    f"Monte Carlo: {simulation['n_paths']:,} paths, event move σ = {simulation['gap_std']:.1%}, "
+                    f"t df = {simulation['gap_df']:.1f} ({len(gaps)} past gaps)")
+                if job.cancelled:
+                    return
+
+            history = self.store_results(job, stock_data, results)
+            self.post_to_ui(self.render_analysis, job, data, results, simulation, history)
+        except AnalysisCancelled:
+            pass
+        except Exception as e:
+            self.log_message(f"Analysis error: {e}")
+
+    def store_results(self, job, stock_data, results):
+        """
+        Append the run to the results store and the earnings history, and look
+        up the ticker's history before this event (worker thread)
+        """
+        post_open = session_open(stock_data, results["dates"][1])
+        row = result_frame(job.ticker, job.earnings_date, job.days_to_expiry, results, post_open)
         try:
-            self.ib_app.reqHistoricalData(
-                reqId=3,
-                contract=stock_contract,
-                endDateTime=end_date.strftime("%Y%m%d %H:%M:%S"),
-                durationStr="3 W",
-                barSizeSetting="1 day",
-                whatToShow="OPTION_IMPLIED_VOLATILITY",
-                useRTH=1,
-                formatDate=1,
-                keepUpToDate=False,
-                chartOptions=[]
-            )
+            with self.timer.span("analysis.store"):
+                self.results_store.append(row, source="dashboard", risk_free_rate=self.risk_free_rate)
+        except Exception as e:
+            self.log_message(f"Results store error: {e}")
+
+        try:
+            with self.timer.span("analysis.history"):
+                self.earnings_history.add_events(row)
+                implied, realized = event_moves(results["spot"][0], post_open, results["options"]["pre_straddle"])
+                return self.earnings_history.summary(job.ticker, job.earnings_date, implied, realized,
+                                                     results["iv_crush_pct"])
         except Exception as e:
-            self.log_message(f"Error requesting IV data: {e}")
-            # Continue without direct IV data
-
-        # Wait for IV data
-        start_time = time.time()
-        while 3 not in self.ib_app.historical_data and (time.time() - start_time) < timeout:
-            time.sleep(0.1)
-
-        if 3 in self.ib_app.historical_data:
-            iv_data = pd.DataFrame(self.ib_app.historical_data[3])
-            iv_data['date'] = pd.to_datetime(iv_data['date'])
-            iv_data.set_index('date', inplace=True)
-
-            # Scale IV data properly once here - IB provides DAILY IV that needs annualization
-            raw_iv = iv_data['close']
-
-            # Convert to decimal if in percentage form, then annualize with √252
-            if raw_iv.max() > 5:
-                # Data is in percentage form (e.g., 2.5 for 2.5% daily), convert to decimal then annualize
-                daily_iv_decimal = raw_iv / 100.0  # Convert to decimal (0.025 for 2.5%)
-                iv_data['implied_vol'] = daily_iv_decimal  # * np.sqrt(252)  # Annualize with √252
+            self.log_message(f"Earnings history error: {e}")
+            return None
+
+    def fetch_analysis_data(self, job):
+        """Fetch stock, VIX and IV bars for a job (worker thread)"""
+        # Serve each series from the local bar cache, sending the stock, VIX and IV
+        # requests for any missing days together so IB handles them concurrently
+        self.log_message(f"Querying stock price, VIX and implied volatility data for {job.ticker}...")
+        if job.intraday:
+            # Intraday bars live in the memory-mapped store, one folder per day
+            handles = request_intraday_event_bars(self.request_scheduler, self.intraday_store, job.ticker,
+                                                  job.earnings_date, job.intraday, timer=self.timer,
+                                                  priority=INTERACTIVE)
+        else:
+            handles = request_event_bars(self.request_scheduler, self.bar_cache, job.ticker, job.earnings_date,
+                                         timer=self.timer, priority=INTERACTIVE)
+
+        for series, handle in list(handles.items()):
+            if isinstance(handle, Exception):
+                self.log_message(f"Error requesting {EVENT_SERIES[series][1]} data: {handle}")
+                if series == "stock":
+                    self.post_to_ui(messagebox.showerror, "Error", f"Failed to request stock data: {handle}")
+                    return None
+                # Continue without this data
+                del handles[series]
+
+        # Wait for completion (historicalDataEnd or error), sharing one deadline
+        timeout = BAR_TIMEOUT
+        if job.intraday:
+            pacing = self.request_scheduler.pacing_wait(INTERACTIVE)
+            timeout = INTRADAY_BAR_TIMEOUT + pacing
+            if pacing > PACING_WARNING:
+                self.log_message(f"IB paces {job.intraday} bar requests: fetching these days takes about "
+                                 f"{pacing / 60:.0f} min. Bars are stored as they arrive, so a cancelled "
+                                 f"or timed-out analysis doesn't have to fetch them again.")
+        deadline = time.time() + timeout
+
+        stock_data = self.wait_for_bars(job, handles["stock"], deadline, "stock price")
+        if stock_data is None:
+            self.log_message("Failed to get stock price data")
+            return None
+        self.log_message(f"Received {len(stock_data)} stock price data points")
+
+        vix_data = self.wait_for_bars(job, handles.get("vix"), deadline, "VIX")
+        if vix_data is not None:
+            self.log_message(f"Received {len(vix_data)} VIX data points")
+        else:
+            self.log_message("VIX data not available")
+
+        iv_data = self.wait_for_bars(job, handles.get("iv"), deadline, "implied volatility")
+        if iv_data is not None:
+            with self.timer.span("iv.normalize"):
+                in_percent = normalize_iv_data(iv_data)
+            if in_percent:
                 self.log_message(
                     f"Received {len(iv_data)} IV data points - converted from daily % to annualized decimal")
             else:
-                # Data is in decimal form (e.g., 0.025 for 2.5% daily), annualize directly
-                iv_data['implied_vol'] = raw_iv  # * np.sqrt(252)  # Annualize with √252
                 self.log_message(f"Received {len(iv_data)} IV data points - annualized daily decimal with √252")
 
-            self.iv_data = iv_data
             annualization_factor = 1  # np.sqrt(252)
             self.log_message(f"Applied √252 = {annualization_factor:.2f} annualization factor")
             self.log_message(
                 f"Annualized IV range: {iv_data['implied_vol'].min():.3f} - {iv_data['implied_vol'].max():.3f} (decimal)")
         else:
             self.log_message("Implied volatility data not available - will estimate from VIX")
-            self.iv_data = None
 
-        # Perform IV crush analysis
-        self.perform_iv_crush_analysis()
-
-    def perform_iv_crush_analysis(self):
-        self.log_message("Performing IV crush analysis...")
+        return stock_data, vix_data, iv_data
 
+    def wait_for_bars(self, job, handle, deadline, name):
+        """Block until a cached bar request completes and return its bars as a DataFrame"""
+        if handle is None:
+            return None
         try:
-            days_to_expiry = int(self.days_to_expiry_var.get())
-        except ValueError:
-            days_to_expiry = 30
-            self.days_to_expiry_var.set("30")
+            # Wait in short slices so a cancelled job stops promptly
+            while True:
+                if job.cancelled:
+                    raise AnalysisCancelled()
+                remaining = deadline - time.time()
+                try:
+                    data = handle.result(timeout=max(min(remaining, 0.1), 0))
+                    break
+                except FutureTimeoutError:
+                    if remaining <= 0.1:
+                        raise
+        except FutureTimeoutError:
+            self.log_message(f"Timed out waiting for {name} data")
+            return None
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            self.log_message(f"Error receiving {name} data: {e}")
+            return None
 
-        results = run_iv_crush_analysis(
-            stock_data=self.stock_data,
-            iv_data=self.iv_data,
-            vix_data=self.vix_data,
-            earnings_date=self.earnings_date,
-            days_to_expiry=days_to_expiry,
-            risk_free_rate=self.risk_free_rate
+        if data.empty:
+            return None
+        return data
+
+    def render_analysis(self, job, data, results, simulation=None, history=None):
+        """Render stage of an analysis (Tk thread)"""
+        if job is not self.analysis_job or job.cancelled:
+            return
+
+        self.ticker = job.ticker
+        self.earnings_date = job.earnings_date
+        self.stock_data, self.vix_data, self.iv_data = data
+        self.results = results
+        self.sweep_btn.config(state="normal")
+        self.report_btn.config(state="normal")
+
+        with self.timer.span("ui.labels"):
+            self.update_ui_from_results(results)
+            if simulation is not None:
+                self.update_simulation_labels(simulation)
+            self.update_history_labels(history)
+        with self.timer.span("ui.charts"):
+            self.create_visualizations(results)
+        self.timer.record_since("analysis.total", job.started)
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        """Show the latest stage timings in the diagnostics panel"""
+        self.diagnostics_tree.delete(*self.diagnostics_tree.get_children())
+        for row in self.timer.summary():
+            self.diagnostics_tree.insert("", tk.END, values=(
+                row["stage"], row["count"],
+                f"{row['p50_ms']:.1f}", f"{row['p95_ms']:.1f}", f"{row['p99_ms']:.1f}"
+            ))
+
+    def export_diagnostics(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON", "*.json")],
+            initialfile="stage_timings.csv"
         )
+        if not path:
+            return
+        try:
+            self.timer.export(path)
+            self.log_message(f"Stage timings exported to {path}")
+        except Exception as e:
+            self.log_message(f"Export error: {e}")
 
-        self.update_ui_from_results(results)
-        self.create_visualizations()
+    def toggle_profiling(self):
+        if self.profile_var.get():
+            self.timer.enable_profiling(PROFILE_DIR)
+            self.log_message(f"Profiling stages to {PROFILE_DIR}")
+        else:
+            self.timer.disable_profiling()
+            self.log_message("Profiling off")
 
     def update_ui_from_results(self, r):
         pre_spot, post_spot = r["spot"]
@@ -484,6 +776,20 @@ class EarningsTradingDashboard:
         self.current_iv_label.config(text=f"{post_iv:.1%}")
         self.iv_crush_label.config(text=f"-{r['iv_crush_pct']:.1f}%")
 
+        self.strike_price_label.config(text=f"${pre_spot:.2f}")
+        self.pre_spot_label.config(text=f"${pre_spot:.2f}")
+        self.post_spot_label.config(text=f"${post_spot:.2f}")
+
+        for key in ("call", "put"):
+            pre = r["options"][f"pre_{key}"]
+            post = r["options"][f"post_{key}"]
+            getattr(self, f"pre_{key}_label").config(text=f"${pre:.2f}")
+            getattr(self, f"post_{key}_label").config(text=f"${post:.2f}")
+            getattr(self, f"{key}_loss_label").config(
+                text=f"{post - pre:+.2f}",
+                foreground="green" if post > pre else "red"
+            )
+
         pre = r["options"]["pre_straddle"]
         post = r["options"]["post_straddle"]
         change = post - pre
@@ -494,6 +800,8 @@ class EarningsTradingDashboard:
             text=f"{change:+.2f}",
             foreground="green" if change > 0 else "red"
         )
+        self.long_pnl_label.config(text=f"{change:+.2f}", foreground="green" if change > 0 else "red")
+        self.short_pnl_label.config(text=f"{-change:+.2f}", foreground="green" if change < 0 else "red")
 
         self.pre_delta_label.config(text=f"{r['greeks']['pre_delta']:.3f}")
         self.post_delta_label.config(text=f"{r['greeks']['post_delta']:.3f}")
@@ -507,125 +815,49 @@ class EarningsTradingDashboard:
             text=f"{r['greeks']['post_vega'] - r['greeks']['pre_vega']:+.2f}"
         )
 
-    def create_visualizations(self):
-        """Create visualizations for the IV crush analysis"""
-        # Clear all axes including any twin axes
-        self.ax1.clear()
-        self.ax2.clear()
+    def update_simulation_labels(self, simulation):
+        for side in ("long", "short"):
+            summary = simulation[side]
+            values = {
+                "median": summary["quantiles"][0.5],
+                "p05": summary["quantiles"][0.05],
+                "p95": summary["quantiles"][0.95],
+                "es05": summary["expected_shortfall"][0.05],
+            }
+            win = summary["win_probability"]
+            getattr(self, f"mc_{side}_win_label").config(
+                text=f"{win:.1%}", foreground="green" if win > 0.5 else "red")
+            for field, value in values.items():
+                getattr(self, f"mc_{side}_{field}_label").config(
+                    text=f"{value:+.2f}", foreground="green" if value > 0 else "red")
+
+    def update_history_labels(self, history):
+        if history is None:
+            for prefix, fields in (("all", "implied realized crush hit"), ("rolling", "implied realized crush hit"),
+                                   ("rank", "implied realized crush")):
+                for field in fields.split():
+                    getattr(self, f"hist_{prefix}_{field}_label").config(text="N/A", foreground="black")
+            self.hist_events_label.config(text="No history")
+            return
 
-        # Remove any existing twin axes
-        if self.ax1_twin is not None:
-            try:
-                self.ax1_twin.remove()
-            except:
-                pass
-            self.ax1_twin = None
-
-        # Plot 1: Stock price and IV around earnings
-        earnings_window = pd.date_range(start=self.earnings_date - timedelta(days=5),
-                                        end=self.earnings_date + timedelta(days=5), freq='D')
-
-        # Filter stock data for the window
-        window_stock = self.stock_data[
-            (self.stock_data.index >= self.earnings_date - timedelta(days=5)) &
-            (self.stock_data.index <= self.earnings_date + timedelta(days=5))
-            ]
-
-        # Plot stock price
-        self.ax1.plot(window_stock.index, window_stock['close'], 'b-', linewidth=2, label='Stock Price')
-        self.ax1.axvline(x=self.earnings_date, color='red', linestyle='--', alpha=0.7, label='Earnings Date')
-        self.ax1.set_xlabel('Date')
-        self.ax1.set_ylabel('Stock Price ($)', color='blue')
-        self.ax1.tick_params(axis='y', labelcolor='blue')
-        self.ax1.set_title(f'{self.ticker} Stock Price Around Earnings')
-        self.ax1.grid(True, alpha=0.3)
-        self.ax1.legend(loc='upper left')
-
-        # Plot IV if available
-        if self.iv_data is not None and len(self.iv_data) > 0:
-            window_iv = self.iv_data[
-                (self.iv_data.index >= self.earnings_date - timedelta(days=5)) &
-                (self.iv_data.index <= self.earnings_date + timedelta(days=5))
-                ]
-
-            if len(window_iv) > 0:
-                self.ax1_twin = self.ax1.twinx()
-                # Convert decimal IV to percentage for display (data is already properly scaled and annualized)
-                iv_percentage = window_iv['implied_vol'] * 100
-
-                self.ax1_twin.plot(window_iv.index, iv_percentage, 'g-', linewidth=2,
-                                   label=f'Implied Volatility (% annualized √252={np.sqrt(252):.1f})')
-                self.ax1_twin.set_ylabel('Implied Volatility (% annualized)', color='green')
-                self.ax1_twin.tick_params(axis='y', labelcolor='green')
-                self.ax1_twin.legend(loc='upper right')
-
-        # Plot 2: VIX around earnings (if available)
-        if self.vix_data is not None:
-            window_vix = self.vix_data[
-                (self.vix_data.index >= self.earnings_date - timedelta(days=5)) &
-                (self.vix_data.index <= self.earnings_date + timedelta(days=5))
-                ]
-
-            self.ax2.plot(window_vix.index, window_vix['close'], 'purple', linewidth=2, label='VIX')
-            self.ax2.axvline(x=self.earnings_date, color='red', linestyle='--', alpha=0.7, label='Earnings Date')
-            self.ax2.set_xlabel('Date')
-            self.ax2.set_ylabel('VIX Level')
-            self.ax2.set_title('VIX Around Earnings Date')
-            self.ax2.grid(True, alpha=0.3)
-            self.ax2.legend()
-        else:
-            # If no VIX data, show straddle price comparison
-            option_types = ['Call', 'Put', 'Straddle']
-            pre_prices = [float(self.pre_call_label.cget('text').replace('$', '')),
-                          float(self.pre_put_label.cget('text').replace('$', '')),
-                          float(self.pre_straddle_label.cget('text').replace('$', ''))]
-            post_prices = [float(self.post_call_label.cget('text').replace('$', '')),
-                           float(self.post_put_label.cget('text').replace('$', '')),
-                           float(self.post_straddle_label.cget('text').replace('$', ''))]
-
-            x = np.arange(len(option_types))
-            width = 0.35
-
-            # Use different colors for straddle
-            colors_pre = ['lightblue', 'lightgreen', 'blue']
-            colors_post = ['lightcoral', 'lightpink', 'red']
-
-            bars1 = self.ax2.bar(x - width / 2, pre_prices, width, label='Pre-Earnings (High IV)',
-                                 color=colors_pre, alpha=0.8)
-            bars2 = self.ax2.bar(x + width / 2, post_prices, width, label='Post-Earnings (Low IV)',
-                                 color=colors_post, alpha=0.8)
-
-            # Add value labels on bars
-            for i, (bar1, bar2) in enumerate(zip(bars1, bars2)):
-                height1 = bar1.get_height()
-                height2 = bar2.get_height()
-                self.ax2.text(bar1.get_x() + bar1.get_width() / 2., height1 + 0.5,
-                              f'${height1:.1f}', ha='center', va='bottom', fontsize=9)
-                self.ax2.text(bar2.get_x() + bar2.get_width() / 2., height2 + 0.5,
-                              f'${height2:.1f}', ha='center', va='bottom', fontsize=9)
-
-            self.ax2.set_xlabel('Option Strategy')
-            self.ax2.set_ylabel('Option Price ($)')
-            self.ax2.set_title('ATM Options & Straddle: IV Crush Impact')
-            self.ax2.set_xticks(x)
-            self.ax2.set_xticklabels(option_types)
-            self.ax2.legend()
-            self.ax2.grid(True, alpha=0.3)
-
-            #Add a text box showing the IV crush impact
-            straddle_loss_text = self.straddle_loss_label.cget('text')
-            self.ax2.text(0.02, 0.98, f'Straddle Loss: {straddle_loss_text}',
-                         transform=self.ax2.transAxes, fontsize=12, fontweight='bold',
-                         verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
-
-        #Format dates on x-axis
-        self.ax1.tick_params(axis='x', rotation=45)
-        if self.vix_data is not None:
-            self.ax2.tick_params(axis='x', rotation=45)
-
-        #Update canvas
-        self.fig.tight_layout()
-        self.canvas.draw()
+        for prefix, stat in (("all", "mean"), ("rolling", "rolling")):
+            getattr(self, f"hist_{prefix}_implied_label").config(text=f"{history[f'{stat}_implied_move']:.1%}")
+            getattr(self, f"hist_{prefix}_realized_label").config(text=f"{history[f'{stat}_realized_move']:.1%}")
+            getattr(self, f"hist_{prefix}_crush_label").config(text=f"-{history[f'{stat}_crush_pct']:.1f}%")
+            hit = history['hit_rate' if prefix == "all" else 'rolling_hit_rate']
+            getattr(self, f"hist_{prefix}_hit_label").config(
+                text=f"{hit:.0%}", foreground="green" if hit > 0.5 else "red")
+        for field, column in (("implied", "implied_move"), ("realized", "realized_move"), ("crush", "iv_crush_pct")):
+            getattr(self, f"hist_rank_{field}_label").config(text=f"{history[f'{column}_rank']:.0f}")
+        self.hist_events_label.config(
+            text=f"{history['n_events']} past events, last {history['earnings_date']:%Y-%m-%d}")
+
+    def create_visualizations(self, results):
+        """Update the IV crush charts for the current analysis"""
+        self.chart_renderer.update(
+            self.ticker, self.earnings_date, self.stock_data,
+            iv_data=self.iv_data, vix_data=self.vix_data, options=results["options"]
+        )
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from ibapi.contract import Contract
+
+from bar_cache import request_cached_bars
+
+# Series fetched for each earnings event: name -> (whatToShow, description)
+EVENT_SERIES = {
+    "stock": ("TRADES", "stock price"),
+    "vix": ("TRADES", "VIX"),
+    "iv": ("OPTION_IMPLIED_VOLATILITY", "implied volatility"),
+}
+
+
+def create_equity_contract(symbol):
+    """Create an equity contract for the given symbol"""
+    contract = Contract()
+    contract.symbol = symbol.upper()
+    contract.secType = "STK"
+    contract.exchange = "SMART"
+    contract.currency = "USD"
+    return contract
+
+
+def create_vix_contract():
+    """Create a VIX contract"""
+    contract = Contract()
+    contract.symbol = "VIX"
+    contract.secType = "IND"
+    contract.exchange = "CBOE"
+    contract.currency = "USD"
+    return contract
+
+
+def event_window(earnings_date):
+    """
+    Bar window fetched around an earnings date
+
+    Ends 10 days after earnings and spans 3 weeks, matching the original
+    "3 W" request ending at earnings + 10 days.
+    """
+    end_date = earnings_date + timedelta(days=10)
+    return end_date - timedelta(weeks=3), end_date
+
+
+def series_contract(series, ticker):
+    return create_vix_contract() if series == "vix" else create_equity_contract(ticker)
+
+
+def request_event_bars(scheduler, cache, ticker, earnings_date, timer=None, **submit_kwargs):
+    """
+    Request the stock, VIX and IV bars for one earnings event
+
+    Returns a dict of series name -> CachedBarRequest. Series whose request
+    could not be sent map to the exception that was raised instead. timer
+    is an optional StageTimer passed on to each handle.
+    """
+    start, end = event_window(earnings_date)
+    handles = {}
+    for series, (what_to_show, _) in EVENT_SERIES.items():
+        try:
+            handles[series] = request_cached_bars(
+                scheduler, cache, series_contract(series, ticker), what_to_show, start, end,
+                timer=timer, **submit_kwargs
+            )
+        except Exception as e:
+            handles[series] = e
+    return handles
+
+
+def normalize_iv_data(iv_data):
+    """
+    Add the implied_vol column (decimal) to OPTION_IMPLIED_VOLATILITY bars
+
+    Returns True if the raw closes were in percentage form and were scaled.
+    """
+    # Scale IV data properly once here - IB provides DAILY IV that needs annualization
+    raw_iv = iv_data['close']
+
+    # Convert to decimal if in percentage form, then annualize with √252
+    if raw_iv.max() > 5:
+        # Data is in percentage form (e.g., 2.5 for 2.5% daily), convert to decimal then annualize
+        daily_iv_decimal = raw_iv / 100.0  # Convert to decimal (0.025 for 2.5%)
+        iv_data['implied_vol'] = daily_iv_decimal  # * np.sqrt(252)  # Annualize with √252
+        return True
+
+    # Data is in decimal form (e.g., 0.025 for 2.5% daily), annualize directly
+    iv_data['implied_vol'] = raw_iv  # * np.sqrt(252)  # Annualize with √252
+    return False
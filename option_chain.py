@@ -0,0 +1,316 @@
+import math
+import time
+
+import numpy as np
+import pandas as pd
+from ibapi.contract import Contract
+
+from bar_cache import request_cached_bars
+from market_data import create_equity_contract, event_window
+from option_math import black_scholes_greeks, implied_volatility
+from iv_analysis import _as_ns, _series_at
+from request_scheduler import BACKGROUND, MAX_IN_FLIGHT
+
+# Columns of the per-contract frame returned by crush_surface
+CHAIN_RESULT_COLUMNS = [
+    'expiry', 'strike', 'right',
+    'pre_price', 'post_price', 'pre_iv', 'post_iv', 'iv_crush_pct',
+    'pre_delta', 'post_delta', 'pre_vega', 'post_vega', 'price_change_pct',
+]
+
+# Bars requested for every option contract
+OPTION_WHAT_TO_SHOW = "MIDPOINT"
+
+# Below this vega (price change per vol point) a one-cent quote can't pin down IV
+MIN_VEGA = 0.01
+
+# Contracts requested per event by default: four rounds of the scheduler's
+# in-flight cap, one daily-bar request each
+MAX_CHAIN_CONTRACTS = 200
+
+# Seconds allowed per round of in-flight quote requests
+QUOTE_ROUND_TIMEOUT = 30
+
+# How often a quote wait checks whether the caller has given up
+CANCEL_POLL = 0.5
+
+
+def request_underlying_con_id(app, scheduler, symbol, timeout=10):
+    """Look up the conId of a stock via reqContractDetails"""
+    details = app.request_contract_details(scheduler.next_req_id(), create_equity_contract(symbol))
+    details = details.result(timeout=timeout)
+    if not details:
+        raise LookupError(f"No contract details for {symbol}")
+    return details[0].contract.conId
+
+
+def request_option_params(app, scheduler, symbol, con_id, timeout=10):
+    """
+    Expirations and strikes listed for an underlying (reqSecDefOptParams)
+
+    Returns the SMART entry if there is one, otherwise the entry with the
+    most strikes: a dict with tradingClass, multiplier, expirations and
+    strikes.
+    """
+    params = app.request_option_params(scheduler.next_req_id(), symbol, con_id)
+    params = params.result(timeout=timeout)
+    if not params:
+        raise LookupError(f"No option parameters for {symbol}")
+    for entry in params:
+        if entry["exchange"] == "SMART":
+            return entry
+    return max(params, key=lambda entry: len(entry["strikes"]))
+
+
+def select_chain(expirations, strikes, spot, after, moneyness=0.25, max_expiries=4,
+                 max_contracts=MAX_CHAIN_CONTRACTS, otm_only=True):
+    """
+    Contracts to analyze for one event
+
+    Parameters:
+    expirations: "YYYYMMDD" strings from reqSecDefOptParams
+    strikes: Listed strikes
+    spot: Underlying price the moneyness band is centred on
+    after: Only expiries after this date are kept, so every contract is
+           still listed on the post-event day
+    moneyness: Keep strikes within spot * (1 ± moneyness)
+    max_expiries: Nearest expiries kept
+    max_contracts: Cap on the contracts returned; each expiry keeps its
+                   strikes nearest spot. None for no cap.
+    otm_only: Only the out-of-the-money side of each strike (puts below
+              spot, calls at or above), the side surface_grid uses
+
+    Returns a DataFrame with expiry (Timestamp), strike and right ('C'/'P')
+    columns, one row per contract.
+    """
+    expiries = pd.to_datetime(pd.Series(sorted(expirations)), format="%Y%m%d")
+    expiries = expiries[expiries > pd.Timestamp(after)].iloc[:max_expiries].to_numpy()
+
+    strikes = np.asarray(sorted(strikes), dtype=np.float64)
+    strikes = strikes[np.abs(strikes / spot - 1) <= moneyness]
+
+    rights = 1 if otm_only else 2
+    if max_contracts is not None and len(expiries) * len(strikes) * rights > max_contracts:
+        per_expiry = max(max_contracts // (max(len(expiries), 1) * rights), 1)
+        strikes = np.sort(strikes[np.argsort(np.abs(strikes - spot), kind='stable')[:per_expiry]])
+
+    expiry, strike, right = (
+        x.ravel() for x in np.meshgrid(expiries, strikes, np.array(['C', 'P']), indexing='ij')
+    )
+    chain = pd.DataFrame({'expiry': expiry, 'strike': strike, 'right': right})
+    if otm_only:
+        chain = chain[chain['right'].to_numpy() == np.where(strike < spot, 'P', 'C')].reset_index(drop=True)
+    return chain
+
+
+def option_contract(symbol, expiry, strike, right, trading_class="", multiplier="100"):
+    contract = Contract()
+    contract.symbol = symbol.upper()
+    contract.secType = "OPT"
+    contract.exchange = "SMART"
+    contract.currency = "USD"
+    contract.lastTradeDateOrContractMonth = pd.Timestamp(expiry).strftime("%Y%m%d")
+    contract.strike = float(strike)
+    contract.right = right
+    contract.tradingClass = trading_class
+    contract.multiplier = str(multiplier)
+    return contract
+
+
+def request_chain_quotes(scheduler, cache, symbol, chain, earnings_date, trading_class="",
+                         multiplier="100", **submit_kwargs):
+    """
+    Request daily MIDPOINT bars for every contract in a chain
+
+    All requests are queued at once; the HistoricalRequestScheduler keeps up
+    to its in-flight limit outstanding and paces the rest, and contracts
+    already in the bar cache for the event window are not requested again.
+
+    Returns one handle (or the exception raised when submitting) per row of
+    chain, in order.
+    """
+    start, end = event_window(earnings_date)
+    handles = []
+    for expiry, strike, right in zip(chain['expiry'], chain['strike'], chain['right']):
+        contract = option_contract(symbol, expiry, strike, right, trading_class, multiplier)
+        try:
+            handles.append(request_cached_bars(scheduler, cache, contract, OPTION_WHAT_TO_SHOW,
+                                               start, end, **submit_kwargs))
+        except Exception as e:
+            handles.append(e)
+    return handles
+
+
+def quote_timeout(handles, max_in_flight=MAX_IN_FLIGHT):
+    """Seconds to allow for a chain's quote requests: QUOTE_ROUND_TIMEOUT per in-flight round"""
+    requests = sum(1 for h in handles if not isinstance(h, Exception) and h.future is not None)
+    return QUOTE_ROUND_TIMEOUT * max(math.ceil(requests / max_in_flight), 1)
+
+
+def cancel_chain_quotes(scheduler, handles):
+    """Drop the quote requests of handles that are still queued"""
+    return scheduler.cancel(h.future for h in handles if not isinstance(h, Exception) and h.future is not None)
+
+
+def collect_chain_quotes(handles, pre_date, post_date, timeout=60, cancelled=None):
+    """
+    Pre- and post-event closes for each contract
+
+    Waits for every handle under one shared deadline, or until cancelled()
+    returns True; after that only quotes already in are read. Contracts
+    that failed, timed out or have no bar on the day come back as NaN.
+
+    Returns (pre_price, post_price) arrays aligned with handles.
+    """
+    dates = _as_ns([pre_date, post_date])
+    pre_price = np.full(len(handles), np.nan)
+    post_price = np.full(len(handles), np.nan)
+    deadline = time.time() + timeout
+
+    for i, handle in enumerate(handles):
+        if isinstance(handle, Exception):
+            continue
+        data = None
+        while data is None:
+            wait = 0 if cancelled is not None and cancelled() else max(deadline - time.time(), 0)
+            try:
+                data = handle.result(timeout=min(wait, CANCEL_POLL))
+            except TimeoutError:
+                if wait <= CANCEL_POLL:
+                    break
+            except Exception:
+                break
+        if data is None or data.empty:
+            continue
+        index = _as_ns(data.index)
+        close = data['close'].to_numpy(dtype=np.float64)
+        pre_price[i] = _series_at(index, close, dates[:1], 'before')[0]
+        post_price[i] = _series_at(index, close, dates[1:], 'after')[0]
+    return pre_price, post_price
+
+
+def crush_surface(chain, pre_price, post_price, pre_spot, post_spot, pre_date, post_date,
+                  risk_free_rate=0.05, min_vega=MIN_VEGA):
+    """
+    Implied volatility crush for every contract in a chain
+
+    Pre and post quotes are inverted together in one implied_volatility call
+    (2n elements) and the Greeks at the implied vols come from one
+    black_scholes_greeks call. Time to expiry is counted in calendar days
+    from the pre/post quote dates.
+
+    Parameters:
+    chain: select_chain() frame
+    pre_price, post_price: Option closes on pre_date and post_date
+    pre_spot, post_spot: Underlying closes on the same days
+    pre_date, post_date: Quote dates
+    risk_free_rate: Risk-free rate (annualized)
+    min_vega: Contracts with a smaller vega (deep in or out of the money) are
+              too insensitive to volatility for a meaningful IV
+
+    Returns a DataFrame with CHAIN_RESULT_COLUMNS, one row per contract.
+    IVs and Greeks are NaN where a quote is missing, violates no-arbitrage
+    bounds or falls under min_vega.
+    """
+    n = len(chain)
+    expiry = _as_ns(chain['expiry'])
+    strike = chain['strike'].to_numpy(dtype=np.float64)
+    is_call = chain['right'].to_numpy() == 'C'
+
+    day = np.timedelta64(1, 'D')
+    T = np.concatenate([
+        (expiry - _as_ns([pre_date])[0]) / day,
+        (expiry - _as_ns([post_date])[0]) / day,
+    ]) / 365.0
+    S = np.repeat([pre_spot, post_spot], n)
+    K = np.tile(strike, 2)
+    option_type = np.where(np.tile(is_call, 2), 'call', 'put')
+    price = np.concatenate([pre_price, post_price])
+
+    iv, _ = implied_volatility(price, S, K, T, risk_free_rate, option_type)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        g = black_scholes_greeks(S, K, T, risk_free_rate, iv)
+    vega = g['vega']
+    with np.errstate(invalid='ignore'):
+        unreliable = vega < min_vega
+    iv[unreliable] = np.nan
+    vega[unreliable] = np.nan
+    delta = np.where(np.tile(is_call, 2), g['call_delta'], g['put_delta'])
+    delta[unreliable] = np.nan
+
+    pre_iv, post_iv = iv[:n], iv[n:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        crush = (pre_iv - post_iv) / pre_iv * 100
+        price_change = (post_price - pre_price) / pre_price * 100
+
+    return pd.DataFrame({
+        'expiry': chain['expiry'].to_numpy(),
+        'strike': strike,
+        'right': chain['right'].to_numpy(),
+        'pre_price': pre_price,
+        'post_price': post_price,
+        'pre_iv': pre_iv,
+        'post_iv': post_iv,
+        'iv_crush_pct': crush,
+        'pre_delta': delta[:n],
+        'post_delta': delta[n:],
+        'pre_vega': vega[:n],
+        'post_vega': vega[n:],
+        'price_change_pct': price_change,
+    })
+
+
+def surface_grid(table, spot, value='iv_crush_pct'):
+    """
+    Strike × expiry grid of one column of a crush_surface table
+
+    Each strike uses its out-of-the-money side (puts below spot, calls at or
+    above), where quotes are the most liquid.
+    """
+    otm = np.where(table['strike'] < spot, 'P', 'C')
+    rows = table[table['right'].to_numpy() == otm]
+    return rows.pivot_table(index='strike', columns='expiry', values=value, aggfunc='mean')
+
+
+def run_chain_analysis(app, scheduler, cache, symbol, earnings_date, stock_data,
+                       risk_free_rate=0.05, moneyness=0.25, max_expiries=4, max_contracts=MAX_CHAIN_CONTRACTS,
+                       timeout=None, cancelled=None, priority=BACKGROUND):
+    """
+    Fetch an event's option chain and compute its IV crush surface
+
+    Parameters:
+    app, scheduler, cache: Connected IBApp, its HistoricalRequestScheduler and the BarCache
+    symbol, earnings_date: The event
+    stock_data: Underlying daily bars covering the event (for dates and spots)
+    risk_free_rate: Risk-free rate (annualized)
+    moneyness, max_expiries, max_contracts: Chain selection, see select_chain
+    timeout: Seconds to wait for all option quotes (defaults to quote_timeout)
+    cancelled: Optional callable; once it returns True the quotes still
+               missing are given up on
+    priority: Scheduler lane for the quote requests. Quotes still queued
+              when the wait ends are cancelled, so they don't hold up later
+              requests.
+
+    Returns (table, pre_spot): the crush_surface frame and the pre-event spot.
+    """
+    dates = stock_data.index
+    pre_date = dates[dates <= earnings_date].max()
+    post_date = dates[dates > earnings_date].min()
+    pre_spot = stock_data.loc[pre_date, 'close']
+    post_spot = stock_data.loc[post_date, 'close']
+
+    con_id = request_underlying_con_id(app, scheduler, symbol)
+    params = request_option_params(app, scheduler, symbol, con_id)
+    chain = select_chain(params["expirations"], params["strikes"], pre_spot, post_date,
+                         moneyness, max_expiries, max_contracts)
+
+    handles = request_chain_quotes(scheduler, cache, symbol, chain, earnings_date,
+                                   params["tradingClass"], params["multiplier"], priority=priority)
+    try:
+        pre_price, post_price = collect_chain_quotes(
+            handles, pre_date, post_date, quote_timeout(handles) if timeout is None else timeout, cancelled)
+    finally:
+        cancel_chain_quotes(scheduler, handles)
+    table = crush_surface(chain, pre_price, post_price, pre_spot, post_spot, pre_date, post_date,
+                          risk_free_rate)
+    return table, pre_spot
@@ -1,6 +1,29 @@
 import pandas as pd
 import numpy as np
-import scipy.stats
+from scipy.special import ndtr
+
+# 1 / sqrt(2π), used for the standard normal pdf
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+# Fields produced by black_scholes_greeks, in output order
+GREEK_FIELDS = (
+    'call', 'put',
+    'call_delta', 'put_delta',
+    'gamma', 'vega',
+    'call_theta', 'put_theta',
+)
+
+
+def _d1_d2(S, K, T, r, sigma):
+    """Shared d1/d2 terms of the Black-Scholes formula"""
+    vol_sqrt_t = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / vol_sqrt_t
+    return d1, d1 - vol_sqrt_t
+
+
+def _norm_pdf(x):
+    return np.exp(-0.5 * x * x) * _INV_SQRT_2PI
+
 
 def black_scholes_call(S, K, T, r, sigma):
     """
@@ -13,12 +36,9 @@ def black_scholes_call(S, K, T, r, sigma):
     r: Risk-free rate (annualized)
     sigma: Volatility (annualized using √252 factor)
     """
-    from scipy.stats import norm
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
 
-    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-
-    call_price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+    call_price = S * ndtr(d1) - K * np.exp(-r * T) * ndtr(d2)
     return call_price
 
 
@@ -33,32 +53,487 @@ def black_scholes_put(S, K, T, r, sigma):
     r: Risk-free rate (annualized)
     sigma: Volatility (annualized using √252 factor)
     """
-    from scipy.stats import norm
-
-    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
 
-    put_price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
+    put_price = K * np.exp(-r * T) * ndtr(-d2) - S * ndtr(-d1)
     return put_price
 
 
 def calculate_delta(S, K, T, r, sigma, option_type='call'):
     """Calculate option delta"""
-    from scipy.stats import norm
-
-    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
+    d1, _ = _d1_d2(S, K, T, r, sigma)
 
     if option_type == 'call':
-        return norm.cdf(d1)
+        return ndtr(d1)
     else:  # put
-        return -norm.cdf(-d1)
+        return -ndtr(-d1)
 
 
 def calculate_vega(S, K, T, r, sigma):
     """Calculate option vega (same for calls and puts)"""
-    from scipy.stats import norm
-
-    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
+    d1, _ = _d1_d2(S, K, T, r, sigma)
 
     # Vega is per 1% change in volatility
-    return S * norm.pdf(d1) * np.sqrt(T) / 100
\ No newline at end of file
+    return S * _norm_pdf(d1) * np.sqrt(T) / 100
+
+
+def allocate_greeks(shape, dtype=np.float64):
+    """Preallocate output buffers for black_scholes_greeks"""
+    return {name: np.empty(shape, dtype=dtype) for name in GREEK_FIELDS}
+
+
+def black_scholes_greeks(S, K, T, r, sigma, out=None):
+    """
+    Price calls and puts and compute their Greeks in one pass
+
+    d1/d2, the normal CDF and the normal pdf are evaluated once and shared by
+    every output, so this replaces calling black_scholes_call,
+    black_scholes_put, calculate_delta and calculate_vega separately.
+
+    Parameters:
+    S, K, T, r, sigma: Same as black_scholes_call; scalars or NumPy arrays
+        that broadcast against each other
+    out: Optional dict of preallocated arrays (see allocate_greeks) with the
+        broadcast shape. Results are written into it in place.
+
+    Returns a dict keyed by GREEK_FIELDS:
+    call, put: Option prices
+    call_delta, put_delta: Deltas
+    gamma: Gamma (same for calls and puts)
+    vega: Vega per 1% change in volatility (same for calls and puts)
+    call_theta, put_theta: Theta per calendar day
+    """
+    S, K, T, r, sigma = (np.asarray(x, dtype=np.float64) for x in (S, K, T, r, sigma))
+    shape = np.broadcast_shapes(S.shape, K.shape, T.shape, r.shape, sigma.shape)
+    scalar = out is None and shape == ()
+    if out is None:
+        out = allocate_greeks(shape)
+
+    call, put = out['call'], out['put']
+    call_delta, put_delta = out['call_delta'], out['put_delta']
+    gamma, vega = out['gamma'], out['vega']
+    call_theta, put_theta = out['call_theta'], out['put_theta']
+
+    # Shared terms. The output buffers double as scratch space until their
+    # final value is written, which keeps temporaries to a handful of arrays.
+    sqrt_t = np.sqrt(T)
+    vol_sqrt_t = sigma * sqrt_t
+    disc_k = K * np.exp(-r * T)
+
+    d1 = np.multiply(sigma, sigma, out=np.empty(shape))
+    d1 *= 0.5
+    d1 += r
+    d1 *= T
+    np.divide(S, K, out=gamma)
+    np.log(gamma, out=gamma)
+    d1 += gamma
+    d1 /= vol_sqrt_t
+
+    # Single CDF evaluation per d term
+    ndtr(d1, out=call_delta)
+    np.subtract(d1, vol_sqrt_t, out=put_delta)
+    nd2 = ndtr(put_delta, out=put_delta)
+
+    # Single pdf evaluation, reusing the d1 buffer
+    pdf = np.square(d1, out=d1)
+    pdf *= -0.5
+    np.exp(pdf, out=pdf)
+    pdf *= _INV_SQRT_2PI
+
+    # Prices (put from put-call parity)
+    np.multiply(S, call_delta, out=call)
+    np.multiply(disc_k, nd2, out=vega)
+    call -= vega
+    np.subtract(call, S, out=put)
+    put += disc_k
+
+    # Theta per calendar day: shared decay term plus the rate term
+    np.multiply(r, vega, out=call_theta)
+    np.multiply(r, disc_k, out=put_theta)
+    put_theta -= call_theta
+    np.multiply(S, pdf, out=gamma)
+    gamma *= sigma
+    gamma /= 2 * sqrt_t
+    call_theta += gamma
+    np.negative(call_theta, out=call_theta)
+    put_theta -= gamma
+    call_theta /= 365
+    put_theta /= 365
+
+    # Gamma and vega (per 1% change in volatility)
+    np.divide(pdf, S, out=gamma)
+    gamma /= vol_sqrt_t
+    np.multiply(S, pdf, out=vega)
+    vega *= sqrt_t
+    vega /= 100
+
+    # Put delta last, once nd2 is no longer needed
+    np.subtract(call_delta, 1.0, out=put_delta)
+
+    if scalar:
+        return {name: float(out[name]) for name in GREEK_FIELDS}
+    return out
+
+
+def implied_volatility(price, S, K, T, r, option_type='call', tol=1e-8,
+                       max_iter=100, sigma_low=1e-4, sigma_high=5.0, min_vega=1e-6):
+    """
+    Back out Black-Scholes implied volatility for arrays of option prices
+
+    Safeguarded Newton iteration: each element keeps a [low, high] bracket
+    that is tightened after every step, and falls back to bisection whenever
+    the Newton step leaves the bracket or vega is too small to trust. Only the
+    elements that have not converged yet are re-priced on each iteration.
+
+    Convergence is judged on sigma, not on price: an element is done once the
+    next Newton step (price error / vega) or its bracket is below tol. A fixed
+    price tolerance would accept any sigma for a far out-of-the-money contract
+    whose premium is itself below the tolerance.
+
+    Parameters:
+    price: Observed option premiums
+    S, K, T, r: Same as black_scholes_call; broadcast against price
+    option_type: 'call', 'put', or an array of those per element
+    tol: Convergence tolerance on sigma
+    max_iter: Iteration cap
+    sigma_low, sigma_high: Initial volatility bracket
+    min_vega: Vega (per unit of sigma) below min_vega * S counts as
+              negligible: the premium then says next to nothing about sigma,
+              so the element is not converged
+
+    Returns (sigma, converged). sigma is NaN where the premium violates the
+    no-arbitrage bounds, vega is negligible at the solution or the iteration
+    cap was hit; converged is a boolean mask with the same shape.
+    """
+    price, S, K, T, r = np.broadcast_arrays(
+        *(np.asarray(x, dtype=np.float64) for x in (price, S, K, T, r))
+    )
+    is_call = np.broadcast_to(np.asarray(option_type) == 'call', price.shape)
+    shape = price.shape
+
+    price, S, K, T, r, is_call = (x.ravel() for x in (price, S, K, T, r, is_call))
+    disc_k = K * np.exp(-r * T)
+
+    # Premiums outside the no-arbitrage bounds have no implied volatility
+    intrinsic = np.where(is_call, np.maximum(S - disc_k, 0.0), np.maximum(disc_k - S, 0.0))
+    upper = np.where(is_call, S, disc_k)
+    valid = (price > intrinsic) & (price < upper) & (T > 0)
+
+    sigma = np.full(price.shape, np.nan)
+    converged = np.zeros(price.shape, dtype=bool)
+
+    idx = np.flatnonzero(valid)
+    lo = np.full(idx.size, sigma_low)
+    hi = np.full(idx.size, sigma_high)
+    # Brenner-Subrahmanyam ATM approximation as the starting point
+    sig = np.clip(np.sqrt(2 * np.pi / T[idx]) * price[idx] / S[idx], sigma_low, sigma_high)
+
+    p, s, k, t, rr, dk, c = price[idx], S[idx], K[idx], T[idx], r[idx], disc_k[idx], is_call[idx]
+
+    for _ in range(max_iter):
+        if idx.size == 0:
+            break
+
+        sqrt_t = np.sqrt(t)
+        vol_sqrt_t = sig * sqrt_t
+        d1 = (np.log(s / k) + (rr + 0.5 * sig ** 2) * t) / vol_sqrt_t
+        call = s * ndtr(d1) - dk * ndtr(d1 - vol_sqrt_t)
+        model = np.where(c, call, call - s + dk)
+        vega = s * _norm_pdf(d1) * sqrt_t
+
+        diff = model - p
+        # The Newton step is diff / vega, so this is a step below tol in sigma
+        hit = np.abs(diff) < tol * vega
+
+        # Price is increasing in sigma, so the sign of diff tightens the bracket
+        too_high = diff > 0
+        hi = np.where(too_high, sig, hi)
+        lo = np.where(too_high, lo, sig)
+
+        with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+            newton = sig - diff / vega
+        in_bracket = (newton > lo) & (newton < hi) & (vega > 1e-12)
+        sig = np.where(hit, sig, np.where(in_bracket, newton, 0.5 * (lo + hi)))
+
+        # Converged in sigma, or the bracket has collapsed around the root.
+        # A bracket that collapsed onto sigma_low/sigma_high has no root inside,
+        # and a root where vega is negligible is not pinned down by the price.
+        collapsed = (hi - lo) < tol
+        ok = (hit | (collapsed & (lo > sigma_low) & (hi < sigma_high))) & (vega >= min_vega * s)
+        done = hit | collapsed
+        if done.any():
+            sigma[idx[ok]] = sig[ok]
+            converged[idx[ok]] = True
+            keep = ~done
+            idx, lo, hi, sig = idx[keep], lo[keep], hi[keep], sig[keep]
+            p, s, k, t, rr, dk, c = p[keep], s[keep], k[keep], t[keep], rr[keep], dk[keep], c[keep]
+
+    return sigma.reshape(shape), converged.reshape(shape)
+
+
+# Pricing models accepted by option_greeks
+PRICING_MODELS = ("black_scholes", "baw", "tree")
+
+# Leisen-Reimer steps: under a cent of error on a $100 stock at 51, a fifth
+# of a cent at 101, and 301 for reference values. Cost grows with the square of the steps.
+DEFAULT_TREE_STEPS = 101
+
+# American Greeks carry the call and put values separately as well
+AMERICAN_GREEK_FIELDS = GREEK_FIELDS + ('call_gamma', 'put_gamma', 'call_vega', 'put_vega')
+
+# Finite-difference bumps: relative spot, absolute vol, years
+_SPOT_BUMP = 1e-3
+_VOL_BUMP = 0.01
+_TIME_BUMP = 1e-4
+
+# Newton iteration cap and tolerance (relative to K) for the BAW critical price
+_BAW_MAX_ITER = 50
+_BAW_TOL = 1e-6
+
+
+def _european(S, K, T, r, q, sigma, omega):
+    """Black-Scholes-Merton price (omega +1 call, -1 put), N(omega*d1) and the pdf at d1"""
+    vol_sqrt_t = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / vol_sqrt_t
+    nd1 = ndtr(omega * d1)
+    price = omega * (S * np.exp(-q * T) * nd1 - K * np.exp(-r * T) * ndtr(omega * (d1 - vol_sqrt_t)))
+    return price, nd1, _norm_pdf(d1)
+
+
+def _baw_prices(S, K, T, r, q, sigma, omega):
+    """
+    Barone-Adesi-Whaley American prices of flat arrays (omega +1 call, -1 put)
+
+    The critical price S* is solved by Newton iteration on all contracts at
+    once; contracts that are never exercised early (calls without a
+    dividend yield, puts at r <= 0) get the European price.
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        european = _european(S, K, T, r, q, sigma, omega)[0]
+        early = (q > 0) if omega == 1 else (r > 0)
+        early = early & (T > 0)
+        if not early.any():
+            return european
+
+        b = r - q
+        var = sigma ** 2
+        n_term = 2 * b / var - 1
+        m = 2 * r / var
+        carry = np.exp(-q * T)
+        vol_sqrt_t = sigma * np.sqrt(T)
+        q_exp = 0.5 * (-n_term + omega * np.sqrt(n_term ** 2 + 4 * m / -np.expm1(-r * T)))
+
+        # Seed from the perpetual option's boundary
+        q_inf = 0.5 * (-n_term + omega * np.sqrt(n_term ** 2 + 4 * m))
+        s_inf = K / (1 - 1 / q_inf)
+        h = -(b * T + 2 * omega * vol_sqrt_t) * K / (s_inf - K)
+        s_star = s_inf + (K - s_inf) * np.exp(h)
+
+        for _ in range(_BAW_MAX_ITER):
+            value, nd1, pdf = _european(s_star, K, T, r, q, sigma, omega)
+            rhs = value + omega * (1 - carry * nd1) * s_star / q_exp
+            slope = omega * carry * nd1 * (1 - 1 / q_exp) + (omega - carry * pdf / vol_sqrt_t) / q_exp
+            gap = omega * (s_star - K) - rhs
+            s_star = s_star - gap / (omega - slope)
+            # Calls exercise above K, puts below it
+            s_star = np.maximum(s_star, K) if omega == 1 else np.clip(s_star, 1e-12 * K, K)
+            if not (np.abs(gap[early]) > _BAW_TOL * K[early]).any():
+                break
+
+        nd1 = _european(s_star, K, T, r, q, sigma, omega)[1]
+        premium = omega * s_star / q_exp * (1 - carry * nd1) * (S / s_star) ** q_exp
+        american = np.where(omega * (S - s_star) >= 0, omega * (S - K), european + premium)
+        return np.where(early, american, european)
+
+
+def _peizer_pratt(z, n):
+    """Peizer-Pratt inversion of the normal CDF for an n-step tree"""
+    return 0.5 + np.copysign(0.5, z) * np.sqrt(
+        -np.expm1(-(z / (n + 1 / 3 + 0.1 / (n + 1))) ** 2 * (n + 1 / 6))
+    )
+
+
+def _lr_tree(S, K, T, r, q, sigma, steps):
+    """
+    Leisen-Reimer American call and put trees over flat arrays of contracts
+
+    Nodes run down axis 0 and contracts across axis 1, so each backward step
+    is a handful of array operations over every contract at once; the only
+    Python loop is over the steps. Returns the call and put prices, deltas
+    and gammas, the latter two read off the first steps of the tree.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dt = T / steps
+        vol_sqrt_t = sigma * np.sqrt(T)
+        d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / vol_sqrt_t
+        p = _peizer_pratt(d1 - vol_sqrt_t, steps)
+        growth = np.exp((r - q) * dt)
+        up = growth * _peizer_pratt(d1, steps) / p
+        down = (growth - p * up) / (1 - p)
+        disc = np.exp(-r * dt)
+        p_up = disc * p
+        p_down = disc - p_up
+
+        j = np.arange(steps + 1)[:, None]
+        spot = S * np.exp(j * np.log(up) + (steps - j) * np.log(down))
+        call = np.maximum(spot - K, 0.0)
+        put = np.maximum(K - spot, 0.0)
+        buf = np.empty_like(spot)
+
+        levels = {}
+        for i in range(steps - 1, -1, -1):
+            nodes = spot[:i + 1]
+            nodes /= down
+            scratch = buf[:i + 1]
+            for values, is_call in ((call, True), (put, False)):
+                # disc * (p * V_up + (1 - p) * V_down), then the early exercise floor
+                v = values[:i + 1]
+                np.multiply(values[1:i + 2], p_up, out=scratch)
+                v *= p_down
+                v += scratch
+                if is_call:
+                    np.subtract(nodes, K, out=scratch)
+                else:
+                    np.subtract(K, nodes, out=scratch)
+                np.maximum(v, scratch, out=v)
+            if i <= 2:
+                levels[i] = (nodes.copy(), call[:i + 1].copy(), put[:i + 1].copy())
+
+        (s1, c1, p1), (s2, c2, p2) = levels[1], levels[2]
+        ds1 = s1[1] - s1[0]
+        results = [levels[0][1][0], levels[0][2][0], (c1[1] - c1[0]) / ds1, (p1[1] - p1[0]) / ds1]
+        half_span = 0.5 * (s2[2] - s2[0])
+        for v in (c2, p2):
+            results.append(((v[2] - v[1]) / (s2[2] - s2[1]) - (v[1] - v[0]) / (s2[1] - s2[0])) / half_span)
+        return results
+
+
+def _american_inputs(S, K, T, r, sigma, q):
+    arrays = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (S, K, T, r, sigma, q)))
+    return arrays[0].shape, [x.ravel() for x in arrays]
+
+
+def _american_output(shape, values):
+    # gamma and vega as in GREEK_FIELDS: the call/put mean, so 2 * vega is the straddle's
+    values['gamma'] = 0.5 * (values['call_gamma'] + values['put_gamma'])
+    values['vega'] = 0.5 * (values['call_vega'] + values['put_vega'])
+    if shape == ():
+        return {name: float(values[name][0]) for name in AMERICAN_GREEK_FIELDS}
+    return {name: values[name].reshape(shape) for name in AMERICAN_GREEK_FIELDS}
+
+
+def american_baw_greeks(S, K, T, r, sigma, q=0.0):
+    """
+    American call and put prices and Greeks by the Barone-Adesi-Whaley
+    quadratic approximation
+
+    Greeks are finite differences: every bumped input set (spot up/down,
+    vol up/down, time) is priced in the same batch as the base case, so the
+    whole chain takes one critical-price solve.
+
+    Parameters:
+    S, K, T, r, sigma: Same as black_scholes_greeks; broadcast against each other
+    q: Continuous dividend yield (annualized). Without one an American call
+        is worth the European call.
+
+    Returns a dict keyed by AMERICAN_GREEK_FIELDS, in the units of
+    black_scholes_greeks. gamma and vega are the means of the call and put
+    values.
+    """
+    shape, (S, K, T, r, sigma, q) = _american_inputs(S, K, T, r, sigma, q)
+    n = S.size
+    h = _SPOT_BUMP * S
+    dv = np.minimum(_VOL_BUMP, 0.5 * sigma)
+    dt = np.minimum(_TIME_BUMP, 0.5 * T)
+
+    # Scenarios: base, spot up, spot down, vol up, vol down, time decayed
+    batch_S = np.concatenate([S, S + h, S - h, S, S, S])
+    batch_T = np.concatenate([T, T, T, T, T, T - dt])
+    batch_sigma = np.concatenate([sigma, sigma, sigma, sigma + dv, sigma - dv, sigma])
+    K6, r6, q6 = (np.tile(x, 6) for x in (K, r, q))
+
+    values = {}
+    for side, omega in (('call', 1), ('put', -1)):
+        base, up, down, vol_up, vol_down, later = _baw_prices(
+            batch_S, K6, batch_T, r6, q6, batch_sigma, omega).reshape(6, n)
+        values[side] = base
+        values[f'{side}_delta'] = (up - down) / (2 * h)
+        values[f'{side}_gamma'] = (up - 2 * base + down) / h ** 2
+        values[f'{side}_vega'] = (vol_up - vol_down) / (2 * dv) / 100
+        values[f'{side}_theta'] = (later - base) / dt / 365
+    return _american_output(shape, values)
+
+
+def american_tree_greeks(S, K, T, r, sigma, q=0.0, steps=DEFAULT_TREE_STEPS):
+    """
+    American call and put prices and Greeks on a Leisen-Reimer binomial tree
+
+    All contracts are rolled back together (see _lr_tree), with the vol-bumped
+    copies for vega in the same batch. Delta and gamma come from the tree's
+    first steps; theta from the Black-Scholes PDE, and zero where exercising
+    now is optimal.
+
+    Parameters:
+    S, K, T, r, sigma: Same as black_scholes_greeks; broadcast against each other
+    q: Continuous dividend yield (annualized)
+    steps: Tree steps, rounded up to odd (Leisen-Reimer needs an odd count).
+        Error falls roughly with 1/steps², time grows with steps².
+
+    Returns a dict keyed by AMERICAN_GREEK_FIELDS, in the units of
+    black_scholes_greeks. gamma and vega are the means of the call and put
+    values.
+    """
+    steps = max(int(steps), 3) | 1
+    shape, (S, K, T, r, sigma, q) = _american_inputs(S, K, T, r, sigma, q)
+    n = S.size
+    dv = np.minimum(_VOL_BUMP, 0.5 * sigma)
+
+    batch_sigma = np.concatenate([sigma, sigma + dv, sigma - dv])
+    call, put, call_delta, put_delta, call_gamma, put_gamma = _lr_tree(
+        *(np.tile(x, 3) for x in (S, K, T, r, q)), batch_sigma, steps)
+
+    values = {}
+    for side, omega, price, delta, gamma in (('call', 1, call, call_delta, call_gamma),
+                                             ('put', -1, put, put_delta, put_gamma)):
+        base = price[:n]
+        values[side] = base
+        values[f'{side}_delta'] = delta[:n]
+        values[f'{side}_gamma'] = gamma[:n]
+        values[f'{side}_vega'] = (price[n:2 * n] - price[2 * n:]) / (2 * dv) / 100
+        theta = r * base - (r - q) * S * delta[:n] - 0.5 * (sigma * S) ** 2 * gamma[:n]
+        exercised = base <= np.maximum(omega * (S - K), 0.0) + 1e-12 * K
+        values[f'{side}_theta'] = np.where(exercised & (base > 0), 0.0, theta / 365)
+    return _american_output(shape, values)
+
+
+def option_greeks(S, K, T, r, sigma, model="black_scholes", q=0.0, steps=DEFAULT_TREE_STEPS):
+    """
+    black_scholes_greeks, american_baw_greeks or american_tree_greeks by name
+
+    Parameters:
+    S, K, T, r, sigma: Same as black_scholes_greeks
+    model: One of PRICING_MODELS
+    q: Continuous dividend yield (annualized)
+    steps: Tree steps for the "tree" model
+
+    Returns a dict with at least the GREEK_FIELDS, in the same units.
+    """
+    if model == "baw":
+        return american_baw_greeks(S, K, T, r, sigma, q)
+    if model == "tree":
+        return american_tree_greeks(S, K, T, r, sigma, q, steps)
+    if model != "black_scholes":
+        raise ValueError(f"Unknown pricing model {model!r}; use one of {', '.join(PRICING_MODELS)}")
+    if np.all(np.asarray(q) == 0):
+        return black_scholes_greeks(S, K, T, r, sigma)
+
+    # Merton: a dividend yield prices like a spot of S * e^(-qT)
+    carry = np.exp(-np.asarray(q) * T)
+    forward_spot = S * carry
+    g = black_scholes_greeks(forward_spot, K, T, r, sigma)
+    g['call_theta'] = g['call_theta'] + q * forward_spot * g['call_delta'] / 365
+    g['put_theta'] = g['put_theta'] + q * forward_spot * g['put_delta'] / 365
+    for name in ('call_delta', 'put_delta'):
+        g[name] = g[name] * carry
+    g['gamma'] = g['gamma'] * carry ** 2
+    return g
@@ -0,0 +1,74 @@
+from functools import lru_cache
+
+import numpy as np
+
+from option_math import black_scholes_greeks
+
+DEFAULT_DTES = tuple(range(1, 91))
+DEFAULT_MONEYNESS = tuple(np.round(np.linspace(-0.20, 0.20, 41), 4))
+DEFAULT_RATES = (0.0, 0.01, 0.02, 0.03, 0.04, 0.05, 0.06)
+
+# Metric name -> display label
+SWEEP_METRICS = {
+    'straddle_change': 'Straddle change ($)',
+    'straddle_change_pct': 'Straddle change (%)',
+    'delta_change': 'Straddle delta change',
+    'vega_change': 'Straddle vega change',
+    'pre_straddle': 'Pre-earnings straddle ($)',
+    'post_straddle': 'Post-earnings straddle ($)',
+}
+
+# Grids kept by the memo; each default grid is ~40k cells per metric
+SWEEP_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=SWEEP_CACHE_SIZE)
+def _sweep(pre_spot, post_spot, pre_iv, post_iv, dtes, moneyness, rates):
+    # Axes: (pre/post, rate, dte, moneyness)
+    S = np.array([pre_spot, post_spot]).reshape(2, 1, 1, 1)
+    sigma = np.array([pre_iv, post_iv]).reshape(2, 1, 1, 1)
+    r = np.asarray(rates, dtype=np.float64).reshape(1, -1, 1, 1)
+    T = np.asarray(dtes, dtype=np.float64).reshape(1, 1, -1, 1) / 365
+    K = pre_spot * (1 + np.asarray(moneyness, dtype=np.float64)).reshape(1, 1, 1, -1)
+
+    g = black_scholes_greeks(S, K, T, r, sigma)
+    straddle = g['call'] + g['put']
+    delta = g['call_delta'] + g['put_delta']
+    vega = 2 * g['vega']
+
+    grid = {
+        'pre_straddle': straddle[0],
+        'post_straddle': straddle[1],
+        'straddle_change': straddle[1] - straddle[0],
+        'straddle_change_pct': (straddle[1] - straddle[0]) / straddle[0] * 100,
+        'delta_change': delta[1] - delta[0],
+        'vega_change': vega[1] - vega[0],
+    }
+    for values in grid.values():
+        values.setflags(write=False)     # shared by every caller of the memo
+    return grid
+
+
+def sweep_grid(pre_spot, post_spot, pre_iv, post_iv, dtes=DEFAULT_DTES, moneyness=DEFAULT_MONEYNESS,
+               rates=DEFAULT_RATES):
+    """
+    Straddle and Greek changes over a days-to-expiry × strike × rate grid
+
+    Every pre/post leg of every grid point is priced in one broadcast
+    black_scholes_greeks call. Like run_iv_crush_analysis, both legs use the
+    same time to expiry, and strikes are set relative to the pre-event spot.
+    Grids are memoized on their inputs, so asking again for the same event
+    (e.g. from a slider) costs a dict lookup.
+
+    Parameters:
+    pre_spot, post_spot, pre_iv, post_iv: From run_iv_crush_analysis
+    dtes: Days to expiry
+    moneyness: Strike offsets, K = pre_spot * (1 + m)
+    rates: Risk-free rates (annualized)
+
+    Returns a dict with the axes (dtes, moneyness, rates) and one read-only
+    array of shape (rates, dtes, moneyness) per SWEEP_METRICS key.
+    """
+    dtes, moneyness, rates = (tuple(float(x) for x in axis) for axis in (dtes, moneyness, rates))
+    grid = _sweep(float(pre_spot), float(post_spot), float(pre_iv), float(post_iv), dtes, moneyness, rates)
+    return {'dtes': np.array(dtes), 'moneyness': np.array(moneyness), 'rates': np.array(rates), **grid}
@@ -0,0 +1,290 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from bar_cache import contract_key
+from IBApp import IBRequestError
+
+# Priority lanes: lower value is dispatched first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# IB historical data pacing rules
+IDENTICAL_REQUEST_COOLDOWN = 15     # no identical request within 15 seconds
+SAME_CONTRACT_LIMIT = 6             # at most 6 requests for one contract/whatToShow...
+SAME_CONTRACT_WINDOW = 2            # ...within 2 seconds
+MAX_REQUESTS_PER_WINDOW = 60        # at most 60 requests...
+REQUEST_WINDOW = 600                # ...in any 10 minute period, for bars of 30 seconds or less
+MAX_IN_FLIGHT = 50                  # simultaneous open historical requests
+
+# Bar sizes the 60-per-10-minutes rule applies to
+SMALL_BAR_SIZES = frozenset({"1 secs", "5 secs", "10 secs", "15 secs", "30 secs"})
+
+# Error 162 with this text means IB rejected the request for pacing
+PACING_VIOLATION_TEXT = "pacing violation"
+PACING_RETRY_DELAY = 15
+
+
+class TokenBucket:
+    """
+    Token bucket limiter
+
+    A bucket of `capacity` tokens refilled at `rate` tokens per second admits
+    at most capacity + rate * W requests in any window of W seconds, so the
+    defaults (10 tokens, 50 per 10 minutes) never exceed IB's 60 requests per
+    10 minutes while still allowing short interactive bursts.
+    """
+
+    def __init__(self, capacity=10, rate=(MAX_REQUESTS_PER_WINDOW - 10) / REQUEST_WINDOW):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def time_for(self, count, now):
+        """Seconds until count more requests could have been admitted"""
+        self._refill(now)
+        return max(count - self.tokens, 0.0) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+def _small_bars(request):
+    return request.params['barSizeSetting'] in SMALL_BAR_SIZES
+
+
+class _Request:
+    def __init__(self, priority, seq, key, params):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.params = params
+        self.future = Future()
+        self.not_before = 0.0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class HistoricalRequestScheduler:
+    """
+    Queue and pace reqHistoricalData calls against IB's historical data limits
+
+    Requests are queued in priority lanes (INTERACTIVE ahead of BACKGROUND),
+    given reqIds from an allocator and dispatched from a background thread
+    when the per-contract burst limit and the in-flight cap allow it, and for
+    small bars (SMALL_BAR_SIZES) the token bucket too. Identical requests that
+    are queued, in flight or completed within the last 15 seconds share one
+    result instead of being resent.
+    """
+
+    def __init__(self, app, bucket=None, max_in_flight=MAX_IN_FLIGHT, first_req_id=1000):
+        self.app = app
+        self.bucket = bucket or TokenBucket()
+        self.max_in_flight = max_in_flight
+
+        self._req_ids = itertools.count(first_req_id)
+        self._seq = itertools.count()
+        self._queue = []
+        self._by_key = {}            # request key -> queued or in-flight _Request
+        self._recent = {}            # request key -> (completed time, Future)
+        self._contract_log = {}      # contract/whatToShow -> deque of send times
+        self._in_flight = 0
+
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def next_req_id(self):
+        """Allocate a reqId that no other scheduled request uses"""
+        return next(self._req_ids)
+
+    def submit(self, contract, what_to_show, end_date_time, duration, bar_size="1 day",
+               use_rth=1, priority=INTERACTIVE):
+        """
+        Queue a historical data request
+
+        Returns a Future that resolves to a BarBuffer of the bars, or raises
+        IBRequestError if IB rejects the request.
+        """
+        key = (contract_key(contract), what_to_show, end_date_time, duration, bar_size, use_rth)
+        params = dict(
+            contract=contract,
+            endDateTime=end_date_time,
+            durationStr=duration,
+            barSizeSetting=bar_size,
+            whatToShow=what_to_show,
+            useRTH=use_rth,
+            formatDate=1,
+            keepUpToDate=False,
+            chartOptions=[]
+        )
+
+        with self._cond:
+            # Identical request still queued or in flight: share it,
+            # promoting it to the more urgent lane if needed
+            existing = self._by_key.get(key)
+            if existing is not None:
+                if priority < existing.priority and existing in self._queue:
+                    existing.priority = priority
+                    heapq.heapify(self._queue)
+                    self._cond.notify()
+                return existing.future
+
+            # Identical request completed recently: IB would reject a resend
+            recent = self._recent.get(key)
+            if recent is not None and time.monotonic() - recent[0] < IDENTICAL_REQUEST_COOLDOWN:
+                return recent[1]
+
+            request = _Request(priority, next(self._seq), key, params)
+            self._by_key[key] = request
+            heapq.heappush(self._queue, request)
+            self._cond.notify()
+            return request.future
+
+    def cancel(self, futures):
+        """
+        Drop the queued requests behind some futures
+
+        Requests already sent are left to finish. A dropped future is
+        cancelled for everyone sharing it. Returns the number dropped.
+        """
+        futures = set(futures)
+        with self._cond:
+            dropped = [request for request in self._queue if request.future in futures]
+            if not dropped:
+                return 0
+            self._queue = [request for request in self._queue if request.future not in futures]
+            heapq.heapify(self._queue)
+            for request in dropped:
+                self._by_key.pop(request.key, None)
+        for request in dropped:
+            request.future.cancel()
+        return len(dropped)
+
+    def pacing_wait(self, priority=BACKGROUND):
+        """
+        Rough seconds until the queued small-bar requests at or ahead of a
+        priority lane have been sent, going by the token bucket alone
+        """
+        with self._cond:
+            queued = sum(1 for request in self._queue if request.priority <= priority and _small_bars(request))
+            return self.bucket.time_for(queued, time.monotonic())
+
+    def pending(self):
+        """Number of requests queued or in flight"""
+        with self._cond:
+            return len(self._by_key)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _contract_wait(self, request, now):
+        log = self._contract_log.get(request.key[:2])
+        if not log:
+            return 0.0
+        while log and now - log[0] >= SAME_CONTRACT_WINDOW:
+            log.popleft()
+        if len(log) < SAME_CONTRACT_LIMIT - 1:
+            return 0.0
+        return SAME_CONTRACT_WINDOW - (now - log[0])
+
+    def _next_ready(self, now):
+        """Pop the most urgent request that may be sent now, or return the wait time"""
+        if self._in_flight >= self.max_in_flight:
+            return None, None
+
+        bucket_wait = self.bucket.wait_time(now)
+        deferred = []
+        ready = None
+        wait = None
+        while self._queue:
+            request = heapq.heappop(self._queue)
+            delay = max(request.not_before - now, self._contract_wait(request, now))
+            if _small_bars(request):
+                delay = max(delay, bucket_wait)
+            if delay <= 0:
+                ready = request
+                break
+            deferred.append(request)
+            wait = delay if wait is None else min(wait, delay)
+        for request in deferred:
+            heapq.heappush(self._queue, request)
+        return ready, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    now = time.monotonic()
+                    request, wait = self._next_ready(now) if self._queue else (None, None)
+                    if request is not None:
+                        break
+                    self._cond.wait(timeout=wait)
+
+                if _small_bars(request):
+                    self.bucket.take(now)
+                self._contract_log.setdefault(request.key[:2], deque()).append(now)
+                self._in_flight += 1
+                req_id = self.next_req_id()
+
+            self._dispatch(request, req_id)
+
+    def _dispatch(self, request, req_id):
+        try:
+            # Held by the app while the connection is down, and sent again after a reconnect
+            ib_future = self.app.request_historical_data(req_id, **request.params)
+        except Exception as e:
+            self._complete(request, error=e)
+            return
+        ib_future.add_done_callback(lambda f: self._on_done(request, f))
+
+    def _on_done(self, request, ib_future):
+        error = ib_future.exception()
+        if (isinstance(error, IBRequestError) and error.errorCode == 162
+                and PACING_VIOLATION_TEXT in error.errorString.lower()):
+            # Rejected for pacing: put it back in its lane after a cool-off
+            with self._cond:
+                self._in_flight -= 1
+                request.not_before = time.monotonic() + PACING_RETRY_DELAY
+                heapq.heappush(self._queue, request)
+                self._cond.notify()
+            return
+        self._complete(request, error=error, bars=None if error else ib_future.result())
+
+    def _complete(self, request, error=None, bars=None):
+        with self._cond:
+            self._in_flight -= 1
+            self._by_key.pop(request.key, None)
+            now = time.monotonic()
+            self._recent = {k: v for k, v in self._recent.items()
+                            if now - v[0] < IDENTICAL_REQUEST_COOLDOWN}
+            if error is None:
+                self._recent[request.key] = (now, request.future)
+            self._cond.notify()
+
+        if error is not None:
+            request.future.set_exception(error)
+        else:
+            request.future.set_result(bars)
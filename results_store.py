@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from iv_analysis import BATCH_RESULT_COLUMNS
+
+DEFAULT_RESULTS_PATH = os.path.join(os.path.expanduser("~"), ".iv_crush", "results.sqlite")
+
+DATE_COLUMNS = ('run_at', 'earnings_date', 'pre_date', 'post_date')
+
+# Stored on top of the run_batch_analysis columns
+CHANGE_COLUMNS = {
+    'straddle_change': ('post_straddle', 'pre_straddle'),
+    'delta_change': ('post_delta', 'pre_delta'),
+    'vega_change': ('post_vega', 'pre_vega'),
+}
+
+STORE_COLUMNS = (['run_id', 'run_at', 'source', 'risk_free_rate', 'model', 'dividend_yield'] +
+                 BATCH_RESULT_COLUMNS + list(CHANGE_COLUMNS))
+
+# Runs of the same event under different pricing models are kept apart
+EVENT_KEY = ['ticker', 'earnings_date', 'days_to_expiry', 'model']
+
+# Added after the first release; older stores get them with these values
+_ADDED_COLUMNS = {'model': "TEXT DEFAULT 'black_scholes'", 'dividend_yield': "REAL DEFAULT 0"}
+
+_TEXT_COLUMNS = ('source', 'ticker', 'model')
+_INTEGER_COLUMNS = ('run_id',) + DATE_COLUMNS
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    {', '.join(f"{c} {'TEXT' if c in _TEXT_COLUMNS else 'INTEGER' if c in _INTEGER_COLUMNS else 'REAL'}"
+               for c in STORE_COLUMNS[1:])}
+);
+CREATE INDEX IF NOT EXISTS runs_event ON runs (ticker, earnings_date, days_to_expiry);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (earnings_date);
+CREATE INDEX IF NOT EXISTS runs_crush ON runs (iv_crush_pct);
+"""
+
+
+def _ns(value):
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+class ResultsStore:
+    """
+    Append-only SQLite store of analysis results
+
+    Every run is added as a new row (one per event, the run_batch_analysis
+    columns plus run time, source, rate, pricing model and dividend yield,
+    and the straddle/delta/vega changes);
+    nothing is updated in place, so re-running an event keeps its history.
+    The table is indexed by ticker and date, and by IV crush, for sql().
+
+    query() filters an in-memory column copy of the table instead: reading
+    thousands of wide rows through sqlite3 costs far more than the filter
+    itself. Because rows are only ever appended, the copy is brought up to
+    date by loading the rows past the last run_id it holds (including runs
+    appended by other processes), and the newest run of each event is
+    worked out once per refresh rather than per query.
+    """
+
+    def __init__(self, path=DEFAULT_RESULTS_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL keeps appends cheap and lets queries run while a run is written
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(runs)")}
+        with self._conn:
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {definition}")
+
+        self._frame = None
+        self._latest = None
+        self._last_run_id = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def append(self, results, source="", risk_free_rate=np.nan, model="black_scholes", dividend_yield=0.0):
+        """
+        Append a run_batch_analysis frame (or result_frame rows)
+
+        Parameters:
+        results: Result rows
+        source: Where the run came from, e.g. 'scan' or 'dashboard'
+        risk_free_rate: Rate the options were priced with
+        model: Pricing model name (see option_math.PRICING_MODELS)
+        dividend_yield: Continuous dividend yield the options were priced with
+
+        Returns the number of rows written.
+        """
+        if results.empty:
+            return 0
+        rows = results.reindex(columns=BATCH_RESULT_COLUMNS)
+        rows.insert(0, 'run_at', time.time_ns())
+        rows.insert(1, 'source', source)
+        rows.insert(2, 'risk_free_rate', risk_free_rate)
+        rows.insert(3, 'model', model)
+        rows.insert(4, 'dividend_yield', dividend_yield)
+        for column, (post, pre) in CHANGE_COLUMNS.items():
+            rows[column] = rows[post] - rows[pre]
+        for column in DATE_COLUMNS[1:]:
+            dates = pd.DatetimeIndex(rows[column]).as_unit('ns')
+            rows[column] = np.where(dates.isna(), None, dates.asi8.astype(object))
+        rows = rows.astype(object).where(rows.notna(), None)
+
+        columns = STORE_COLUMNS[1:]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows[columns].itertuples(index=False, name=None)
+            )
+        return len(rows)
+
+    def _read(self, sql, params=()):
+        data = pd.read_sql_query(sql, self._conn, params=params)
+        for column in DATE_COLUMNS:
+            if column in data:
+                data[column] = pd.to_datetime(data[column])
+        return data
+
+    def _refresh(self):
+        """Load runs appended since the last refresh (caller holds the lock)"""
+        new = self._read(f"SELECT {', '.join(STORE_COLUMNS)} FROM runs WHERE run_id > ? ORDER BY run_id",
+                         (self._last_run_id,))
+        if new.empty and self._frame is not None:
+            return
+        frame = new if self._frame is None else pd.concat([self._frame, new], ignore_index=True)
+        if len(frame):
+            self._last_run_id = int(frame['run_id'].iloc[-1])
+        self._frame = frame
+        # Rows are in run_id order, so the last of each event is its newest run
+        self._latest = ~frame.duplicated(EVENT_KEY, keep='last').to_numpy()
+
+    def query(self, tickers=None, start=None, end=None, expr=None, latest=True, columns=None,
+              order_by="earnings_date", limit=None, **ranges):
+        """
+        Stored runs matching some filters
+
+        Parameters:
+        tickers: Only these tickers
+        start, end: Earnings date range (inclusive)
+        expr: Extra DataFrame.query condition, e.g. "source == 'scan'"
+        latest: Only the newest run of each (ticker, earnings_date, days_to_expiry, model)
+        columns: Columns to return (default: all)
+        order_by: Sort column
+        limit: Max rows
+        ranges: column=(low, high) bounds, inclusive; either may be None.
+                Prefix the column with abs_ to bound its absolute value.
+
+        e.g. query(iv_crush_pct=(40, None), abs_delta_change=(0.2, None))
+
+        Returns a DataFrame with date columns as Timestamps.
+        """
+        columns = list(columns) if columns else STORE_COLUMNS
+        unknown = set(columns) - set(STORE_COLUMNS)
+        if unknown or order_by not in STORE_COLUMNS:
+            raise ValueError(f"Unknown results columns {sorted(unknown) or [order_by]}")
+
+        with self._lock:
+            self._refresh()
+            frame, mask = self._frame, self._latest.copy() if latest else np.ones(len(self._frame), bool)
+
+        if tickers:
+            mask &= frame['ticker'].isin([t.upper() for t in tickers]).to_numpy()
+        if start is not None:
+            ranges['earnings_date'] = (start, ranges.get('earnings_date', (None, None))[1])
+        if end is not None:
+            ranges['earnings_date'] = (ranges.get('earnings_date', (None, None))[0], end)
+        for name, (low, high) in ranges.items():
+            column = name[4:] if name.startswith("abs_") else name
+            if column not in STORE_COLUMNS:
+                raise ValueError(f"Unknown results column {column!r}")
+            values = frame[column].to_numpy()
+            if name.startswith("abs_"):
+                values = np.abs(values)
+            # NaN compares False, so rows missing the value drop out like in SQL
+            if low is not None:
+                mask &= values >= (np.datetime64(pd.Timestamp(low)) if column in DATE_COLUMNS else low)
+            if high is not None:
+                mask &= values <= (np.datetime64(pd.Timestamp(high)) if column in DATE_COLUMNS else high)
+
+        result = frame[mask]
+        if expr:
+            result = result.query(expr)
+        result = result.sort_values([order_by, 'run_id'], kind='stable')
+        if limit is not None:
+            result = result.iloc[:int(limit)]
+        return result[columns].reset_index(drop=True)
+
+    def sql(self, query, params=()):
+        """Run a SELECT against the runs table (indexed on ticker/earnings_date and iv_crush_pct)"""
+        with self._lock:
+            return self._read(query, params)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
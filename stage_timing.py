@@ -0,0 +1,139 @@
+import cProfile
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Samples kept per stage; older ones fall out of the percentiles
+MAX_SAMPLES = 1000
+
+SUMMARY_FIELDS = ("stage", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+
+class StageTimer:
+    """
+    Thread-safe collector of per-stage timing spans
+
+    Each stage keeps its last MAX_SAMPLES durations, which summary() turns
+    into p50/p95/p99 figures. Spans can be timed with the span() context
+    manager, or recorded directly when the start and end happen in different
+    callbacks (e.g. a request's first bar and historicalDataEnd).
+
+    Profiling is opt-in: after enable_profiling(), spans of the selected
+    stages also run under cProfile and write a .prof file per span.
+    """
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.profile_dir = None
+        self.profile_stages = None
+        self._profile_count = 0
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+
+    def record_since(self, stage, start):
+        """Record the time elapsed since a time.perf_counter() value"""
+        self.record(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def span(self, stage):
+        profiler = self._start_profile(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_since(stage, start)
+            if profiler is not None:
+                self._stop_profile(stage, profiler)
+
+    def enable_profiling(self, directory, stages=None):
+        """
+        Run spans under cProfile and dump stats to directory
+
+        Parameters:
+        directory: Where <stage>-<n>.prof files are written
+        stages: Stage names to profile (default: all). Spans nested inside a
+                profiled span on the same thread are not profiled separately.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.profile_stages = set(stages) if stages else None
+        self.profile_dir = directory
+
+    def disable_profiling(self):
+        self.profile_dir = None
+
+    def _start_profile(self, stage):
+        if self.profile_dir is None or getattr(self._local, "profiling", False):
+            return None
+        if self.profile_stages is not None and stage not in self.profile_stages:
+            return None
+        profiler = cProfile.Profile()
+        self._local.profiling = True
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            self._local.profiling = False
+            return None
+        return profiler
+
+    def _stop_profile(self, stage, profiler):
+        profiler.disable()
+        self._local.profiling = False
+        with self._lock:
+            self._profile_count += 1
+            n = self._profile_count
+        directory = self.profile_dir
+        if directory is not None:
+            profiler.dump_stats(os.path.join(directory, f"{stage}-{n}.prof"))
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """List of per-stage dicts with SUMMARY_FIELDS, sorted by stage name"""
+        with self._lock:
+            samples = {stage: np.array(values) for stage, values in self._samples.items()}
+
+        rows = []
+        for stage in sorted(samples):
+            ms = samples[stage] * 1000.0
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            rows.append({
+                "stage": stage,
+                "count": len(ms),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(ms.max()),
+            })
+        return rows
+
+    def export(self, path):
+        """Write the summary as JSON or CSV, picked from the file extension"""
+        rows = self.summary()
+        if path.lower().endswith(".json"):
+            with self._lock:
+                samples = {stage: list(values) for stage, values in self._samples.items()}
+            with open(path, "w") as f:
+                json.dump({"summary": rows, "samples_s": samples}, f, indent=2)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
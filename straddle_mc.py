@@ -0,0 +1,186 @@
+import numpy as np
+
+from option_math import allocate_greeks, black_scholes_greeks
+
+# P/L quantile levels reported for each side
+QUANTILES = (0.01, 0.05, 0.10, 0.25, 0.50, 0.75, 0.90, 0.95, 0.99)
+# Tail levels for expected shortfall (mean of the worst 5% / 1% of outcomes)
+SHORTFALL_LEVELS = (0.05, 0.01)
+
+DEFAULT_PATHS = 1_000_000
+# Paths repriced per batch; bounds the working set to a few MB
+CHUNK_SIZE = 1 << 17
+
+# Student-t degrees of freedom for the gap when there is no history to fit
+DEFAULT_GAP_DF = 4.0
+# Log gaps are clipped to ±this (about -63% / +172%); exp of a t has no mean otherwise
+MAX_LOG_GAP = 1.0
+
+
+def event_move_std(pre_iv, post_iv, days_to_expiry, event_days=1):
+    """
+    Standard deviation of the earnings gap implied by the IV crush
+
+    The variance the market priced in for the event is the pre-event total
+    variance less what is left after it: pre_iv²·T - post_iv²·(T - event).
+    """
+    T = days_to_expiry / 365
+    event_var = pre_iv ** 2 * T - post_iv ** 2 * max(T - event_days / 365, 0.0)
+    return float(np.sqrt(max(event_var, 0.0)))
+
+
+def calibrate_gap(implied_std, historical_gaps=None, weight=0.5, min_history=8):
+    """
+    Gap scale and tail thickness from the implied move and past earnings gaps
+
+    Parameters:
+    implied_std: event_move_std() of this event
+    historical_gaps: Past earnings log returns (close before -> open after)
+    weight: Share of the variance taken from the implied move
+    min_history: Fewer gaps than this are ignored
+
+    Returns (std, df): the log-gap standard deviation and Student-t degrees of
+    freedom. df comes from the sample excess kurtosis (6 / (df - 4) for a t).
+    """
+    gaps = np.asarray(historical_gaps if historical_gaps is not None else [], dtype=np.float64)
+    gaps = gaps[np.isfinite(gaps)]
+    if len(gaps) < min_history:
+        return implied_std, DEFAULT_GAP_DF
+
+    hist_var = gaps.var(ddof=1)
+    std = np.sqrt(weight * implied_std ** 2 + (1 - weight) * hist_var)
+    centered = gaps - gaps.mean()
+    excess_kurtosis = (centered ** 4).mean() / (centered ** 2).mean() ** 2 - 3
+    df = 4 + 6 / excess_kurtosis if excess_kurtosis > 0 else 30.0
+    return float(std), float(np.clip(df, 3.0, 30.0))
+
+
+def _summarize(pnl):
+    """Quantiles, expected shortfall and win probability of a P/L sample"""
+    n = len(pnl)
+    # One partial sort gives every quantile and tail cut-off
+    cuts = sorted({int(q * (n - 1)) for q in QUANTILES} |
+                  {max(int(level * n), 1) for level in SHORTFALL_LEVELS})
+    part = np.partition(pnl, cuts)
+
+    shortfall = {}
+    for level in SHORTFALL_LEVELS:
+        k = max(int(level * n), 1)
+        # Worst k outcomes are part[:k] once part is partitioned at k
+        shortfall[level] = float(part[:k].mean())
+
+    return {
+        "mean": float(pnl.mean()),
+        "std": float(pnl.std()),
+        "win_probability": float(np.count_nonzero(pnl > 0) / n),
+        "quantiles": {q: float(part[int(q * (n - 1))]) for q in QUANTILES},
+        "expected_shortfall": shortfall,
+    }
+
+
+def simulate_straddle_pnl(pre_spot, pre_iv, post_iv, days_to_expiry, risk_free_rate,
+                          gap_std=None, gap_df=DEFAULT_GAP_DF, iv_dispersion=0.15, gap_iv_corr=0.3,
+                          max_log_gap=MAX_LOG_GAP, n_paths=DEFAULT_PATHS, chunk_size=CHUNK_SIZE,
+                          event_days=1, seed=None):
+    """
+    Monte Carlo P/L of an ATM straddle held through earnings
+
+    Each path draws a joint (gap, post-event IV) scenario. The log gap is a
+    Student-t scaled to gap_std. The post-event IV is lognormal around
+    post_iv. Its shock is correlated with the size of the gap, so big moves
+    keep more of their IV. The straddle (K = pre_spot) is then repriced with
+    black_scholes_greeks after event_days. Paths are generated and repriced
+    in chunks of chunk_size through preallocated buffers (including the
+    pricer's output buffers), so memory stays bounded apart from the P/L
+    array itself.
+
+    Parameters:
+    pre_spot, pre_iv, post_iv: Pre-event spot and IV, and the expected IV after
+    days_to_expiry: Straddle expiry in calendar days from the pre-event close
+    risk_free_rate: Risk-free rate (annualized)
+    gap_std, gap_df: Log-gap standard deviation and Student-t degrees of
+        freedom, from calibrate_gap to blend in the ticker's past gaps
+        (default: event_move_std and DEFAULT_GAP_DF)
+    iv_dispersion: Log standard deviation of the post-event IV
+    gap_iv_corr: Correlation between |gap| and the post-event IV shock
+    max_log_gap: Clip for the log gap
+    n_paths: Scenarios to draw
+    chunk_size: Paths repriced per batch
+    event_days: Calendar days between the pre and post prices
+    seed: Seed for the random generator
+
+    Returns a dict with pre_straddle, gap_std, gap_df, and "long"/"short"
+    summaries: mean, std, win_probability, quantiles {level: P/L} and
+    expected_shortfall {level: mean of the worst outcomes}. P/L is per
+    share, like the dashboard's straddle figures.
+    """
+    rng = np.random.default_rng(seed)
+    if gap_std is None:
+        gap_std = event_move_std(pre_iv, post_iv, days_to_expiry, event_days)
+
+    K = pre_spot
+    T0 = days_to_expiry / 365
+    T1 = max(T0 - event_days / 365, 1e-6)
+
+    pre = black_scholes_greeks(pre_spot, K, T0, risk_free_rate, pre_iv)
+    pre_straddle = pre['call'] + pre['put']
+
+    # Unit-variance t: z / sqrt(chi2/df) has variance df/(df-2)
+    t_scale = gap_std * np.sqrt((gap_df - 2) / gap_df) if gap_df > 2 else gap_std
+    # |z| has mean sqrt(2/pi) and variance 1 - 2/pi; standardize it for the IV shock
+    abs_mean, abs_std = np.sqrt(2 / np.pi), np.sqrt(1 - 2 / np.pi)
+    iv_log_mean = np.log(post_iv) - 0.5 * iv_dispersion ** 2
+    corr_c = np.sqrt(1 - gap_iv_corr ** 2)
+
+    pnl = np.empty(n_paths)
+    size = min(chunk_size, n_paths)
+    z = np.empty(size)
+    w = np.empty(size)
+    s = np.empty(size)
+    sig = np.empty(size)
+    tmp = np.empty(size)
+    greeks = allocate_greeks(size)
+
+    for start in range(0, n_paths, size):
+        m = min(size, n_paths - start)
+        z_, w_, s_, sig_, tmp_ = z[:m], w[:m], s[:m], sig[:m], tmp[:m]
+
+        # Gap: t-distributed log return
+        rng.standard_normal(out=z_)
+        chi = rng.chisquare(gap_df, m) / gap_df
+        np.sqrt(chi, out=chi)
+        np.divide(z_, chi, out=s_)
+        s_ *= t_scale
+        np.clip(s_, -max_log_gap, max_log_gap, out=s_)
+        np.exp(s_, out=s_)
+        s_ *= pre_spot
+
+        # Post IV: lognormal, shock correlated with the standardized |z|
+        rng.standard_normal(out=w_)
+        w_ *= corr_c
+        np.abs(z_, out=tmp_)
+        tmp_ -= abs_mean
+        tmp_ *= gap_iv_corr / abs_std
+        w_ += tmp_
+        w_ *= iv_dispersion
+        w_ += iv_log_mean
+        np.exp(w_, out=sig_)
+
+        # Reprice after the event into the chunk's slice of the output buffers
+        g = black_scholes_greeks(s_, K, T1, risk_free_rate, sig_,
+                                 out={name: values[:m] for name, values in greeks.items()})
+        out = pnl[start:start + m]
+        np.add(g['call'], g['put'], out=out)
+        out -= pre_straddle
+
+    long = _summarize(pnl)
+    np.negative(pnl, out=pnl)
+    short = _summarize(pnl)
+    return {
+        "pre_straddle": float(pre_straddle),
+        "gap_std": float(gap_std),
+        "gap_df": float(gap_df),
+        "n_paths": n_paths,
+        "long": long,
+        "short": short,
+    }
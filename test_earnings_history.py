@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from earnings_history import EarningsHistory, ROLLING_EVENTS
+
+
+def _events(n, nan_at=()):
+    rng = np.random.default_rng(0)
+    crush = rng.uniform(10, 50, n)
+    crush[list(nan_at)] = np.nan
+    return pd.DataFrame({
+        'ticker': "NVDA",
+        'earnings_date': pd.date_range("2020-02-01", periods=n, freq="QS"),
+        'pre_spot': 100.0,
+        'post_open': 100 * (1 + rng.normal(0, 0.05, n)),
+        'pre_straddle': rng.uniform(5, 10, n),
+        'iv_crush_pct': crush,
+    })
+
+
+def test_nan_crush_then_incremental_adds():
+    events = _events(ROLLING_EVENTS + 4, nan_at=[1])
+    history = EarningsHistory(":memory:")
+    history.add_events(events.iloc[:2])
+    # One quarter at a time, until the NaN event has become the seed row
+    for i in range(2, len(events)):
+        assert history.add_events(events.iloc[[i]]) == 1
+
+    stats = history.stats_table()
+    crush = events['iv_crush_pct']
+    expected = crush.expanding().mean()
+    assert np.allclose(stats['mean_crush_pct'], expected, equal_nan=True)
+    assert stats['n_crush_events'].tolist() == crush.notna().cumsum().tolist()
+    assert stats['n_events'].tolist() == list(range(1, len(events) + 1))
+
+    # Adding everything at once gives the same statistics
+    batch = EarningsHistory(":memory:")
+    batch.add_events(events)
+    pd.testing.assert_frame_equal(batch.stats_table(), stats)
+
+
+def test_all_nan_crush_seed():
+    events = _events(ROLLING_EVENTS + 2, nan_at=[0, 1])
+    history = EarningsHistory(":memory:")
+    for i in range(len(events)):
+        history.add_events(events.iloc[[i]])
+    stats = history.stats_table()
+    assert np.isnan(stats['mean_crush_pct'].iloc[:2]).all()
+    assert np.allclose(stats['mean_crush_pct'].iloc[2:], events['iv_crush_pct'].iloc[2:].expanding().mean())
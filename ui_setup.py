@@ -2,6 +2,9 @@
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+from chart_renderer import ChartRenderer
+from intraday_store import INTRADAY_BAR_SIZES
+
 # Tkinter stuff
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
@@ -73,6 +76,104 @@ def setup_ui(self):
     )
     self.analyze_btn.grid(row=0, column=6)
 
+    self.chain_btn = ttk.Button(
+        earnings_frame,
+        text="Chain Surface",
+        command=self.analyze_chain,
+        state="disabled",
+    )
+    self.chain_btn.grid(row=0, column=7, padx=(5, 0))
+
+    self.live_btn = ttk.Button(
+        earnings_frame,
+        text="Go Live",
+        command=self.toggle_live,
+        state="disabled",
+    )
+    self.live_btn.grid(row=0, column=8, padx=(5, 0))
+
+    self.sweep_btn = ttk.Button(
+        earnings_frame,
+        text="Parameter Sweep",
+        command=self.show_sweep,
+        state="disabled",
+    )
+    self.sweep_btn.grid(row=0, column=9, padx=(5, 0))
+
+    self.monte_carlo_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(
+        earnings_frame, text="Monte Carlo P/L distribution", variable=self.monte_carlo_var
+    ).grid(row=1, column=0, columnspan=4, sticky=tk.W, pady=(5, 0))
+
+    # Intraday mode: exact pre/post bars instead of daily closes
+    self.intraday_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(
+        earnings_frame, text="Intraday bars:", variable=self.intraday_var
+    ).grid(row=1, column=4, sticky=tk.W, pady=(5, 0))
+    self.intraday_bar_size_var = tk.StringVar(value="1 min")
+    ttk.Combobox(
+        earnings_frame, textvariable=self.intraday_bar_size_var, values=list(INTRADAY_BAR_SIZES),
+        state="readonly", width=7
+    ).grid(row=1, column=5, sticky=tk.W, pady=(5, 0))
+    ttk.Label(earnings_frame, text="Pre / post time:").grid(row=1, column=6, sticky=tk.E, pady=(5, 0))
+    times_frame = ttk.Frame(earnings_frame)
+    times_frame.grid(row=1, column=7, sticky=tk.W, padx=(5, 0), pady=(5, 0))
+    self.pre_time_var = tk.StringVar(value="15:59")
+    ttk.Entry(times_frame, textvariable=self.pre_time_var, width=6).pack(side=tk.LEFT)
+    self.post_time_var = tk.StringVar(value="09:45")
+    ttk.Entry(times_frame, textvariable=self.post_time_var, width=6).pack(side=tk.LEFT, padx=(5, 0))
+
+    self.report_btn = ttk.Button(
+        earnings_frame,
+        text="Export Report",
+        command=self.export_report,
+        state="disabled",
+    )
+    self.report_btn.grid(row=1, column=8, padx=(5, 0), pady=(5, 0))
+
+    ttk.Button(
+        earnings_frame,
+        text="Load Calendar",
+        command=self.load_earnings_calendar,
+    ).grid(row=1, column=9, padx=(5, 0), pady=(5, 0))
+
+    # Diagnostics: p50/p95/p99 per timed stage
+    diag_frame = ttk.LabelFrame(main_frame, text="Diagnostics (stage timings, ms)", padding="5")
+    diag_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+    diag_frame.columnconfigure(0, weight=1)
+
+    columns = ("stage", "count", "p50", "p95", "p99")
+    self.diagnostics_tree = ttk.Treeview(diag_frame, columns=columns, show="headings", height=8)
+    for column, width in zip(columns, (170, 60, 70, 70, 70)):
+        self.diagnostics_tree.heading(column, text=column)
+        self.diagnostics_tree.column(column, width=width, anchor=tk.W if column == "stage" else tk.E)
+    self.diagnostics_tree.grid(row=0, column=0, columnspan=3, sticky=(tk.W, tk.E))
+
+    ttk.Button(diag_frame, text="Refresh", command=self.refresh_diagnostics).grid(row=1, column=0, sticky=tk.W)
+    ttk.Button(diag_frame, text="Export...", command=self.export_diagnostics).grid(row=1, column=1)
+    self.profile_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(
+        diag_frame, text="Profile (cProfile)", variable=self.profile_var, command=self.toggle_profiling
+    ).grid(row=1, column=2, sticky=tk.E)
+
+    # Earnings history: this ticker's past implied vs realized moves
+    history_frame = ttk.LabelFrame(main_frame, text="Earnings History", padding="5")
+    history_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+
+    history_columns = [("implied", "Implied"), ("realized", "Realized"), ("crush", "IV Crush"), ("hit", "Hit %")]
+    for i, (_, text) in enumerate(history_columns):
+        ttk.Label(history_frame, text=text).grid(row=0, column=1 + i, padx=(0, 10))
+    for row, (prefix, text) in enumerate((("all", "All:"), ("rolling", "Last 8:"), ("rank", "Pct rank:")), 1):
+        ttk.Label(history_frame, text=text).grid(row=row, column=0, sticky=tk.W)
+        for i, (field, _) in enumerate(history_columns):
+            if prefix == "rank" and field == "hit":
+                continue
+            label = ttk.Label(history_frame, text="N/A", font=("Arial", 10, "bold"))
+            label.grid(row=row, column=1 + i, padx=(0, 10))
+            setattr(self, f"hist_{prefix}_{field}_label", label)
+    self.hist_events_label = ttk.Label(history_frame, text="No history")
+    self.hist_events_label.grid(row=4, column=0, columnspan=5, sticky=tk.W)
+
     # =========================================================
     # RIGHT COLUMN — ANALYTICS / OUTPUTS
     # =========================================================
@@ -133,9 +234,38 @@ def setup_ui(self):
     self.post_spot_label = ttk.Label(spot_frame, text="N/A", font=("Arial", 11, "bold"))
     self.post_spot_label.grid(row=0, column=5)
 
+    # ---- Option Pricing
+    pricing_frame = ttk.LabelFrame(right_panel, text="ATM Option Pricing", padding="5")
+    pricing_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+
+    for row, (name, color) in enumerate([("Call", "black"), ("Put", "black"), ("Straddle", "blue")]):
+        key = name.lower()
+        ttk.Label(pricing_frame, text=f"Pre {name}:").grid(row=row, column=0)
+        label = ttk.Label(pricing_frame, text="N/A", font=("Arial", 10, "bold"), foreground=color)
+        label.grid(row=row, column=1, padx=(0, 20))
+        setattr(self, f"pre_{key}_label", label)
+
+        ttk.Label(pricing_frame, text=f"Post {name}:").grid(row=row, column=2)
+        label = ttk.Label(pricing_frame, text="N/A", font=("Arial", 10, "bold"), foreground=color)
+        label.grid(row=row, column=3, padx=(0, 20))
+        setattr(self, f"post_{key}_label", label)
+
+        ttk.Label(pricing_frame, text="Change:").grid(row=row, column=4)
+        label = ttk.Label(pricing_frame, text="N/A", font=("Arial", 10, "bold"))
+        label.grid(row=row, column=5)
+        setattr(self, f"{key}_loss_label", label)
+
+    ttk.Label(pricing_frame, text="Long Straddle P/L:").grid(row=3, column=0)
+    self.long_pnl_label = ttk.Label(pricing_frame, text="N/A", font=("Arial", 10, "bold"))
+    self.long_pnl_label.grid(row=3, column=1, padx=(0, 20))
+
+    ttk.Label(pricing_frame, text="Short Straddle P/L:").grid(row=3, column=2)
+    self.short_pnl_label = ttk.Label(pricing_frame, text="N/A", font=("Arial", 10, "bold"))
+    self.short_pnl_label.grid(row=3, column=3, padx=(0, 20))
+
     # ---- Greeks
     greeks_frame = ttk.LabelFrame(right_panel, text="Greeks Analysis", padding="5")
-    greeks_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+    greeks_frame.grid(row=4, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
 
     ttk.Label(greeks_frame, text="Pre Δ:").grid(row=0, column=0)
     self.pre_delta_label = ttk.Label(greeks_frame, text="N/A", font=("Arial", 10, "bold"))
@@ -149,9 +279,34 @@ def setup_ui(self):
     self.delta_change_label = ttk.Label(greeks_frame, text="N/A", font=("Arial", 10, "bold"))
     self.delta_change_label.grid(row=0, column=5)
 
+    ttk.Label(greeks_frame, text="Pre Vega:").grid(row=1, column=0)
+    self.pre_vega_label = ttk.Label(greeks_frame, text="N/A", font=("Arial", 10, "bold"))
+    self.pre_vega_label.grid(row=1, column=1, padx=(0, 20))
+
+    ttk.Label(greeks_frame, text="Post Vega:").grid(row=1, column=2)
+    self.post_vega_label = ttk.Label(greeks_frame, text="N/A", font=("Arial", 10, "bold"))
+    self.post_vega_label.grid(row=1, column=3, padx=(0, 20))
+
+    ttk.Label(greeks_frame, text="Vega Change:").grid(row=1, column=4)
+    self.vega_change_label = ttk.Label(greeks_frame, text="N/A", font=("Arial", 10, "bold"))
+    self.vega_change_label.grid(row=1, column=5)
+
+    # ---- Monte Carlo P/L
+    mc_frame = ttk.LabelFrame(right_panel, text="Straddle P/L Distribution (Monte Carlo)", padding="5")
+    mc_frame.grid(row=5, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+
+    mc_fields = [("win", "Win %:"), ("median", "Median:"), ("p05", "5%:"), ("p95", "95%:"), ("es05", "ES 5%:")]
+    for row, side in enumerate(("long", "short")):
+        ttk.Label(mc_frame, text=f"{side.title()}:", font=("Arial", 10, "bold")).grid(row=row, column=0)
+        for i, (field, text) in enumerate(mc_fields):
+            ttk.Label(mc_frame, text=text).grid(row=row, column=1 + 2 * i)
+            label = ttk.Label(mc_frame, text="N/A", font=("Arial", 10, "bold"))
+            label.grid(row=row, column=2 + 2 * i, padx=(0, 15))
+            setattr(self, f"mc_{side}_{field}_label", label)
+
     # ---- Status
     status_frame = ttk.LabelFrame(right_panel, text="Status", padding="5")
-    status_frame.grid(row=4, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+    status_frame.grid(row=6, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
 
     self.status_text = scrolledtext.ScrolledText(status_frame, height=6)
     self.status_text.grid(row=0, column=0, sticky=(tk.W, tk.E))
@@ -169,4 +324,55 @@ def setup_ui(self):
 
     self.fig, (self.ax1, self.ax2) = plt.subplots(1, 2, figsize=(16, 6))
     self.canvas = FigureCanvasTkAgg(self.fig, plot_frame)
-    self.canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
\ No newline at end of file
+    self.canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+    self.chart_renderer = ChartRenderer(self.fig, self.ax1, self.ax2, self.canvas, timer=self.timer)
+
+
+def setup_chain_window(self, title):
+    """Pop-up window holding one IV crush surface heatmap; returns (fig, ax, canvas)"""
+    from matplotlib.figure import Figure
+
+    window = tk.Toplevel(self.root)
+    window.title(title)
+    window.geometry("1000x700")
+
+    fig = Figure(figsize=(10, 7))
+    ax = fig.add_subplot(1, 1, 1)
+    canvas = FigureCanvasTkAgg(fig, window)
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    return fig, ax, canvas
+
+
+def setup_sweep_window(self, title, rates, metric_labels, on_change):
+    """
+    Pop-up window for a parameter sweep heatmap with a rate slider and a
+    metric picker; on_change() runs when either moves.
+    Returns (fig, ax, canvas, rate_var, metric_var).
+    """
+    from matplotlib.figure import Figure
+
+    window = tk.Toplevel(self.root)
+    window.title(title)
+    window.geometry("1000x750")
+
+    controls = ttk.Frame(window, padding="5")
+    controls.pack(fill=tk.X)
+
+    ttk.Label(controls, text="Risk-free rate:").pack(side=tk.LEFT, padx=(0, 5))
+    rate_var = tk.IntVar(value=0)
+    tk.Scale(
+        controls, variable=rate_var, from_=0, to=len(rates) - 1, orient=tk.HORIZONTAL,
+        showvalue=False, length=250, command=lambda _: on_change(),
+    ).pack(side=tk.LEFT, padx=(0, 15))
+
+    ttk.Label(controls, text="Metric:").pack(side=tk.LEFT, padx=(0, 5))
+    metric_var = tk.StringVar(value=metric_labels[0])
+    metric_box = ttk.Combobox(controls, textvariable=metric_var, values=metric_labels, state="readonly", width=28)
+    metric_box.pack(side=tk.LEFT)
+    metric_box.bind("<<ComboboxSelected>>", lambda _: on_change())
+
+    fig = Figure(figsize=(10, 7))
+    ax = fig.add_subplot(1, 1, 1)
+    canvas = FigureCanvasTkAgg(fig, window)
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    return fig, ax, canvas, rate_var, metric_var
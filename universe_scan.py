@@ -0,0 +1,157 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from iv_analysis import run_batch_analysis
+
+
+class SharedBarTable:
+    """
+    Bars of many tickers packed into one shared-memory block
+
+    Layout is columnar: an int64 epoch-ns time column followed by one float64
+    column per field, each spanning every ticker's rows back to back. Workers
+    attach by name and get zero-copy DataFrame views of the rows they need,
+    so bars are never pickled to the pool.
+    """
+
+    def __init__(self, frames, columns):
+        self.columns = tuple(columns)
+        self.offsets = {}
+        total = 0
+        for ticker, data in frames.items():
+            self.offsets[ticker] = (total, total + len(data))
+            total += len(data)
+        self.rows = total
+
+        nbytes = max(8 * (1 + len(self.columns)) * total, 1)
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        ts, values = self._views(self.shm.buf)
+        for ticker, data in frames.items():
+            start, stop = self.offsets[ticker]
+            data = data.sort_index()
+            ts[start:stop] = data.index.values.astype('datetime64[ns]').view(np.int64)
+            for i, column in enumerate(self.columns):
+                values[i, start:stop] = data[column].to_numpy(dtype=np.float64)
+        del ts, values
+
+    def _views(self, buf):
+        ts = np.ndarray((self.rows,), dtype=np.int64, buffer=buf)
+        values = np.ndarray((len(self.columns), self.rows), dtype=np.float64,
+                            buffer=buf, offset=8 * self.rows)
+        return ts, values
+
+    def spec(self):
+        """Picklable description used by workers to attach"""
+        return {'name': self.shm.name, 'rows': self.rows,
+                'columns': self.columns, 'offsets': self.offsets}
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach(spec, tickers):
+    """Attach to a SharedBarTable and build zero-copy frames for `tickers`"""
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    rows, columns = spec['rows'], spec['columns']
+    ts = np.ndarray((rows,), dtype=np.int64, buffer=shm.buf)
+    values = np.ndarray((len(columns), rows), dtype=np.float64, buffer=shm.buf, offset=8 * rows)
+
+    frames = {}
+    for ticker in tickers:
+        if ticker not in spec['offsets']:
+            continue
+        start, stop = spec['offsets'][ticker]
+        index = pd.DatetimeIndex(ts[start:stop].view('datetime64[ns]'), name='date', copy=False)
+        frames[ticker] = pd.DataFrame(
+            {column: values[i, start:stop] for i, column in enumerate(columns)},
+            index=index, copy=False
+        )
+    return shm, frames
+
+
+def _scan_chunk(events, stock_spec, iv_spec, vix_data, risk_free_rate, pricing):
+    """Worker: run the pricing and statistics stage for one chunk of events"""
+    tickers = set(events['ticker'])
+    handles = []
+    stock_shm, stock_bars = _attach(stock_spec, tickers)
+    handles.append(stock_shm)
+    iv_bars = None
+    if iv_spec is not None:
+        iv_shm, iv_bars = _attach(iv_spec, tickers)
+        handles.append(iv_shm)
+
+    results = run_batch_analysis(events, stock_bars, iv_bars, vix_data, risk_free_rate, **pricing)
+
+    # Views into the shared block must be gone before it can be closed
+    del stock_bars, iv_bars
+    for shm in handles:
+        shm.close()
+    return results
+
+
+def _chunks(events, n_chunks):
+    """Split events into chunks of whole tickers with roughly equal row counts"""
+    order = np.argsort(events['ticker'].to_numpy(), kind='stable')
+    bounds = np.linspace(0, len(order), n_chunks + 1).astype(int)
+    tickers = events['ticker'].to_numpy()[order]
+    chunks, start = [], 0
+    for bound in bounds[1:]:
+        # Extend each chunk to the end of its last ticker's run
+        while 0 < bound < len(order) and tickers[bound] == tickers[bound - 1]:
+            bound += 1
+        if bound > start:
+            chunks.append(order[start:bound])
+            start = bound
+    return chunks
+
+
+def scan_universe(events, stock_bars, iv_bars=None, vix_data=None, risk_free_rate=0.05,
+                  workers=None, chunks_per_worker=4, **pricing):
+    """
+    run_batch_analysis over a large event table on a process pool
+
+    Stock and IV bars are copied once into shared memory and workers attach
+    to them by name; only the small per-chunk event tables, the VIX frame and
+    the result frames cross process boundaries. Data fetching stays with the
+    caller's single IB connection.
+
+    Parameters:
+    events, stock_bars, iv_bars, vix_data, risk_free_rate: As run_batch_analysis
+    workers: Pool size (defaults to the CPU count)
+    chunks_per_worker: Chunks queued per worker, for load balancing
+    pricing: model, dividend_yield and tree_steps for run_batch_analysis
+
+    Returns the same frame as run_batch_analysis, in event order.
+    """
+    events = events.reset_index(drop=True).copy()
+    events['ticker'] = events['ticker'].astype(str).str.upper()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(events) == 0:
+        return run_batch_analysis(events, stock_bars, iv_bars, vix_data, risk_free_rate, **pricing)
+
+    stock_table = SharedBarTable(stock_bars, ('open', 'close'))
+    iv_table = SharedBarTable(iv_bars, ('implied_vol',)) if iv_bars else None
+    try:
+        chunks = _chunks(events, workers * chunks_per_worker)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_scan_chunk, events.iloc[rows], stock_table.spec(),
+                            iv_table.spec() if iv_table else None, vix_data, risk_free_rate, pricing)
+                for rows in chunks
+            ]
+            parts = [future.result() for future in futures]
+    finally:
+        stock_table.release()
+        if iv_table is not None:
+            iv_table.release()
+
+    # Put rows back in the caller's event order
+    order = np.concatenate(chunks)
+    results = pd.concat(parts, ignore_index=True)
+    results.index = order
+    return results.sort_index()